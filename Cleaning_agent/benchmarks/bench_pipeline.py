@@ -0,0 +1,257 @@
+"""
+End-to-end pipeline benchmark on synthetic data, fully offline.
+
+LLM traffic is answered by llms/replay.ReplayCall from a recorded
+fixture, so the numbers measure only our own (non-LLM) hot path:
+metadata, execute, diff, checkpoint write, ...
+
+Usage (from the Cleaning_agent folder):
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --sizes 10000,100000 --json bench.json
+    python benchmarks/bench_pipeline.py --pipelined
+    python benchmarks/bench_pipeline.py --compiled   # second run from a compiled rule pack
+    python benchmarks/bench_pipeline.py --sandbox 2   # execute in a 2-process sandbox pool
+    python benchmarks/bench_pipeline.py --compiled --fuse   # fuse compiled rules on separate columns
+    python benchmarks/bench_pipeline.py --llm-batch-size 1   # one LLM request per rule, to compare
+    python benchmarks/bench_pipeline.py --record   # re-record fixture against live Gemini
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orchestrator  # noqa: E402
+from state import PipelineState  # noqa: E402
+from llms.base import LLMClient  # noqa: E402
+from llms.replay import RecordingCall, ReplayCall  # noqa: E402
+from llms.batch import DEFAULT_BATCH_SIZE  # noqa: E402
+from csv_read_toon import ColumnProfileCache  # noqa: E402
+from checkpoint import CheckpointStore  # noqa: E402
+from rule_pack import RulePack  # noqa: E402
+from sandbox_pool import SandboxPool  # noqa: E402
+from column_index import ColumnIndex  # noqa: E402
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "pipeline_replay.jsonl")
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+RECORD_SIZE = 10_000
+
+BENCH_RULES = [
+    "Trim leading/trailing whitespace from all string columns.",
+    "Standardize case for the Country column to UPPER.",
+    'Compute line total before discount.\n{"expr": "Quantity * UnitPrice", "round": 2}',
+    "All monetary values in this file are expressed in USD.",
+    "Drop test/cancelled orders.",
+    "Validate that Email contains '@'. Log invalid rows as issues without removing them.",
+    "Fill missing State values with 'Unknown'.",
+]
+
+# orchestrator attribute -> stage label
+STAGES = {
+    "interpret_rules": "interpret",
+    "generate_code": "generate",
+    "verify_code": "verify",
+    "execute": "execute",
+    "compute_diff": "diff",
+    "audit": "audit",
+    "audit_many": "audit",
+    "generate_metadata_toon_from_df": "metadata",
+}
+
+# (class, method) -> stage label, for stages that are methods
+METHOD_STAGES = {
+    (CheckpointStore, "write_base"): "checkpoint",
+    (CheckpointStore, "write_step"): "checkpoint",
+    (SandboxPool, "execute"): "execute",
+}
+
+
+def rule_match_key(prompt: str) -> str:
+    """
+    Which benchmark rule a prompt is about; lets replay line up prompts
+    whose metadata differs from the recording (other sizes, speculation).
+    """
+    for i, rule in enumerate(BENCH_RULES):
+        if rule in prompt:
+            return str(i)
+    return ""
+
+
+def make_dataset(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Orders-like frame with padded strings, nulls and a few cancelled rows,
+    so every benchmark rule has real work to do.
+    """
+    rng = np.random.default_rng(seed)
+
+    names = np.array([" john doe", "Mary Smith ", "alex", " Robert  ", "li wei"], dtype=object)
+    countries = np.array(["usa", " India", "germany ", "UK", "france"], dtype=object)
+    states = np.array(["CA", "NY", None, "TX", None], dtype=object)
+    statuses = np.array(["Shipped", "Pending", "Cancelled", "Delivered", "Test"], dtype=object)
+    emails = np.array(["a@x.com", " b@y.org", "invalid-email", "c@z.net ", None], dtype=object)
+
+    return pd.DataFrame({
+        "OrderID": np.arange(1, n_rows + 1),
+        "CustomerName": names[rng.integers(0, len(names), n_rows)],
+        "Email": emails[rng.integers(0, len(emails), n_rows)],
+        "Country": countries[rng.integers(0, len(countries), n_rows)],
+        "State": states[rng.integers(0, len(states), n_rows)],
+        "Quantity": rng.integers(1, 20, n_rows),
+        "UnitPrice": np.round(rng.uniform(1, 500, n_rows), 2),
+        "Status": statuses[rng.choice(len(statuses), n_rows, p=[0.5, 0.3, 0.1, 0.08, 0.02])],
+    })
+
+
+class StageTimer:
+    """
+    Temporarily wraps the stage functions orchestrator imported, and
+    accumulates wall-clock seconds per stage.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self._originals = {}
+
+    def _wrap(self, label, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.totals[label] = self.totals.get(label, 0.0) + time.perf_counter() - start
+                self.counts[label] = self.counts.get(label, 0) + 1
+        return timed
+
+    def __enter__(self):
+        for attr, label in STAGES.items():
+            if hasattr(orchestrator, attr):
+                self._patch(orchestrator, attr, label)
+        for (owner, attr), label in METHOD_STAGES.items():
+            self._patch(owner, attr, label)
+        return self
+
+    def _patch(self, owner, attr, label):
+        original = getattr(owner, attr)
+        self._originals[(owner, attr)] = original
+        setattr(owner, attr, self._wrap(label, original))
+
+    def __exit__(self, *exc):
+        for (owner, attr), original in self._originals.items():
+            setattr(owner, attr, original)
+        return False
+
+
+def run_once(df, call_fn, pipelined=False, rule_pack=None, sandbox=None, column_index=False, fuse=False,
+             scheduler=None, llm_batch_size=DEFAULT_BATCH_SIZE):
+    llm = LLMClient(call_fn, scheduler=scheduler)
+    timer = StageTimer()
+
+    start = time.perf_counter()
+    with timer:
+        profile_cache = ColumnProfileCache()
+        metadata = orchestrator.generate_metadata_toon_from_df(df, profile_cache=profile_cache)
+        state = PipelineState(df=df)
+        orchestrator.run_pipeline(state=state, rules=BENCH_RULES, metadata_toon=metadata, llm=llm,
+                                  pipelined=pipelined, profile_cache=profile_cache, rule_pack=rule_pack,
+                                  sandbox=sandbox, column_index=ColumnIndex(df) if column_index else None,
+                                  llm_batch_size=llm_batch_size, fuse=fuse)
+    total = time.perf_counter() - start
+
+    return {"rows_in": len(df), "rows_out": len(state.df), "total_s": round(total, 4),
+            "stages_s": {k: round(v, 4) for k, v in timer.totals.items()},
+            "stage_calls": dict(timer.counts), "llm_batch_size": llm_batch_size,
+            "llm_tokens": llm.token_stats()}
+
+
+def record_fixture():
+    from llms.gemini_client import gemini_call
+    from llms.scheduler import get_scheduler
+
+    if os.path.exists(FIXTURE_PATH):
+        os.remove(FIXTURE_PATH)
+    df = make_dataset(RECORD_SIZE)
+    # gemini_call raises on 429s and 5xx; the scheduler is what retries them
+    run_once(df, RecordingCall(gemini_call, FIXTURE_PATH, match_key=rule_match_key), scheduler=get_scheduler())
+    print(f"Recorded fixture to {FIXTURE_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES))
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write results to this file")
+    parser.add_argument("--pipelined", action="store_true", help="Benchmark run_pipeline(pipelined=True)")
+    parser.add_argument("--record", action="store_true", help="Re-record the replay fixture with live Gemini")
+    parser.add_argument(
+        "--compiled",
+        action="store_true",
+        help="Compile a rule pack in an untimed first run, then benchmark a run that uses it"
+    )
+    parser.add_argument(
+        "--sandbox",
+        type=int,
+        default=0,
+        help="Run generated code in a SandboxPool with this many workers (0 = in-process)"
+    )
+    parser.add_argument(
+        "--column-index",
+        action="store_true",
+        help="Focus each generation prompt on the columns the rule refers to"
+    )
+    parser.add_argument(
+        "--fuse",
+        action="store_true",
+        help="Fuse consecutive compiled rules on separate columns into one pass (needs --compiled)"
+    )
+    parser.add_argument(
+        "--llm-batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Rules interpreted, and diffs audited, per LLM request (1 = one request each)"
+    )
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+
+    # The pipeline writes logs/ and checkpoints/ into the cwd; keep them out of the repo
+    workdir = tempfile.mkdtemp(prefix="refineai_bench_")
+    os.chdir(workdir)
+
+    if args.record:
+        record_fixture()
+        return
+
+    sandbox = SandboxPool(workers=args.sandbox) if args.sandbox > 0 else None
+
+    results = []
+    for n_rows in (int(s) for s in args.sizes.split(",") if s.strip()):
+        df = make_dataset(n_rows)
+        rule_pack = None
+        if args.compiled:
+            rule_pack = RulePack(os.path.join(workdir, f"rule_pack_{n_rows}.json"))
+            run_once(df, ReplayCall(FIXTURE_PATH, match_key=rule_match_key), rule_pack=rule_pack)
+
+        replay = ReplayCall(FIXTURE_PATH, match_key=rule_match_key)
+        result = run_once(df, replay, pipelined=args.pipelined, rule_pack=rule_pack, sandbox=sandbox,
+                          column_index=args.column_index, fuse=args.fuse, llm_batch_size=args.llm_batch_size)
+        result["replay"] = replay.stats()
+        results.append(result)
+
+        stages = "  ".join(f"{k}={v:.3f}s" for k, v in result["stages_s"].items())
+        print(f"{n_rows:>10,} rows  total={result['total_s']:.3f}s  llm_calls={replay.calls}  {stages}")
+
+    if sandbox is not None:
+        sandbox.close()
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Metadata profiling benchmark: in-memory (profile_column on the loaded
+frame) against streaming (stream_profile.profile_csv, sketches merged
+over chunks).
+
+A synthetic orders CSV of --rows rows is written to a temporary folder
+and profiled both ways, streaming first (RSS rarely shrinks after a large
+frame is freed). Reported per mode: seconds and how far RSS rose above
+where it started (workers' memory is not counted); for the streaming
+profile also how many metrics are approximate and their worst relative
+error. Exits non-zero if a metric the streaming profile reports
+as exact differs from the in-memory one, or an approximate one is off by
+more than --tolerance.
+
+Usage (from the Cleaning_agent folder):
+    python benchmarks/bench_profile.py
+    python benchmarks/bench_profile.py --rows 3000000 --chunksize 250000 --workers 4 --json profile.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csv_read_toon import profile_column  # noqa: E402
+from memory_monitor import PeakMemory  # noqa: E402
+from stream_profile import profile_csv  # noqa: E402
+from benchmarks.bench_pipeline import make_dataset  # noqa: E402
+
+
+def profile_in_memory(path):
+    df = pd.read_csv(path, low_memory=False)
+    return {col: profile_column(df[col], len(df)) for col in df.columns}
+
+
+def same(expected, actual):
+    if isinstance(expected, float) and isinstance(actual, float):
+        return (math.isnan(expected) and math.isnan(actual)) or math.isclose(expected, actual, rel_tol=1e-9)
+    return expected == actual
+
+
+def relative_error(expected, actual):
+    if not isinstance(expected, (int, float)) or isinstance(expected, bool):
+        return 0.0 if same(expected, actual) else math.inf
+    if expected == 0:
+        return abs(actual)
+    return abs(actual - expected) / abs(expected)
+
+
+def compare(exact, streamed):
+    """
+    (mismatches, approximate metric count, worst relative error of the
+    approximate ones). top/freq are left out of the error: with counts
+    truncated to the most frequent values they are lower bounds.
+    """
+    mismatches, approximate, worst = [], 0, 0.0
+    for col, expected in exact.items():
+        profile = dict(streamed[col])
+        labelled = set(profile.pop("Approximate", []))
+        metrics = [(key, value, profile[key]) for key, value in expected.items() if key != "Descriptive_Stats"]
+        metrics += [(f"Descriptive_Stats.{key}", value, profile["Descriptive_Stats"].get(key))
+                    for key, value in expected["Descriptive_Stats"].items()]
+        for name, value, actual in metrics:
+            if name in labelled:
+                approximate += 1
+                if not name.endswith((".top", ".freq")):
+                    worst = max(worst, relative_error(value, actual))
+            elif not same(value, actual):
+                mismatches.append(f"{col} {name}: {value!r} != {actual!r}")
+    return mismatches, approximate, worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300_000, help="Rows of the synthetic CSV")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="Rows per chunk of the streaming profile")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes of the streaming profile")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="Largest relative error allowed for an approximate metric")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "orders.csv")
+        df = make_dataset(args.rows)
+        # A high-cardinality text column, so the sketches are exercised on text too
+        df["OrderKey"] = "K" + pd.Series(np.arange(len(df))).astype(str)
+        df.to_csv(path, index=False)
+        del df
+
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            profile = profile_csv(path, chunksize=args.chunksize, max_workers=args.workers)
+            streamed = profile.profiles()
+            streaming_seconds = time.perf_counter() - start
+        streaming_peak = memory.as_dict()["peak_delta_mb"]
+
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            exact = profile_in_memory(path)
+            in_memory_seconds = time.perf_counter() - start
+        in_memory_peak = memory.as_dict()["peak_delta_mb"]
+
+    mismatches, approximate, worst = compare(exact, streamed)
+    result = {
+        "rows": args.rows,
+        "chunksize": args.chunksize,
+        "workers": args.workers or os.cpu_count(),
+        "in_memory_seconds": round(in_memory_seconds, 4),
+        "in_memory_peak_delta_mb": in_memory_peak,
+        "streaming_seconds": round(streaming_seconds, 4),
+        "streaming_peak_delta_mb": streaming_peak,
+        "approximate_metrics": approximate,
+        "max_relative_error": round(worst, 5),
+        "mismatches": mismatches,
+    }
+    print(f"in-memory  {result['in_memory_seconds']:8.3f}s  RSS +{in_memory_peak} MB")
+    print(f"streaming  {result['streaming_seconds']:8.3f}s  RSS +{streaming_peak} MB "
+          f"({result['workers']} workers, chunks of {args.chunksize})")
+    print(f"approximate metrics: {approximate}, worst relative error {result['max_relative_error']:.2%}")
+    for mismatch in mismatches:
+        print(f"MISMATCH {mismatch}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if mismatches or worst > args.tolerance:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
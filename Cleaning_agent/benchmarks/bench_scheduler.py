@@ -0,0 +1,215 @@
+"""
+LLM scheduler benchmark against a local fake endpoint that returns 429s.
+
+The fake endpoint (a ThreadingHTTPServer on 127.0.0.1) admits at most
+--quota requests per second over a sliding window and answers the rest
+with HTTP 429, optionally without a Retry-After header. --threads
+callers then send --calls prompts between them, alternating generation
+and audit priority, in two modes:
+
+  sleep      - each thread retries its own 429s with exponential backoff
+               (1s, 2s, 4s, ... plus jitter), as gemini_call_with_retry did
+  scheduler  - every call goes through one llms.scheduler.LLMScheduler,
+               configured --overshoot times above the real quota so the
+               adaptive rate has to find it
+
+Reports wall time, 429s served, failed calls and the scheduler's queue
+waits per priority. Exits non-zero if the scheduler mode loses a call.
+
+Usage (from the Cleaning_agent folder):
+    python benchmarks/bench_scheduler.py
+    python benchmarks/bench_scheduler.py --quota 10 --calls 300 --threads 24 --json scheduler.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llms.scheduler import LLMScheduler, RateLimited, RetryableLLMError  # noqa: E402
+
+
+class FakeEndpoint:
+    """
+    Local HTTP endpoint with a requests-per-second quota. POST / echoes the
+    body after latency seconds; over quota it returns 429.
+    """
+
+    def __init__(self, quota, latency=0.05, retry_after=True):
+        self.quota = quota
+        self.latency = latency
+        self.retry_after = retry_after
+        self.served = 0
+        self.throttled = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not endpoint.admit():
+                    self.send_response(429)
+                    if endpoint.retry_after:
+                        self.send_header("Retry-After", "1")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                time.sleep(endpoint.latency)
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            # The default listen backlog of 5 resets connections from bursts of callers
+            request_queue_size = 128
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def admit(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.quota:
+                self.throttled += 1
+                return False
+            self._recent.append(now)
+            self.served += 1
+            return True
+
+    def reset(self):
+        with self._lock:
+            self.served = self.throttled = 0
+            self._recent.clear()
+
+    def call(self, prompt):
+        """
+        call_fn for LLMClient / LLMScheduler: raises RateLimited on 429.
+        """
+        request = urllib.request.Request(self.url, data=prompt.encode("utf-8"), method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.read().decode("utf-8")
+        except urllib.error.HTTPError as e:
+            retry_after = e.headers.get("Retry-After")
+            retry_after = float(retry_after) if retry_after else None
+            if e.code == 429:
+                raise RateLimited("429 Too Many Requests", retry_after=retry_after) from e
+            if e.code >= 500:
+                raise RetryableLLMError(f"HTTP {e.code}", retry_after=retry_after) from e
+            raise
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def sleep_retry_call(call_fn, prompt, max_retries=7):
+    # The per-thread backoff the scheduler replaces
+    for i in range(max_retries):
+        try:
+            return call_fn(prompt)
+        except RateLimited:
+            if i == max_retries - 1:
+                raise
+            time.sleep(2 ** i + random.uniform(0, 1))
+
+
+def run_mode(mode, endpoint, calls, threads, overshoot):
+    endpoint.reset()
+    scheduler = None
+    if mode == "scheduler":
+        # The endpoint's quota window is a second, not a minute, so the
+        # scheduler's burst and recovery times are scaled down to match
+        scheduler = LLMScheduler(requests_per_minute=endpoint.quota * 60 * overshoot, max_concurrency=threads,
+                                 burst_seconds=0.25, recovery_seconds=0.5)
+
+    def one(i):
+        priority = "generate" if i % 2 == 0 else "audit"
+        prompt = f"{priority} prompt {i} " + "x" * 200
+        try:
+            if scheduler is not None:
+                scheduler.submit(endpoint.call, prompt, priority=priority)
+            else:
+                sleep_retry_call(endpoint.call, prompt)
+            return True
+        except (RateLimited, RuntimeError):
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        ok = list(pool.map(one, range(calls)))
+    seconds = time.perf_counter() - start
+
+    result = {
+        "mode": mode,
+        "seconds": round(seconds, 3),
+        "calls": calls,
+        "failed": ok.count(False),
+        "served": endpoint.served,
+        "throttled_429": endpoint.throttled,
+        "ideal_seconds": round(calls / endpoint.quota, 3),
+    }
+    if scheduler is not None:
+        result["scheduler"] = scheduler.metrics()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quota", type=int, default=20, help="Requests per second the fake endpoint admits")
+    parser.add_argument("--calls", type=int, default=200, help="Calls to make in each mode")
+    parser.add_argument("--threads", type=int, default=16, help="Concurrent callers")
+    parser.add_argument("--overshoot", type=float, default=2.0,
+                        help="Scheduler's configured rate as a multiple of the real quota")
+    parser.add_argument("--no-retry-after", action="store_true", help="Send 429s without a Retry-After header")
+    parser.add_argument("--modes", default="sleep,scheduler")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write results to this file")
+    args = parser.parse_args()
+
+    endpoint = FakeEndpoint(args.quota, retry_after=not args.no_retry_after)
+    results = []
+    try:
+        for mode in (m.strip() for m in args.modes.split(",") if m.strip()):
+            result = run_mode(mode, endpoint, args.calls, args.threads, args.overshoot)
+            results.append(result)
+            line = (f"{mode:10s} {result['seconds']:8.2f}s (ideal {result['ideal_seconds']:.2f}s)  "
+                    f"429s={result['throttled_429']:<5d} failed={result['failed']}")
+            if "scheduler" in result:
+                by_priority = result["scheduler"]["by_priority"]
+                waits = "  ".join(
+                    f"{name} wait={entry['queue_wait_seconds'] / max(entry['calls'], 1):.2f}s/call"
+                    for name, entry in sorted(by_priority.items())
+                )
+                line += f"  rate={result['scheduler']['rate_fraction']:.0%}  {waits}"
+            print(line)
+    finally:
+        endpoint.close()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if any(r["mode"] == "scheduler" and r["failed"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
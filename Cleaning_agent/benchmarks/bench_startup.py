@@ -0,0 +1,105 @@
+"""
+Cold-import benchmark for the web app and the Cleaning_agent package.
+
+Each target is imported in a fresh interpreter, started in an empty
+temporary directory, several times. The benchmark fails (exit code 1)
+when a target's median import time is over its budget, when importing
+pulls in a heavy dependency it should load lazily (pandas, numpy,
+pyarrow, google.genai), or when importing creates files.
+
+Usage (from the Cleaning_agent folder):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(AGENT_DIR)
+
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "google.genai")
+
+# (module, directory it is imported from, budget in seconds)
+TARGETS = [
+    ("Cleaning_agent", REPO_ROOT, 0.05),
+    ("Cleaning_agent.rules_read_toon", REPO_ROOT, 0.05),
+    ("llms.gemini_client", AGENT_DIR, 0.05),
+    ("app", REPO_ROOT, 0.5),
+]
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def import_once(module, path):
+    with tempfile.TemporaryDirectory() as cwd:
+        env = dict(os.environ, PYTHONPATH=path, PYTHONDONTWRITEBYTECODE="1")
+        result = subprocess.run(
+            [sys.executable, "-c", CHILD.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=cwd, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+        measured = json.loads(result.stdout.strip().splitlines()[-1])
+        measured["created_files"] = sorted(os.listdir(cwd))
+    return measured
+
+
+def bench_target(module, path, budget, repeat):
+    runs = [import_once(module, path) for _ in range(repeat)]
+    seconds = [r["seconds"] for r in runs]
+    result = {
+        "module": module,
+        "budget_seconds": budget,
+        "median_seconds": round(statistics.median(seconds), 4),
+        "min_seconds": round(min(seconds), 4),
+        "max_seconds": round(max(seconds), 4),
+        "heavy_imports": sorted({m for r in runs for m in r["heavy"]}),
+        "created_files": sorted({f for r in runs for f in r["created_files"]}),
+    }
+
+    problems = []
+    if result["median_seconds"] > budget:
+        problems.append(f"median {result['median_seconds']}s over budget {budget}s")
+    if result["heavy_imports"]:
+        problems.append(f"imports {', '.join(result['heavy_imports'])}")
+    if result["created_files"]:
+        problems.append(f"creates {', '.join(result['created_files'])}")
+    result["problems"] = problems
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per target")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for module, path, budget in TARGETS:
+        result = bench_target(module, path, budget, args.repeat)
+        results.append(result)
+        status = "OK" if not result["problems"] else "FAIL: " + "; ".join(result["problems"])
+        print(f"{module:32s} median={result['median_seconds']:.4f}s  "
+              f"min={result['min_seconds']:.4f}s  budget={budget}s  {status}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if any(r["problems"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+TOON encode/decode benchmark against JSON, with a round-trip check.
+
+Three payloads: the metadata document of a synthetic orders frame, a rule
+sheet of --rules rows (the shape rules_read_toon writes), and a table of
+--rows rows. Each is encoded with toon.dumps and with json.dumps (frames
+as to_dict("records")), decoded with toon.loads and json.loads, and the
+decoded TOON is checked against the JSON round trip. Exits non-zero if a
+round trip differs.
+
+Usage (from the Cleaning_agent folder):
+    python benchmarks/bench_toon.py
+    python benchmarks/bench_toon.py --rows 1000000 --rules 20000 --json toon.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import toon  # noqa: E402
+from csv_read_toon import generate_metadata_toon_from_df  # noqa: E402
+from benchmarks.bench_pipeline import make_dataset  # noqa: E402
+
+
+def make_rule_sheet(n_rules):
+    rng = np.random.default_rng(1)
+    columns = np.array(["Email", "Country", "State", "Quantity", "UnitPrice", "OrderDate", "Status"])
+    descriptions = [
+        f"Trim and lower-case {c}, then flag rows where {c} is blank: set Status to \"Review\"."
+        if i % 3 else f"Standardize {c} values\n(see the {c.lower()}_ref sheet, match case-insensitively)"
+        for i, c in enumerate(columns[rng.integers(0, len(columns), n_rules)])
+    ]
+    return pd.DataFrame({
+        "Name": [f"R{i:05d}" for i in range(n_rules)],
+        "description": descriptions,
+        "priority": rng.integers(1, 5, n_rules),
+        "enabled": rng.random(n_rules) > 0.1,
+    })
+
+
+def json_records(df):
+    # What a JSON encoding of the same frame looks like; NaN/NaT become null
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def normalise(value):
+    """
+    Makes a decoded JSON and a decoded TOON value comparable (timestamps
+    are strings in both, floats compared exactly).
+    """
+    if isinstance(value, dict):
+        return {k: normalise(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [normalise(v) for v in value]
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+
+def bench_payload(name, toon_data, json_data, repeat):
+    text, toon_encode = timed(lambda: toon.dumps(toon_data), repeat)
+    decoded, toon_decode = timed(lambda: toon.loads(text), repeat)
+    json_text, json_encode = timed(lambda: json.dumps(json_data, ensure_ascii=False, default=str), repeat)
+    _, json_decode = timed(lambda: json.loads(json_text), repeat)
+
+    return {
+        "payload": name,
+        "toon_bytes": len(text.encode("utf-8")),
+        "json_bytes": len(json_text.encode("utf-8")),
+        "toon_encode_ms": round(toon_encode * 1000, 2),
+        "toon_decode_ms": round(toon_decode * 1000, 2),
+        "json_encode_ms": round(json_encode * 1000, 2),
+        "json_decode_ms": round(json_decode * 1000, 2),
+        "round_trip_ok": normalise(decoded) == normalise(json_data),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows of the table payload")
+    parser.add_argument("--rules", type=int, default=5_000, help="Rows of the rule sheet payload")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is reported)")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write results to this file")
+    args = parser.parse_args()
+
+    orders = make_dataset(args.rows)
+    orders.loc[::7, "Email"] = None
+    rules = make_rule_sheet(args.rules)
+
+    metadata_text = generate_metadata_toon_from_df(orders)
+    metadata = toon.loads(metadata_text)
+
+    payloads = [
+        ("metadata", metadata, metadata),
+        ("rule_sheet", {"rules.xlsx": {"Main": rules}}, {"rules.xlsx": {"Main": json_records(rules)}}),
+        ("table", {"rows": orders}, {"rows": json_records(orders)}),
+    ]
+
+    results = []
+    for name, toon_data, json_data in payloads:
+        result = bench_payload(name, toon_data, json_data, args.repeat)
+        results.append(result)
+        print(f"{name:10s} toon={result['toon_bytes']:>11,}B enc={result['toon_encode_ms']:8.2f}ms "
+              f"dec={result['toon_decode_ms']:8.2f}ms | json={result['json_bytes']:>11,}B "
+              f"enc={result['json_encode_ms']:8.2f}ms dec={result['json_decode_ms']:8.2f}ms | "
+              f"round trip {'OK' if result['round_trip_ok'] else 'FAILED'}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if not all(r["round_trip_ok"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
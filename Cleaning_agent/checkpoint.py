@@ -0,0 +1,229 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+
+
+class CheckpointStore:
+    """
+    Per-rule checkpoints of the working frame, stored as Parquet deltas.
+
+    Step 0 (the input) is written in full. Each later step stores only the
+    columns that rule changed or added, plus the surviving row positions if
+    rows were dropped, so a 60-rule run on a large file costs roughly one
+    full write instead of 60. Any step can be rebuilt with load(step).
+
+    Retention:
+      rebase_every - write a full frame every N steps, which bounds the
+                     delta chain load() has to replay
+      keep_last    - keep at least the last N steps; older segments (a full
+                     frame and its deltas) are deleted once no retained step
+                     needs them. None keeps everything.
+
+    Next to the frames, save_run() keeps what a crashed or killed run needs
+    to continue from its first incomplete rule (see load_run).
+    """
+
+    MANIFEST = "manifest.json"
+    RUN_STATE = "run_state.json"
+
+    def __init__(self, root="checkpoints", keep_last=None, rebase_every=20):
+        self.root = root
+        self.keep_last = keep_last
+        self.rebase_every = rebase_every
+
+        os.makedirs(self.root, exist_ok=True)
+        manifest_path = os.path.join(self.root, self.MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                self.steps = json.load(f)["steps"]
+        else:
+            self.steps = []
+
+    # ---------------- writing ----------------
+
+    def _save_json(self, name, data):
+        # Written aside and renamed, so a crash never leaves half a file
+        path = os.path.join(self.root, name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, default=_json_default)
+        os.replace(tmp_path, path)
+
+    def _save_manifest(self):
+        self._save_json(self.MANIFEST, {"steps": self.steps})
+
+    def _write_frame(self, df, name):
+        """
+        Parquet keeps dtypes; object columns holding mixed Python types can't
+        be expressed in Arrow, so those steps fall back to pickle.
+        """
+        path = os.path.join(self.root, f"{name}.parquet")
+        try:
+            df.to_parquet(path)
+            return os.path.basename(path), "parquet"
+        except (ValueError, TypeError, ImportError) as e:
+            if os.path.exists(path):
+                os.remove(path)
+            print(f"WARNING: Parquet checkpoint failed ({e}); falling back to pickle.")
+            path = os.path.join(self.root, f"{name}.pkl")
+            df.to_pickle(path)
+            return os.path.basename(path), "pickle"
+
+    def _read_frame(self, entry):
+        path = os.path.join(self.root, entry["file"])
+        if entry["format"] == "parquet":
+            return pd.read_parquet(path)
+        return pd.read_pickle(path)
+
+    def write_base(self, df, step=0):
+        file_name, fmt = self._write_frame(df, f"step_{step:04d}_full")
+        self._record({"step": step, "kind": "full", "file": file_name, "format": fmt,
+                      "columns": [str(c) for c in df.columns]})
+        return file_name
+
+    def write_step(self, step, df_before, df_after, diff):
+        """
+        Stores step `step` as a delta against the previous step when the diff
+        allows it, otherwise as a full frame.
+        """
+        last_full = max((e["step"] for e in self.steps if e["kind"] == "full"), default=None)
+        needs_full = (
+            last_full is None
+            or step - last_full >= self.rebase_every
+            or diff.get("aligned_on") == "hash"
+            or diff.get("rows_added", 0) != 0
+            or not all(isinstance(c, str) for c in df_after.columns)
+        )
+        if needs_full:
+            return self.write_base(df_after, step=step)
+
+        changed = list(diff.get("changed_by_column", {}))
+        changed += [c for c in diff.get("retyped_columns", []) if c not in changed]
+        changed += [c for c in diff.get("columns_added", []) if c not in changed]
+
+        delta = df_after[changed].reset_index(drop=True)
+
+        # Rows dropped or reordered (aligned by label, not identical index):
+        # store the positions of the surviving rows in the previous step
+        reindexed = diff.get("aligned_on") == "index"
+        if reindexed:
+            delta["__row_position__"] = df_before.index.get_indexer(df_after.index)
+
+        file_name, fmt = self._write_frame(delta, f"step_{step:04d}_delta")
+        self._record({"step": step, "kind": "delta", "file": file_name, "format": fmt,
+                      "columns": list(df_after.columns), "changed": changed,
+                      "reindexed": reindexed})
+        return file_name
+
+    def _record(self, entry):
+        self.steps = [e for e in self.steps if e["step"] != entry["step"]] + [entry]
+        self.steps.sort(key=lambda e: e["step"])
+        self._apply_retention()
+        self._save_manifest()
+
+    def _apply_retention(self):
+        if self.keep_last is None or len(self.steps) <= self.keep_last:
+            return
+
+        oldest_kept = self.steps[-self.keep_last]["step"]
+        # The newest full frame at or before the oldest retained step is still
+        # needed to rebuild it; everything older can go.
+        anchors = [e["step"] for e in self.steps if e["kind"] == "full" and e["step"] <= oldest_kept]
+        if not anchors:
+            return
+
+        cutoff = max(anchors)
+        for entry in [e for e in self.steps if e["step"] < cutoff]:
+            path = os.path.join(self.root, entry["file"])
+            if os.path.exists(path):
+                os.remove(path)
+        self.steps = [e for e in self.steps if e["step"] >= cutoff]
+
+    def save_run(self, state, rules, metadata_toon, pending_audits=()):
+        """
+        Records a run's progress after a completed rule: the rules, the
+        index of the first incomplete one (state.rule_index), the history,
+        the code each rule ran, the rule logs, the metadata for the next
+        rule and audits still queued for a batch. The frame itself is the
+        latest step written with write_step/write_base.
+        """
+        self._save_json(self.RUN_STATE, {
+            "next_rule": state.rule_index,
+            "rules": list(rules),
+            "history": state.history,
+            "code": {str(index): code for index, code in state.code.items()},
+            "log_paths": {str(index): path for index, path in state.log_paths.items()},
+            "metadata_toon": metadata_toon,
+            "pending_audits": list(pending_audits),
+        })
+
+    # ---------------- reading ----------------
+
+    def load_run(self):
+        """
+        The last save_run() record, with the frame as it was before its
+        next_rule under "df", or None if no rule was completed. Rules
+        skipped or fused since the last written step left the frame as
+        that step has it.
+        """
+        path = os.path.join(self.root, self.RUN_STATE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            run = json.load(f)
+
+        run["df"] = self.load(run["next_rule"])
+        run["code"] = {int(index): code for index, code in run["code"].items()}
+        run["log_paths"] = {int(index): path for index, path in run["log_paths"].items()}
+        return run
+
+    def available_steps(self):
+        return [e["step"] for e in self.steps]
+
+    def load(self, step):
+        """
+        Rebuilds the frame as it was after `step` (0 = input). Skipped
+        rules and rules fused into a later one write no step; they left the
+        frame as the latest recorded step before them has it.
+        """
+        by_step = {e["step"]: e for e in self.steps}
+        recorded = [s for s in by_step if s <= step]
+        if not recorded:
+            raise KeyError(f"No checkpoint at or before step {step}; available: {self.available_steps()}")
+        step = max(recorded)
+
+        base_step = max(e["step"] for e in self.steps if e["kind"] == "full" and e["step"] <= step)
+        df = self._read_frame(by_step[base_step])
+
+        for entry in self.steps:
+            if entry["step"] <= base_step or entry["step"] > step:
+                continue
+
+            delta = self._read_frame(entry)
+            if entry["reindexed"]:
+                df = df.iloc[delta.pop("__row_position__").to_numpy()]
+
+            for col in entry["changed"]:
+                df[col] = delta[col].set_axis(df.index)
+
+            df = df[entry["columns"]]
+
+        return df
+
+    def export_csv(self, step, path):
+        self.load(step).to_csv(path, index=False)
+        return path
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+        self.steps = []
+
+
+def _json_default(value):
+    # numpy scalars in history entries (counts, timings, memory)
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
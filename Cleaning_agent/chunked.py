@@ -0,0 +1,279 @@
+import ast
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from sandbox import execute
+
+# Methods whose result for one row depends on other rows. Code that uses any
+# of them cannot be run chunk by chunk and must see the whole frame.
+GLOBAL_OPERATIONS = {
+    # ordering / positions
+    "sort_values", "sort_index", "iloc", "iat", "head", "tail", "nlargest", "nsmallest",
+    "reset_index", "reindex", "index", "shape", "size",
+    # duplicates / grouping / joins
+    "drop_duplicates", "duplicated", "groupby", "merge", "join", "concat",
+    "pivot", "pivot_table", "melt", "stack", "unstack", "explode", "crosstab",
+    # neighbouring rows
+    "shift", "diff", "pct_change", "rolling", "expanding", "ewm",
+    "ffill", "bfill", "pad", "backfill", "interpolate",
+    "cumsum", "cumprod", "cummax", "cummin", "cumcount", "rank",
+    # column-wide aggregates
+    "sum", "mean", "median", "mode", "min", "max", "std", "var", "quantile",
+    "count", "nunique", "unique", "value_counts", "describe", "agg", "aggregate",
+    "transform", "idxmin", "idxmax", "sample", "first", "last", "all", "any",
+}
+
+# Builtins that look at the whole frame
+GLOBAL_CALLS = {"len", "sorted", "sum", "max", "min"}
+
+# numpy and pandas functions that work value by value. Any other np.* / pd.*
+# call may look at a whole column (np.percentile, np.nanmean, pd.qcut, ...).
+ELEMENTWISE_FUNCTIONS = {
+    "where", "select", "isnan", "isfinite", "isinf", "isna", "isnull", "notna", "notnull",
+    "abs", "absolute", "round", "around", "floor", "ceil", "trunc", "rint", "sign",
+    "sqrt", "exp", "log", "log10", "log2", "log1p", "power",
+    "maximum", "minimum", "fmax", "fmin", "clip", "logical_and", "logical_or", "logical_not",
+    "to_numeric", "to_datetime", "to_timedelta", "Timestamp", "Timedelta",
+}
+MODULES = {"np": "numpy", "numpy": "numpy", "pd": "pandas", "pandas": "pandas"}
+
+# Builtins and methods that turn values into a lookup: built from the frame's
+# own values, each chunk would only see its part of them
+COLLECTION_CALLS = {"set", "frozenset", "dict", "list", "tuple", "zip", "enumerate", "iter", "next", "any", "all"}
+LOOKUP_METHODS = {"isin", "map", "replace", "searchsorted"}
+
+# Attributes of a frame that are the same in every chunk
+SCHEMA_ATTRIBUTES = {"columns", "dtypes", "dtype"}
+
+# Rows read to find the text columns when the caller gives no dtypes
+DTYPE_SAMPLE_ROWS = 10_000
+
+
+class ChunkFailed(RuntimeError):
+    """
+    Code that passed on the sample failed on a chunk of the full pass.
+    """
+
+
+def _dotted_name(node):
+    # "np.random.rand" for np.random.rand, None if it isn't a plain dotted name
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def _library_call(name, modules):
+    """
+    True when the dotted name is a numpy or pandas function that isn't
+    known to be elementwise. pandas' dtype checks (pd.api.types.is_*) are
+    fine: every chunk has the pinned dtypes.
+    """
+    parts = name.split(".")
+    if modules.get(parts[0]) is None or len(parts) < 2:
+        return False
+    if modules[parts[0]] == "pandas" and parts[1:3] == ["api", "types"]:
+        return False
+    return parts[-1] not in ELEMENTWISE_FUNCTIONS
+
+
+def is_row_local(code):
+    """
+    Decides from the AST whether apply_rule(df) can run on row chunks
+    independently (trimming, regex normalisation, per-row validation).
+
+    Returns (row_local, reason). Anything that might depend on other rows
+    makes the rule global: the methods in GLOBAL_OPERATIONS, numpy and
+    pandas functions not known to be elementwise (ELEMENTWISE_FUNCTIONS),
+    and lookups built from the frame's values (set(df["x"]),
+    .isin(df["x"]), .map(series), `in df["x"].values`).
+    """
+    tree = ast.parse(code)
+    parents = {}
+    for node in ast.walk(tree):
+        for child in ast.iter_child_nodes(node):
+            parents[child] = node
+
+    modules = dict(MODULES)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name in MODULES:
+                    modules[alias.asname or alias.name] = MODULES[alias.name]
+        elif isinstance(node, ast.ImportFrom) and (node.module or "").split(".")[0] in MODULES:
+            names = [alias.name for alias in node.names if alias.name not in ELEMENTWISE_FUNCTIONS]
+            if names:
+                return False, f"imports {', '.join(names)} from {node.module}"
+
+    # Names holding the frame's values: apply_rule's parameter and anything assigned from it
+    apply_rule = next((node for node in tree.body if isinstance(node, ast.FunctionDef)
+                       and node.name == "apply_rule"), None)
+    frames = {arg.arg for arg in apply_rule.args.args} if apply_rule is not None else {"df"}
+    values = set(frames)
+
+    def schema_only(name):
+        # df.columns, df.select_dtypes("object").columns, df["x"].dtype, ...
+        child, node = name, parents.get(name)
+        while (isinstance(node, (ast.Attribute, ast.Subscript)) and node.value is child
+               or isinstance(node, ast.Call) and node.func is child):
+            if isinstance(node, ast.Attribute) and node.attr in SCHEMA_ATTRIBUTES:
+                return True
+            child, node = node, parents.get(node)
+        return False
+
+    def reads_values(node):
+        return any(isinstance(child, ast.Name) and child.id in values and not schema_only(child)
+                   for child in ast.walk(node))
+
+    changed = True
+    while changed:
+        changed = False
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Assign):
+                targets, source = node.targets, node.value
+            elif isinstance(node, (ast.AugAssign, ast.AnnAssign)) and node.value is not None:
+                targets, source = [node.target], node.value
+            elif isinstance(node, (ast.For, ast.comprehension)):
+                targets, source = [node.target], node.iter
+            else:
+                continue
+            if not reads_values(source):
+                continue
+            for target in targets:
+                for name in ast.walk(target):
+                    if isinstance(name, ast.Name) and name.id not in values:
+                        values.add(name.id)
+                        changed = True
+
+    # Aggregates that only feed issue messages (e.g. issues.append(f"{mask.sum()} bad rows"))
+    # are fine: each chunk simply reports its own count.
+    issue_only = set()
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr in ("append", "extend")
+            and isinstance(node.func.value, ast.Name)
+            and node.func.value.id == "issues"
+        ):
+            for arg in node.args:
+                issue_only.update(id(child) for child in ast.walk(arg))
+
+    for node in ast.walk(tree):
+        if id(node) in issue_only:
+            continue
+        if isinstance(node, ast.Attribute) and node.attr in GLOBAL_OPERATIONS:
+            return False, f"uses .{node.attr}"
+        if isinstance(node, ast.Compare):
+            # Membership in the frame's values; `"x" in df` only checks a column name
+            for op, right in zip(node.ops, node.comparators):
+                if (isinstance(op, (ast.In, ast.NotIn)) and reads_values(right)
+                        and not (isinstance(right, ast.Name) and right.id in frames)):
+                    return False, "tests membership in the frame's values"
+        if not isinstance(node, ast.Call):
+            continue
+        arguments = list(node.args) + [kw.value for kw in node.keywords]
+        if isinstance(node.func, ast.Name):
+            if node.func.id in GLOBAL_CALLS:
+                return False, f"calls {node.func.id}()"
+            if node.func.id in COLLECTION_CALLS and any(reads_values(arg) for arg in arguments):
+                return False, f"builds {node.func.id}() from the frame's values"
+        name = _dotted_name(node.func)
+        if name is not None and _library_call(name, modules):
+            return False, f"calls {name}()"
+        if isinstance(node.func, ast.Attribute):
+            if node.func.attr in LOOKUP_METHODS and any(reads_values(arg) for arg in arguments):
+                return False, f"uses .{node.func.attr} with the frame's values"
+            if node.func.attr == "fillna" and any(kw.arg == "method" for kw in node.keywords):
+                # fillna(method=...) pulls values from neighbouring rows
+                return False, "uses fillna(method=...)"
+
+    return True, "only row-wise operations"
+
+
+def _run_chunk(code, chunk):
+    # Runs in a worker process; must stay a module-level function to be picklable
+    return execute(code, chunk)
+
+
+def text_dtypes(df):
+    """
+    {column: object} for df's text columns, to pin them for every chunk:
+    read_csv infers each chunk's dtypes on its own, and a chunk where a
+    text column is empty would get float64 (and .str would fail on it).
+    """
+    return {col: object for col in df.columns if df[col].dtype == object}
+
+
+def execute_chunked(code, input_path, output_path, chunksize=100_000, max_workers=None, dtype=None):
+    """
+    Streams input_path through apply_rule in chunks on a process pool and
+    appends each result to output_path in input order. Only a bounded number
+    of chunks is in memory at any time, so inputs larger than RAM work.
+
+    dtype: column dtypes for every chunk (see text_dtypes); by default the
+    text columns of the file's first DTYPE_SAMPLE_ROWS rows.
+
+    Only valid for code where is_row_local(code) is True. Raises
+    ChunkFailed if the code fails on a chunk; output_path is then removed.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max_workers * 2
+    if dtype is None:
+        dtype = text_dtypes(pd.read_csv(input_path, nrows=DTYPE_SAMPLE_ROWS, low_memory=False))
+
+    stats = {"rows_in": 0, "rows_out": 0, "chunks": 0, "issues": []}
+    columns = None
+
+    def write(chunk_number, first_row, rows, future):
+        nonlocal columns
+        try:
+            df_out, issues = future.result()
+        except Exception as e:
+            raise ChunkFailed(
+                f"Rule code failed on chunk {chunk_number} (rows {first_row + 1}-{first_row + rows}) "
+                f"of the full pass: {type(e).__name__}: {e}"
+            ) from e
+
+        if columns is None:
+            columns = list(df_out.columns)
+            df_out.to_csv(output_path, index=False, mode="w")
+        else:
+            # Keep every chunk aligned to the first chunk's header
+            df_out.reindex(columns=columns).to_csv(output_path, index=False, header=False, mode="a")
+
+        stats["rows_out"] += len(df_out)
+        stats["issues"].extend(f"chunk {chunk_number}: {issue}" for issue in issues)
+
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            for chunk in pd.read_csv(input_path, chunksize=chunksize, low_memory=False, dtype=dtype):
+                stats["chunks"] += 1
+                pending.append((stats["chunks"], stats["rows_in"], len(chunk), pool.submit(_run_chunk, code, chunk)))
+                stats["rows_in"] += len(chunk)
+
+                while len(pending) >= max_in_flight:
+                    write(*pending.popleft())
+
+            while pending:
+                write(*pending.popleft())
+        except ChunkFailed:
+            pool.shutdown(wait=True, cancel_futures=True)
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+
+    if columns is None:
+        # Empty input: still produce a file with the input header
+        pd.read_csv(input_path, nrows=0).to_csv(output_path, index=False)
+
+    return stats
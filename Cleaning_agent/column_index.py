@@ -0,0 +1,166 @@
+import difflib
+import re
+
+import pandas as pd
+
+# Rules like "trim all string columns" are about the whole table
+_WHOLE_TABLE = re.compile(r"\b(all|every|each|any)\b[\w\s/-]{0,40}\bcolumns?\b", re.IGNORECASE)
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+EXACT_SCORE = 1.0
+ALIAS_SCORE = 0.9
+TOKENS_SCORE = 0.8
+FUZZY_SCORE = 0.7
+VALUE_SCORE = 0.5
+
+
+def normalise_tokens(text):
+    """
+    "Unit Price", "unit_price" and "UnitPrice" all become ["unit", "price"].
+    """
+    return [t for t in _NON_ALNUM.split(_CAMEL.sub(" ", str(text)).lower()) if t]
+
+
+def _singular(key):
+    return key[:-1] if len(key) > 3 and key.endswith("s") and not key.endswith("ss") else key
+
+
+class ColumnIndex:
+    """
+    Maps a rule's text to the columns it most likely refers to, so prompts
+    can carry full metadata for those columns only.
+
+    Built once per run from the column names, optional aliases
+    ({column: [alias, ...]}) and the most frequent values of each text
+    column. A column matches a rule by, in decreasing score:
+      - its normalised name appearing in the rule ("unit price" ~ UnitPrice)
+      - one of its aliases appearing in the rule
+      - every word of a multi-word name appearing somewhere in the rule
+      - a close spelling of its name (difflib ratio >= fuzzy_cutoff)
+      - one of its frequent values being quoted by the rule ("Cancelled")
+
+    relevant_columns() returns None when the rule is about the whole table
+    ("all string columns") or names no column, meaning: use full metadata.
+    """
+
+    def __init__(self, df: pd.DataFrame, aliases: dict = None, sample_rows=10_000, values_per_column=50,
+                 fuzzy_cutoff=0.85, min_score=VALUE_SCORE):
+        self.aliases = aliases or {}
+        self.sample_rows = sample_rows
+        self.values_per_column = values_per_column
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.min_score = min_score
+
+        self._names = {}   # name key -> columns
+        self._names_by_length = {}  # len(name key) -> name keys, for fuzzy lookups
+        self._aliases = {}  # alias key -> columns
+        self._words = {}   # column -> set of name tokens (multi-word names only)
+        self._values = {}  # value key -> columns
+        self._max_ngram = 1
+        self._indexed = set()
+        self.update(df)
+
+    def _add(self, mapping, key, column):
+        if key:
+            mapping.setdefault(key, set()).add(column)
+
+    def update(self, df: pd.DataFrame):
+        """
+        Indexes columns added since the last call (e.g. by a rule); dropped
+        columns are filtered out at lookup time.
+        """
+        head = None
+        for column in df.columns:
+            if column in self._indexed:
+                continue
+            self._indexed.add(column)
+
+            tokens = normalise_tokens(column)
+            self._max_ngram = max(self._max_ngram, len(tokens))
+            name_key = _singular("".join(tokens))
+            if name_key and name_key not in self._names:
+                self._names_by_length.setdefault(len(name_key), []).append(name_key)
+            self._add(self._names, name_key, column)
+            if len(tokens) > 1:
+                self._words[column] = set(tokens)
+
+            for alias in self.aliases.get(column, []):
+                alias_tokens = normalise_tokens(alias)
+                self._max_ngram = max(self._max_ngram, len(alias_tokens))
+                self._add(self._aliases, _singular("".join(alias_tokens)), column)
+
+            if head is None:
+                head = df.head(self.sample_rows)
+            series = head[column]
+            if isinstance(series, pd.DataFrame) or not (
+                    pd.api.types.is_object_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype)):
+                continue
+            for value in series.dropna().astype(str).value_counts().index[:self.values_per_column]:
+                value_tokens = normalise_tokens(value)
+                key = "".join(value_tokens)
+                # Short or numeric values ("1", "NY") match too much prose
+                if len(key) >= 3 and not key.isdigit() and len(value_tokens) <= 4:
+                    self._max_ngram = max(self._max_ngram, len(value_tokens))
+                    self._add(self._values, _singular(key), column)
+
+    def _ngrams(self, tokens):
+        grams = set()
+        for n in range(1, self._max_ngram + 1):
+            for i in range(len(tokens) - n + 1):
+                grams.add(_singular("".join(tokens[i:i + n])))
+        return grams
+
+    def scores(self, rule: str) -> dict:
+        """
+        {column: score} for every column the rule matches.
+        """
+        tokens = normalise_tokens(rule)
+        grams = self._ngrams(tokens)
+        words = set(tokens) | {_singular(t) for t in tokens}
+        scores = {}
+
+        def hit(columns, score):
+            for column in columns:
+                scores[column] = max(scores.get(column, 0.0), score)
+
+        for gram in grams:
+            hit(self._names.get(gram, ()), EXACT_SCORE)
+            hit(self._aliases.get(gram, ()), ALIAS_SCORE)
+            hit(self._values.get(gram, ()), VALUE_SCORE)
+
+        for column, name_words in self._words.items():
+            if name_words <= words:
+                hit([column], TOKENS_SCORE)
+
+        # Misspellings and abbreviations close to a whole name; only compare
+        # names of similar length, and never very short ones
+        matcher = difflib.SequenceMatcher(autojunk=False)
+        for gram in grams:
+            if len(gram) < 5:
+                continue
+            matcher.set_seq2(gram)
+            slack = int(len(gram) * (1 - self.fuzzy_cutoff)) + 1
+            for length in range(max(5, len(gram) - slack), len(gram) + slack + 1):
+                for key in self._names_by_length.get(length, ()):
+                    matcher.set_seq1(key)
+                    if matcher.quick_ratio() >= self.fuzzy_cutoff and matcher.ratio() >= self.fuzzy_cutoff:
+                        hit(self._names[key], FUZZY_SCORE)
+
+        return scores
+
+    def relevant_columns(self, rule: str, columns=None):
+        """
+        Columns the rule refers to, best match first, restricted to columns
+        (the current frame's) if given; None if it is a whole-table rule
+        or no column matched.
+        """
+        if _WHOLE_TABLE.search(rule):
+            return None
+        scores = self.scores(rule)
+        present = None if columns is None else set(columns)
+        ranked = sorted(
+            (c for c, s in scores.items() if s >= self.min_score and (present is None or c in present)),
+            key=lambda c: -scores[c]
+        )
+        return ranked or None
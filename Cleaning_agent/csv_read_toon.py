@@ -1,117 +1,293 @@
 import pandas as pd
 import os
-import numpy as np
-
-
-# Reusing the same encoder function for consistency
-def to_toon(data, indent=0):
-    spaces = " " * indent
-    output = []
-
-    if isinstance(data, dict):
-        for key, value in data.items():
-            # 1. Check for Tabular Data (List of Uniform Dicts)
-            if isinstance(value, list) and value and isinstance(value[0], dict):
-                keys = list(value[0].keys())
-                # Ensure uniformity
-                if all(isinstance(x, dict) and list(x.keys()) == keys for x in value):
-                    # Header: key[N]{col1,col2}:
-                    headers = ",".join(str(k) for k in keys)
-                    output.append(f"{spaces}{key}[{len(value)}]{{{headers}}}:")
-                    # Rows
-                    for item in value:
-                        row = []
-                        for k in keys:
-                            val = item.get(k)
-                            if val is None or (isinstance(val, float) and np.isnan(val)):
-                                row.append("null")
-                            elif isinstance(val, (int, float, bool)):
-                                row.append(str(val).lower())
-                            else:
-                                s_val = str(val)
-                                if any(c in s_val for c in [",", "\n", ":", "{", "}"]):
-                                    row.append(f'"{s_val}"')
-                                else:
-                                    row.append(s_val)
-                        output.append(f"{spaces}  " + ",".join(row))
-                    continue
+import hashlib
 
-            # 2. Recursive Dict
-            if isinstance(value, dict):
-                output.append(f"{spaces}{key}:")
-                output.append(to_toon(value, indent + 2))
-
-            # 3. Lists (Non-tabular)
-            elif isinstance(value, list):
-                if not value:
-                    output.append(f"{spaces}{key}[0]:")
-                elif isinstance(value[0], (int, float, bool, str)):
-                    # Inline primitive list
-                    clean_vals = []
-                    for x in value:
-                        if isinstance(x, str) and "," in x:
-                            clean_vals.append(f'"{x}"')
-                        else:
-                            clean_vals.append(str(x))
-                    output.append(f"{spaces}{key}[{len(value)}]: {', '.join(clean_vals)}")
-                else:
-                    # Complex/Mixed list
-                    output.append(f"{spaces}{key}[{len(value)}]:")
-                    for item in value:
-                        output.append(to_toon(item, indent + 2))
+from toon import dumps, format_scalar
+from llms.tokens import estimate_tokens
+
+
+def _dtype_note(series: pd.Series):
+    """
+    What generated code must know about the compact dtypes ingest.py loads
+    columns as, or None for plain pandas dtypes.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return (f"categorical with {len(dtype.categories)} categories; assigning a value outside them raises, "
+                "so convert with .astype('string') or add it with .cat.add_categories first")
+    if isinstance(dtype, pd.StringDtype) and dtype.storage == "pyarrow":
+        return "Arrow-backed strings; missing values are pd.NA"
+    if dtype.kind in "iu" and dtype.itemsize < 8:
+        return f"downcast to {dtype}; cast to int64 before arithmetic that may overflow"
+    if dtype == "float32":
+        return "downcast to float32; cast to float64 before arithmetic that needs full precision"
+    return None
+
+
+def profile_column(series: pd.Series, total_rows: int) -> dict:
+    """
+    The Column_Details entry for one column. Columns loaded with a compact
+    dtype (see ingest.optimize_dtypes) get a Dtype_Note on how to handle it.
+    """
+    desc = series.describe().to_dict()
+    for key, value in desc.items():
+        if pd.api.types.is_number(value):
+            desc[key] = float(value)
+
+    null_count = int(series.isnull().sum())
+    null_percentage = (null_count / total_rows) * 100 if total_rows > 0 else 0
+
+    profile = {
+        "Data_Type": str(series.dtype),
+        "Non_Null_Count": int(total_rows - null_count),
+        "Null_Count": null_count,
+        "Null_Percentage": round(float(null_percentage), 2),
+        "Unique_Values_Count": int(series.nunique()),
+        "Descriptive_Stats": desc,
+    }
+    note = _dtype_note(series)
+    if note is not None:
+        profile["Dtype_Note"] = note
+    return profile
+
+
+def column_fingerprint(series: pd.Series) -> str:
+    """
+    Content hash of one column (name, dtype and values in order).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{series.name}|{series.dtype}|{len(series)}".encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class ColumnProfileCache:
+    """
+    Keeps each column's profile between rules so metadata regeneration only
+    pays describe()/nunique() for columns a rule actually touched.
 
-            # 4. Primitives
+    Entries are keyed by column_fingerprint. When the caller passes the
+    compute_diff result of the last rule, columns the diff reports as
+    untouched are reused without even being hashed.
+    """
+
+    def __init__(self):
+        self._entries = {}  # column -> (fingerprint, rows, profile)
+        self.reused = 0
+        self.recomputed = 0
+
+    def _untouched_columns(self, df, diff):
+        if diff is None or diff.get("aligned_on") != "identical":
+            return set()
+
+        dirty = set(diff.get("changed_by_column", {}))
+        dirty.update(diff.get("retyped_columns", []))
+        dirty.update(diff.get("columns_added", []))
+        return {col for col in df.columns if col not in dirty}
+
+    def profiles(self, df: pd.DataFrame, diff: dict = None) -> dict:
+        total_rows = int(df.shape[0])
+        untouched = self._untouched_columns(df, diff)
+        result = {}
+
+        for col_name in df.columns:
+            entry = self._entries.get(col_name)
+
+            if entry is not None and entry[1] == total_rows:
+                if col_name in untouched:
+                    result[col_name] = entry[2]
+                    self.reused += 1
+                    continue
+
+                fingerprint = column_fingerprint(df[col_name])
+                if fingerprint == entry[0]:
+                    result[col_name] = entry[2]
+                    self.reused += 1
+                    continue
             else:
-                val_str = str(value)
-                if isinstance(value, bool): val_str = val_str.lower()
-                if value is None: val_str = "null"
-                if pd.isna(value): val_str = "null"  # Handle numpy NaN
+                fingerprint = column_fingerprint(df[col_name])
+
+            profile = profile_column(df[col_name], total_rows)
+            self._entries[col_name] = (fingerprint, total_rows, profile)
+            result[col_name] = profile
+            self.recomputed += 1
+
+        # Forget dropped columns
+        for col_name in list(self._entries):
+            if col_name not in result:
+                del self._entries[col_name]
 
-                # Quote if necessary
-                if any(c in val_str for c in [",", "\n", ":"]):
-                    val_str = f'"{val_str}"'
+        return result
 
-                output.append(f"{spaces}{key}: {val_str}")
 
-        return "\n".join(output)
-    return str(data)
+def _column_profiles(df, profile_cache=None, diff=None):
+    if profile_cache is not None:
+        return profile_cache.profiles(df, diff)
+    total_rows = int(df.shape[0])
+    return {col_name: profile_column(df[col_name], total_rows) for col_name in df.columns}
 
-def generate_metadata_toon_from_df(df: pd.DataFrame, file_name: str = "dataframe") -> str:
+
+def _metadata_document(df, file_name, profiles, no_stats=(), no_samples=(), collapsed=(), total_rows=None,
+                       sample_key="Sample_Rows_Head_3", profile_note=None):
     """
-    Generates a TOON metadata string directly from an in-memory DataFrame.
+    The metadata dict, with some columns degraded: no_stats columns lose
+    Descriptive_Stats, no_samples columns are left out of the sample rows,
+    collapsed columns are only listed by name and dtype in Other_Columns.
+
+    total_rows / sample_key / profile_note: for metadata profiled from a
+    stream (see stream_profile.py), where df only holds sample rows.
     """
-    sample_rows = df.head(3).replace({np.nan: None}).to_dict('records')
+    sample_positions = [i for i, col in enumerate(df.columns) if col not in no_samples and col not in collapsed]
 
     metadata = {
         "File_Name": file_name,
-        "Total_Rows": int(df.shape[0]),
+        "Total_Rows": int(df.shape[0]) if total_rows is None else int(total_rows),
         "Total_Columns": int(df.shape[1]),
-        "Sample_Rows_Head_3": sample_rows,
-        "Column_Details": {}
     }
+    if profile_note:
+        metadata["Profile_Note"] = profile_note
+    if sample_positions:
+        metadata[sample_key] = df.head(3).iloc[:, sample_positions]
+    metadata["Column_Details"] = {}
+
+    for col_name, profile in profiles.items():
+        if col_name in collapsed:
+            continue
+        if col_name in no_stats:
+            profile = {k: v for k, v in profile.items() if k != "Descriptive_Stats"}
+            if "Approximate" in profile:
+                approximate = [m for m in profile["Approximate"] if not m.startswith("Descriptive_Stats.")]
+                if approximate:
+                    profile["Approximate"] = approximate
+                else:
+                    del profile["Approximate"]
+        metadata["Column_Details"][col_name] = profile
+
+    if collapsed:
+        metadata["Other_Columns"] = [
+            {"Name": col_name, "Data_Type": profiles[col_name]["Data_Type"]}
+            for col_name in profiles if col_name in collapsed
+        ]
+
+    left_out = []
+    if no_stats:
+        left_out.append(f"Descriptive_Stats omitted for {len(no_stats)} columns")
+    if no_samples:
+        left_out.append(f"sample values omitted for {len(no_samples)} columns")
+    if collapsed:
+        left_out.append(f"{len(collapsed)} columns listed only by name and dtype in Other_Columns")
+    if left_out:
+        metadata["Detail_Note"] = "Detail left out to keep the prompt short: " + "; ".join(left_out) + "."
+    return metadata
+
+
+def _degradation_steps(df, profiles, priority_columns):
+    """
+    (level, column, estimated tokens saved) in the order detail is given
+    up: stats of every column from the lowest priority up, then their
+    samples, then whole columns collapsed to name and dtype.
+    """
+    order = [c for c in (priority_columns or []) if c in profiles]
+    order += [c for c in profiles if c not in set(order)]
+    order.reverse()
+
+    head = df.head(3)
+    steps = []
+    for col_name in order:
+        stats = profiles[col_name].get("Descriptive_Stats")
+        if stats:
+            steps.append(("stats", col_name, estimate_tokens(dumps({"Descriptive_Stats": stats}))))
+    for col_name in order:
+        # The column's share of the sample table: its header name and cells
+        cells = ",".join(format_scalar(v) for v in head[col_name].tolist()) if col_name in head else ""
+        steps.append(("samples", col_name, estimate_tokens(f"{col_name},{cells}")))
+    for col_name in order:
+        profile = {k: v for k, v in profiles[col_name].items() if k != "Descriptive_Stats"}
+        detail = estimate_tokens(dumps({col_name: profile}))
+        listed = estimate_tokens(f"{col_name},{profile['Data_Type']}")
+        steps.append(("collapse", col_name, detail - listed))
+    return steps
+
+
+# A diff saying the frame has not changed since the profile cache last saw
+# it: every cached profile is reused without hashing the columns again
+UNCHANGED = {"aligned_on": "identical"}
+
+
+def generate_metadata_toon_from_df(df: pd.DataFrame, file_name: str = "dataframe",
+                                   profile_cache: ColumnProfileCache = None, diff: dict = None,
+                                   token_budget: int = None, priority_columns: list = None,
+                                   focus_columns: list = None) -> str:
+    """
+    Generates a TOON metadata string directly from an in-memory DataFrame.
 
-    dtypes_series = df.dtypes
-    nulls_series = df.isnull().sum()
+    profile_cache / diff: reuse unchanged column profiles from the previous
+    call instead of recomputing every column (see ColumnProfileCache).
 
-    for col_name in df.columns:
-        desc = df[col_name].describe().to_dict()
-        for key, value in desc.items():
-            if pd.api.types.is_number(value):
-                desc[key] = float(value)
+    token_budget: keep the output within about this many tokens (see
+    llms.tokens.estimate_tokens) by degrading the lowest-priority columns
+    first, in this order: drop their Descriptive_Stats, then their sample
+    values, then list them only by name and dtype. priority_columns rank
+    first, in the order given; the other columns follow in frame order.
+
+    focus_columns: full detail (and samples) only for these columns, e.g.
+    the ones a rule refers to (see column_index.ColumnIndex); every other
+    column is listed by name and dtype under Other_Columns. They also
+    rank first for the token budget.
+    """
+    profiles = _column_profiles(df, profile_cache, diff)
+    return _metadata_toon(df, file_name, profiles, token_budget, priority_columns, focus_columns)
 
-        unique_count = df[col_name].nunique()
-        null_percentage = (nulls_series[col_name] / metadata["Total_Rows"]) * 100 if metadata["Total_Rows"] > 0 else 0
 
-        metadata["Column_Details"][col_name] = {
-            "Data_Type": str(dtypes_series[col_name]),
-            "Non_Null_Count": int(metadata["Total_Rows"] - nulls_series[col_name]),
-            "Null_Count": int(nulls_series[col_name]),
-            "Null_Percentage": round(float(null_percentage), 2),
-            "Unique_Values_Count": int(unique_count),
-            "Descriptive_Stats": desc,
-        }
+def _metadata_toon(df, file_name, profiles, token_budget=None, priority_columns=None, focus_columns=None,
+                   **document):
+    """
+    The metadata of profiles as TOON, within token_budget (see
+    generate_metadata_toon_from_df). df provides the sample rows;
+    document holds further _metadata_document arguments.
+    """
+    degraded = {"stats": set(), "samples": set(), "collapse": set()}
+    if focus_columns:
+        focus = set(focus_columns)
+        degraded["collapse"] = {c for c in profiles if c not in focus}
+        priority_columns = list(focus_columns)
+
+    toon_output = dumps(_metadata_document(df, file_name, profiles, collapsed=degraded["collapse"], **document))
+    tokens = estimate_tokens(toon_output)
+    if token_budget is None or tokens <= token_budget:
+        return toon_output
+
+    steps = iter(
+        step for step in _degradation_steps(df, profiles, priority_columns)
+        if step[1] not in degraded["collapse"]
+    )
+    full_tokens = tokens
+
+    while tokens > token_budget:
+        # Give up estimated detail until the overshoot is covered, then measure again
+        overshoot, saved, exhausted = tokens - token_budget, 0, True
+        for level, col_name, step_tokens in steps:
+            degraded[level].add(col_name)
+            saved += step_tokens
+            if saved >= overshoot:
+                exhausted = False
+                break
+
+        toon_output = dumps(_metadata_document(
+            df, file_name, profiles,
+            no_stats=degraded["stats"], no_samples=degraded["samples"], collapsed=degraded["collapse"], **document
+        ))
+        tokens = estimate_tokens(toon_output)
+        if exhausted:
+            break
+
+    print(f"INFO: Metadata shortened from ~{full_tokens} to ~{tokens} tokens (budget {token_budget}): "
+          f"stats dropped for {len(degraded['stats'])} columns, samples for {len(degraded['samples'])}, "
+          f"{len(degraded['collapse'])} collapsed to name:dtype.")
+    if tokens > token_budget:
+        print("WARNING: Metadata is still over its token budget with every column collapsed.")
+    return toon_output
 
-    return to_toon(metadata)
 
 def save_toon(toon_output, output_path):
     try:
@@ -122,52 +298,51 @@ def save_toon(toon_output, output_path):
         print(f"\nERROR saving TOON file: {e}")
 
 
-def process_csv_metadata(csv_path, output_folder=None):
+def process_csv_metadata(csv_path, output_folder=None, streaming=False, chunksize=100_000):
+    """
+    Writes <name>_metadata.toon for csv_path. With streaming, the file is
+    profiled in chunks with bounded memory (see stream_profile) instead of
+    being loaded whole.
+    """
     if not os.path.exists(csv_path):
         print(f"Error: CSV file not found at '{csv_path}'")
         return
 
+    file_name = os.path.basename(csv_path)
+    file_basename, extension = os.path.splitext(file_name)
+
+    if streaming:
+        # Imported here: stream_profile builds on this module
+        from stream_profile import generate_metadata_toon_from_csv
+        try:
+            content = generate_metadata_toon_from_csv(csv_path, file_name=file_name, chunksize=chunksize)
+        except Exception as e:
+            print(f"Error reading CSV file '{csv_path}': {e}")
+            return
+        _write_metadata(content, file_basename, output_folder)
+        return
+
     try:
         df = pd.read_csv(csv_path, low_memory=False)
     except Exception as e:
         print(f"Error reading CSV file '{csv_path}': {e}")
         return
 
-    file_name = os.path.basename(csv_path)
-    file_basename, extension = os.path.splitext(file_name)
-
-    # Replaced np.nan with None to ensure clean nulls in TOON
-    sample_rows = df.head(3).replace({np.nan: None}).to_dict('records')
-
     metadata = {
         "File_Name": file_name,
         "Total_Rows": int(df.shape[0]),
         "Total_Columns": int(df.shape[1]),
-        "Sample_Rows_Head_3": sample_rows,  # This will trigger tabular formatting
+        "Sample_Rows_Head_3": df.head(3),  # A DataFrame is written as a TOON table
         "Column_Details": {}
     }
 
-    dtypes_series = df.dtypes
-    nulls_series = df.isnull().sum()
-
     for col_name in df.columns:
-        desc = df[col_name].describe().to_dict()
-        for key, value in desc.items():
-            if pd.api.types.is_number(value):
-                desc[key] = float(value)
-
-        unique_count = df[col_name].nunique()
-        null_percentage = (nulls_series[col_name] / metadata["Total_Rows"]) * 100
-
-        metadata["Column_Details"][col_name] = {
-            "Data_Type": str(dtypes_series[col_name]),
-            "Non_Null_Count": int(metadata["Total_Rows"] - nulls_series[col_name]),
-            "Null_Count": int(nulls_series[col_name]),
-            "Null_Percentage": round(float(null_percentage), 2),
-            "Unique_Values_Count": int(unique_count),
-            "Descriptive_Stats": desc,
-        }
+        metadata["Column_Details"][col_name] = profile_column(df[col_name], metadata["Total_Rows"])
 
+    _write_metadata(dumps(metadata), file_basename, output_folder)
+
+
+def _write_metadata(content, file_basename, output_folder):
     output_filename = file_basename + "_metadata.toon"
 
     if output_folder:
@@ -176,14 +351,18 @@ def process_csv_metadata(csv_path, output_folder=None):
     else:
         output_path = output_filename
 
-    # Convert the metadata dict to TOON string
-    toon_output = to_toon(metadata)
-    save_toon(toon_output, output_path)
+    try:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(content + "\n")
+        print(f"\nSUCCESS: Metadata saved to {output_path}")
+    except Exception as e:
+        print(f"\nERROR saving TOON file: {e}")
 
 
 CSV_FILE = 'input.csv'
 OUTPUT_DIR = "csv_metadata_output"
 
-# Note: Ensure the file exists or comment this out
-if os.path.exists(CSV_FILE):
-    process_csv_metadata(CSV_FILE, output_folder=OUTPUT_DIR)
\ No newline at end of file
+# Only when run as a script: importing this module must not touch files
+if __name__ == "__main__":
+    if os.path.exists(CSV_FILE):
+        process_csv_metadata(CSV_FILE, output_folder=OUTPUT_DIR)
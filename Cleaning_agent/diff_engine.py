@@ -1,30 +1,193 @@
-def compute_diff(df_before, df_after):
+import numpy as np
+import pandas as pd
+
+
+def _null_counts(df):
+    # Column by column, so we never materialise a full boolean frame
+    return {col: int(df[col].isna().sum()) for col in df.columns}
+
+
+def _count_changed(before, after):
+    """
+    Number of positions where two aligned 1-D arrays differ.
+    NaN -> NaN is not a change; NaN <-> value is.
+    """
+    if before is after:
+        return 0
+
+    try:
+        not_equal = np.asarray(before != after, dtype=bool)
+    except (TypeError, ValueError):
+        # pd.NA (nullable and Arrow-backed columns) has no truth value, and
+        # some dtypes don't compare at all (e.g. categoricals with different
+        # categories)
+        return _count_changed_with_nulls(before, after)
+
+    if not_equal.ndim == 0:
+        # numpy gave up on an elementwise comparison (mixed dtypes)
+        not_equal = np.ones(len(before), dtype=bool)
+
+    # Null checks are the expensive part on object columns, so only run them
+    # on the (usually few) positions that compared unequal.
+    candidates = np.flatnonzero(not_equal)
+    if len(candidates) == 0:
+        return 0
+
+    both_na = pd.isna(before[candidates]) & pd.isna(after[candidates])
+    return int(len(candidates) - np.count_nonzero(both_na))
+
+
+def _count_changed_with_nulls(before, after):
+    """
+    _count_changed for values that can't be compared directly: nulls are
+    matched up first, then only the positions where both sides hold a
+    value are compared, as Python objects.
+    """
+    before = np.asarray(before, dtype=object)
+    after = np.asarray(after, dtype=object)
+    before_na = pd.isna(before)
+    after_na = pd.isna(after)
+    both = ~(before_na | after_na)
+
+    not_equal = np.asarray(before[both] != after[both], dtype=bool)
+    if not_equal.ndim == 0:
+        not_equal = np.ones(int(both.sum()), dtype=bool)
+    return int(np.count_nonzero(before_na != after_na) + np.count_nonzero(not_equal))
+
+
+def _row_hashes(df, columns):
+    return pd.util.hash_pandas_object(df[columns], index=False)
+
+
+def _choose_alignment(df_before, df_after):
+    if df_before.index.equals(df_after.index):
+        return "identical"
+
+    # A rule that drops rows and then calls reset_index(drop=True) leaves a
+    # fresh 0..n-1 index whose labels no longer mean the same rows.
+    after_is_reset = isinstance(df_after.index, pd.RangeIndex) and df_after.index.start == 0 and df_after.index.step == 1
+    before_is_range = isinstance(df_before.index, pd.RangeIndex)
+    if after_is_reset and (len(df_before) != len(df_after) or not before_is_range):
+        return "hash"
+
+    if df_before.index.is_unique and df_after.index.is_unique:
+        return "index"
+
+    return "hash"
+
+
+def compute_diff(df_before, df_after, align="auto"):
+    """
+    Compares two frames column by column, in memory bounded by a couple of
+    columns at a time.
+
+    align:
+      "auto"  - index labels when they still identify rows, row-content
+                hashes when the index was reset after rows were removed
+      "index" - always align on index labels
+      "hash"  - always align on row-content hashes of the common columns
+
+    With hash alignment a row whose values changed cannot be paired with its
+    old version, so it counts as one removed plus one added row instead of
+    changed cells.
+    """
     # Row / column deltas
     rows_before = len(df_before)
     rows_after = len(df_after)
 
-    cols_before = set(df_before.columns)
-    cols_after = set(df_after.columns)
-    common_cols = sorted(cols_before & cols_after)
+    cols_before = list(df_before.columns)
+    cols_after = list(df_after.columns)
+    after_set = set(cols_after)
+    before_set = set(cols_before)
+    common_cols = [c for c in cols_before if c in after_set]
+
+    if align == "auto":
+        aligned_on = _choose_alignment(df_before, df_after)
+    else:
+        aligned_on = align
 
-    # Align on index intersection
-    common_index = df_before.index.intersection(df_after.index)
+    changed_by_column = {}
+    retyped_columns = []
 
-    if common_cols and not common_index.empty:
-        before_aligned = df_before.loc[common_index, common_cols]
-        after_aligned = df_after.loc[common_index, common_cols]
+    for col in common_cols:
+        if df_before[col].dtype != df_after[col].dtype:
+            retyped_columns.append(col)
+
+    if aligned_on == "hash" and common_cols:
+        before_counts = _row_hashes(df_before, common_cols).value_counts()
+        after_counts = _row_hashes(df_after, common_cols).value_counts()
+        before_counts, after_counts = before_counts.align(after_counts, fill_value=0)
+        delta = after_counts - before_counts
+        rows_added = int(delta.clip(lower=0).sum())
+        rows_removed = int((-delta).clip(lower=0).sum())
 
-        changed_cells = (before_aligned != after_aligned).sum().sum()
     else:
-        changed_cells = 0
+        if aligned_on == "identical":
+            before_pos = after_pos = None
+            rows_removed = rows_added = 0
+        else:
+            # Positions of the surviving labels in each frame, computed once
+            # and reused for every column.
+            common_index = df_before.index.intersection(df_after.index)
+            before_pos = df_before.index.get_indexer(common_index)
+            after_pos = df_after.index.get_indexer(common_index)
+            rows_removed = rows_before - len(common_index)
+            rows_added = rows_after - len(common_index)
+
+        for col in common_cols:
+            before_values = df_before[col].to_numpy()
+            after_values = df_after[col].to_numpy()
+            if before_pos is not None:
+                before_values = before_values[before_pos]
+                after_values = after_values[after_pos]
+
+            changed = _count_changed(before_values, after_values)
+            if changed:
+                changed_by_column[col] = changed
+
+    nulls_before = _null_counts(df_before)
+    if aligned_on == "identical":
+        # Same rows and unchanged values mean the null count cannot differ
+        unchanged = {
+            c for c in common_cols
+            if c not in changed_by_column and c not in retyped_columns
+        }
+        nulls_after = {
+            col: nulls_before[col] if col in unchanged else int(df_after[col].isna().sum())
+            for col in cols_after
+        }
+    else:
+        nulls_after = _null_counts(df_after)
 
     return {
         "rows_before": rows_before,
         "rows_after": rows_after,
         "row_delta": rows_after - rows_before,
+        "rows_removed": rows_removed,
+        "rows_added": rows_added,
+        "aligned_on": aligned_on,
         "columns_before": len(cols_before),
         "columns_after": len(cols_after),
-        "changed_cells": int(changed_cells),
-        "nulls_before": df_before.isnull().sum().to_dict(),
-        "nulls_after": df_after.isnull().sum().to_dict()
+        "columns_added": [c for c in cols_after if c not in before_set],
+        "columns_removed": [c for c in cols_before if c not in after_set],
+        "retyped_columns": retyped_columns,
+        "changed_cells": int(sum(changed_by_column.values())),
+        "changed_by_column": changed_by_column,
+        "nulls_before": nulls_before,
+        "nulls_after": nulls_after
     }
+
+
+def has_changes(diff):
+    """
+    True when a rule changed anything the auditor should look at: cell
+    values, rows, or the set of columns.
+    """
+    return bool(
+        diff["row_delta"] != 0
+        or diff.get("changed_cells", 0) != 0
+        or diff.get("rows_removed", 0) != 0
+        or diff.get("rows_added", 0) != 0
+        or diff.get("columns_added")
+        or diff.get("columns_removed")
+    )
@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+import time
+
+
+class ProgressEvents:
+    """
+    Structured progress events of a pipeline run (rule started, generate
+    attempt, verify verdict, execute time, diff, audit, ...).
+
+    Each event is a flat dict {"seq", "time", "event", ...fields}. With a
+    path, events are appended to it as JSON lines and flushed immediately,
+    so another process (the web app) can follow a run while it is going.
+    Without a path events are only counted, which keeps callers free of
+    "if events is not None" checks.
+
+    append: continue an existing file (a resumed run) instead of starting
+    a new one; seq goes on from the file's last event, so a browser that
+    reconnects with an earlier Last-Event-ID gets exactly what it missed.
+    """
+
+    def __init__(self, path=None, append=False):
+        self.path = path
+        self.seq = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if append and os.path.exists(path):
+                self.seq, complete = last_seq(path)
+                self._file = open(path, "a", encoding="utf-8")
+                if not complete:
+                    # The previous run was killed mid-line
+                    self._file.write("\n")
+            else:
+                self._file = open(path, "w", encoding="utf-8")
+
+    def emit(self, event, **fields):
+        with self._lock:
+            self.seq += 1
+            record = {"seq": self.seq, "time": round(time.time(), 3), "event": event}
+            record.update(fields)
+            if self._file is not None:
+                self._file.write(json.dumps(record, default=str) + "\n")
+                self._file.flush()
+        return record
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def last_seq(path):
+    """
+    (seq of the last complete event in a JSON-lines events file or 0,
+    whether the file ends with a complete line).
+    """
+    seq, complete = 0, True
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            complete = line.endswith("\n")
+            try:
+                seq = json.loads(line)["seq"]
+            except (ValueError, KeyError, TypeError):
+                continue
+    return seq, complete
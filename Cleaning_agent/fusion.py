@@ -0,0 +1,253 @@
+import ast
+
+# Frame attributes that neither read nor write a particular column
+_NEUTRAL_ATTRIBUTES = {"copy", "index", "shape", "empty"}
+# Label-based accessors: frame.loc[rows, column] / frame.at[row, column]
+_LABEL_ACCESSORS = {"loc", "at"}
+
+
+def _string_constants(node):
+    """
+    {"a"} for "a", {"a", "b"} for ["a", "b"] / ("a", "b") / {"a", "b"};
+    None for anything else.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return {node.value}
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)) and node.elts:
+        values = set()
+        for element in node.elts:
+            if not (isinstance(element, ast.Constant) and isinstance(element.value, str)):
+                return None
+            values.add(element.value)
+        return values
+    return None
+
+
+def _constant_names(tree):
+    """
+    Names bound to column-name constants anywhere in the code, e.g.
+    COLUMNS = ["Email", "Phone"] or `for col in COLUMNS:` / `for col in
+    ["a", "b"]:`. A name bound more than once, or to anything else, is
+    left out.
+    """
+    bindings = {}
+
+    def bind(name, values):
+        bindings.setdefault(name, []).append(values)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    bind(target.id, node.value)
+        elif isinstance(node, (ast.AugAssign, ast.AnnAssign)) and isinstance(node.target, ast.Name):
+            bind(node.target.id, None)
+        elif isinstance(node, ast.For) and isinstance(node.target, ast.Name):
+            bind(node.target.id, ("iter", node.iter))
+        elif isinstance(node, (ast.FunctionDef, ast.Lambda)):
+            for arg in node.args.args + node.args.kwonlyargs:
+                bind(arg.arg, None)
+
+    resolved = {}
+    # Loop variables may iterate over a constant bound earlier, so resolve twice
+    for _ in range(2):
+        for name, values in bindings.items():
+            if len(values) != 1 or values[0] is None:
+                continue
+            value = values[0]
+            if isinstance(value, tuple):
+                iterable = value[1]
+                columns = _string_constants(iterable)
+                if columns is None and isinstance(iterable, ast.Name):
+                    columns = resolved.get(iterable.id)
+            else:
+                columns = _string_constants(value)
+            if columns is not None:
+                resolved[name] = columns
+    return resolved
+
+
+def _column_key(node, constants):
+    columns = _string_constants(node)
+    if columns is None and isinstance(node, ast.Name):
+        columns = constants.get(node.id)
+    return columns
+
+
+def code_columns(code):
+    """
+    Decides from the AST which columns apply_rule(df) reads and writes.
+
+    Returns ((reads, writes), reason), or (None, reason) when the code
+    could touch columns the analysis can't name: it selects or drops rows,
+    reassigns the frame, passes it to a function, uses positional access
+    or any frame method, or indexes it with a non-constant key. Existence
+    checks such as `"Country" in df.columns` count as reads.
+    Conservative like chunked.is_row_local: anything unclear makes the
+    rule unfusable.
+    """
+    tree = ast.parse(code)
+    apply_rule = next(
+        (node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == "apply_rule"), None
+    )
+    if apply_rule is None or not apply_rule.args.args:
+        return None, "no apply_rule(df)"
+
+    frames = {apply_rule.args.args[0].arg}
+    # Aliases made with out = df.copy() or out = df
+    for node in ast.walk(apply_rule):
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            value = node.value
+            if (isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute)
+                    and value.func.attr == "copy" and isinstance(value.func.value, ast.Name)):
+                value = value.func.value
+            if isinstance(value, ast.Name) and value.id in frames:
+                frames.add(node.targets[0].id)
+
+    constants = _constant_names(tree)
+    parents = {}
+    for node in ast.walk(tree):
+        for child in ast.iter_child_nodes(node):
+            parents[child] = node
+
+    reads, writes = set(), set()
+
+    def record(columns, node):
+        parent = parents.get(node)
+        if isinstance(node.ctx, ast.Store):
+            writes.update(columns)
+            if isinstance(parent, ast.AugAssign):
+                reads.update(columns)
+        elif isinstance(node.ctx, ast.Del):
+            return False
+        else:
+            reads.update(columns)
+        return True
+
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Name) and node.id in frames):
+            continue
+        parent = parents.get(node)
+
+        if isinstance(node.ctx, ast.Store):
+            # The alias assignments themselves are fine; anything else
+            # (df = df[mask], df = df.assign(...)) replaces the frame
+            value = parent.value if isinstance(parent, ast.Assign) else None
+            if (isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute)
+                    and value.func.attr == "copy"):
+                value = value.func.value
+            if isinstance(value, ast.Name) and value.id in frames:
+                continue
+            return None, f"reassigns {node.id}"
+
+        if isinstance(parent, ast.Subscript) and parent.value is node:
+            columns = _column_key(parent.slice, constants)
+            if columns is None:
+                return None, f"indexes {node.id} with a row mask or a computed key"
+            if not record(columns, parent):
+                return None, f"deletes columns of {node.id}"
+            continue
+
+        if isinstance(parent, ast.Attribute) and parent.value is node:
+            if parent.attr in _LABEL_ACCESSORS:
+                access = parents.get(parent)
+                if not (isinstance(access, ast.Subscript) and access.value is parent
+                        and isinstance(access.slice, ast.Tuple) and len(access.slice.elts) == 2):
+                    return None, f"uses {node.id}.{parent.attr} without a column"
+                columns = _column_key(access.slice.elts[1], constants)
+                if columns is None:
+                    return None, f"uses {node.id}.{parent.attr} with a computed column"
+                if not record(columns, access):
+                    return None, f"deletes columns of {node.id}"
+                continue
+            if parent.attr in _NEUTRAL_ATTRIBUTES:
+                continue
+            guard = parents.get(parent)
+            if (parent.attr == "columns" and isinstance(guard, ast.Compare) and guard.comparators == [parent]
+                    and isinstance(guard.ops[0], (ast.In, ast.NotIn))):
+                # if "Country" in df.columns: ...
+                columns = _column_key(guard.left, constants)
+                if columns is None:
+                    return None, f"checks {node.id}.columns for a computed name"
+                reads.update(columns)
+                continue
+            return None, f"uses {node.id}.{parent.attr}"
+
+        if isinstance(parent, ast.Return) or (
+                isinstance(parent, ast.Tuple) and isinstance(parents.get(parent), ast.Return)):
+            continue
+        if (isinstance(parent, ast.Call) and isinstance(parent.func, ast.Name) and parent.func.id == "len"
+                and node in parent.args):
+            continue
+        if isinstance(parent, ast.Assign):
+            # The right-hand side of an alias assignment
+            continue
+        return None, f"passes {node.id} as a whole"
+
+    return (frozenset(reads), frozenset(writes)), "only named columns"
+
+
+def conflicts(footprint, other):
+    """
+    True if two rules' (reads, writes) overlap in a way that makes their
+    order matter: one writes a column the other reads or writes.
+    """
+    reads, writes = footprint
+    other_reads, other_writes = other
+    return bool(writes & (other_reads | other_writes) or other_writes & reads)
+
+
+def fuse_code(codes):
+    """
+    Composes several rules' apply_rule sources into one. Each source
+    becomes the body of its own factory function, so helpers and
+    constants with the same name in two rules don't collide; the fused
+    apply_rule(df) runs them in order and returns (df, [issues of rule 1,
+    issues of rule 2, ...]).
+    """
+    module = ast.Module(body=[], type_ignores=[])
+    factories = []
+    for number, code in enumerate(codes, 1):
+        tree = ast.parse(code)
+        name = f"_fused_rule_{number}"
+        factory = ast.parse(f"def {name}():\n    return apply_rule").body[0]
+        factory.body = tree.body + factory.body
+        module.body.append(factory)
+        factories.append(f"{name}()")
+
+    steps = ", ".join(factories)
+    module.body.extend(ast.parse(
+        "def apply_rule(df):\n"
+        "    rule_issues = []\n"
+        f"    for step in ({steps},):\n"
+        "        result = step(df)\n"
+        "        if isinstance(result, tuple):\n"
+        "            df, issues = result\n"
+        "        else:\n"
+        "            df, issues = result, []\n"
+        "        rule_issues.append(list(issues or []))\n"
+        "    return df, rule_issues\n"
+    ).body)
+    return ast.unparse(ast.fix_missing_locations(module))
+
+
+def attribute_diff(diff, writes, other_writes):
+    """
+    The share of a fused group's diff that one rule made: cell changes,
+    retyped and added columns among the columns it writes, and null
+    counts without the columns other rules of the group wrote.
+    """
+    changed_by_column = {c: n for c, n in diff["changed_by_column"].items() if c in writes}
+    columns_added = [c for c in diff["columns_added"] if c in writes]
+
+    attributed = dict(diff)
+    attributed.update({
+        "columns_after": diff["columns_before"] + len(columns_added),
+        "columns_added": columns_added,
+        "retyped_columns": [c for c in diff["retyped_columns"] if c in writes],
+        "changed_by_column": changed_by_column,
+        "changed_cells": int(sum(changed_by_column.values())),
+        "nulls_before": {c: n for c, n in diff["nulls_before"].items() if c not in other_writes},
+        "nulls_after": {c: n for c, n in diff["nulls_after"].items() if c not in other_writes},
+    })
+    return attributed
@@ -0,0 +1,191 @@
+import datetime
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from memory_monitor import PeakMemory, current_rss, _to_mb
+
+
+def _is_text(series):
+    return series.dtype == object or isinstance(series.dtype, pd.StringDtype)
+
+
+def _to_category(series, category_ratio, max_categories):
+    """
+    The series as a categorical if it has few distinct values for its
+    length (at most category_ratio of its non-null values and at most
+    max_categories), else None.
+    """
+    non_null = int(series.notna().sum())
+    if non_null == 0:
+        return None
+    # A column with a large first sample of distinct values is not worth a full nunique()
+    head_unique = series.iloc[:10_000].nunique()
+    if head_unique > max_categories or head_unique > category_ratio * min(non_null, 10_000):
+        return None
+    unique = series.nunique()
+    if unique > max_categories or unique > category_ratio * non_null:
+        return None
+    # Mixed Python types (e.g. "1" and 1 in one object column) can't be ordered into categories
+    try:
+        return series.astype("category")
+    except (TypeError, ValueError):
+        return None
+
+
+def _temporal_columns(df):
+    """
+    Columns Arrow parsed as dates, times or timestamps. The C parser
+    leaves those as the strings in the file.
+    """
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            columns.append(col)
+        elif series.dtype == object:
+            # date32 and time64 columns arrive as datetime.date / datetime.time objects
+            first = series.first_valid_index()
+            if first is not None and isinstance(series[first], (datetime.date, datetime.time)):
+                columns.append(col)
+    return columns
+
+
+def _downcast(series):
+    """
+    Integers to the smallest integer type that holds them, floats to
+    float32 when no value changes. None if nothing can be saved.
+    """
+    kind = series.dtype.kind
+    if kind in "iu":
+        # Signed even for non-negative columns, so a subtraction can't wrap around
+        downcast = pd.to_numeric(series, downcast="unsigned" if kind == "u" else "integer")
+    elif kind == "f":
+        downcast = series.astype(np.float32)
+        same = (downcast.astype(series.dtype) == series) | series.isna()
+        if not same.all():
+            return None
+    else:
+        return None
+    return downcast if downcast.dtype.itemsize < series.dtype.itemsize else None
+
+
+def optimize_dtypes(df: pd.DataFrame, category_ratio=0.5, max_categories=10_000, downcast=False,
+                    arrow_strings=False):
+    """
+    Converts df's columns in place to more compact dtypes:
+
+      - text columns with few distinct values become categoricals
+        (category_ratio: distinct values per non-null value, 0 disables)
+      - with downcast, integers shrink to the smallest type that holds
+        their values and floats to float32 where that is lossless
+      - with arrow_strings, the remaining text columns become
+        string[pyarrow] instead of object
+
+    Returns {column: "old dtype -> new dtype"} for the converted columns.
+    """
+    conversions = {}
+    for col in df.columns:
+        series = df[col]
+        converted = None
+        if _is_text(series):
+            if category_ratio:
+                converted = _to_category(series, category_ratio, max_categories)
+            if converted is None and arrow_strings and series.dtype == object:
+                try:
+                    converted = series.astype("string[pyarrow]")
+                except (TypeError, ValueError):
+                    # Not all strings (e.g. mixed with numbers); keep object
+                    converted = None
+        elif downcast and series.dtype.kind in "iuf":
+            converted = _downcast(series)
+
+        if converted is not None:
+            conversions[col] = f"{series.dtype} -> {converted.dtype}"
+            df[col] = converted
+    return conversions
+
+
+def load_csv(path, usecols=None, engine="pyarrow", category_ratio=0.5, max_categories=10_000,
+             downcast=False, arrow_strings=False):
+    """
+    Reads a CSV with compact dtypes (see optimize_dtypes) and reports what
+    it cost.
+
+    engine: "pyarrow" parses with Arrow's multi-threaded CSV reader and
+    falls back to pandas' C parser if pyarrow is missing or rejects the
+    file; "c" always uses the C parser. Either way the frame has the C
+    parser's dtypes: columns Arrow reads as dates or times are re-read
+    with the C parser as text.
+    usecols: read only these columns.
+
+    Returns (df, report) where report holds the file size, the frame's
+    size as parsed and after conversion, this process's RSS before and
+    after the load and its peak during it, and the conversions made.
+    """
+    rss_before = current_rss()
+    start = time.perf_counter()
+    with PeakMemory() as memory:
+        used_engine = engine
+        try:
+            if engine == "pyarrow":
+                df = pd.read_csv(path, usecols=usecols, engine="pyarrow")
+            else:
+                df = pd.read_csv(path, usecols=usecols, low_memory=False)
+        except (ImportError, ValueError) as e:
+            if engine != "pyarrow":
+                raise
+            print(f"WARNING: pyarrow could not read {path} ({e}); using the C parser.")
+            used_engine = "c"
+            df = pd.read_csv(path, usecols=usecols, low_memory=False)
+        if used_engine == "pyarrow":
+            # Arrow turns ISO dates and times into datetime values; read those
+            # columns again as text so generated code sees the file's strings
+            temporal = _temporal_columns(df)
+            if temporal:
+                text = pd.read_csv(path, usecols=temporal, low_memory=False)
+                for col in temporal:
+                    df[col] = text[col]
+            # Arrow leaves None for missing text where the C parser puts NaN;
+            # keep what generated code sees (e.g. astype(str) -> "nan") the same
+            for col in df.columns:
+                if df[col].dtype == object and df[col].hasnans:
+                    df[col] = df[col].fillna(np.nan)
+        # Bytes per column, counting the Python strings inside object
+        # columns; measuring that is slow, so it is done once and only the
+        # converted columns are measured again
+        column_bytes = df.memory_usage(deep=True, index=True)
+        parsed_bytes = int(column_bytes.sum())
+        conversions = optimize_dtypes(df, category_ratio=category_ratio, max_categories=max_categories,
+                                      downcast=downcast, arrow_strings=arrow_strings)
+    for col in conversions:
+        column_bytes[col] = df[col].memory_usage(deep=True, index=False)
+    frame_bytes = int(column_bytes.sum())
+
+    report = {
+        "path": path,
+        "engine": used_engine,
+        "rows": int(df.shape[0]),
+        "columns": int(df.shape[1]),
+        "seconds": round(time.perf_counter() - start, 4),
+        "file_mb": _to_mb(os.path.getsize(path)),
+        "parsed_frame_mb": _to_mb(parsed_bytes),
+        "frame_mb": _to_mb(frame_bytes),
+        "rss_before_mb": _to_mb(rss_before),
+        "rss_after_mb": _to_mb(current_rss()),
+        "peak_rss_mb": memory.as_dict()["peak_rss_mb"],
+        "conversions": conversions,
+    }
+    return df, report
+
+
+def print_memory_report(report):
+    print(f"INFO: Loaded {report['path']} ({report['file_mb']} MB on disk) with the {report['engine']} parser "
+          f"in {report['seconds']}s: {report['rows']} rows x {report['columns']} columns.")
+    print(f"INFO: Frame memory {report['parsed_frame_mb']} MB as parsed, {report['frame_mb']} MB after "
+          f"converting {len(report['conversions'])} columns.")
+    if report["rss_before_mb"] is not None:
+        print(f"INFO: Process RSS {report['rss_before_mb']} MB before the load, {report['rss_after_mb']} MB after "
+              f"(peak {report['peak_rss_mb']} MB).")
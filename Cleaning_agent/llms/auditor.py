@@ -1,3 +1,12 @@
+from llms.batch import DEFAULT_BATCH_SIZE, ask_json_batch
+
+BATCH_TASK = """
+Each numbered item below is a data cleaning RULE and the DIFF its code
+made to the data. For each item, decide whether the diff correctly and
+completely implements the rule, and summarise what changed.
+"""
+
+
 def audit(llm, diff, rule_toon):
     prompt = f"""
 RULE:
@@ -9,4 +18,28 @@ DIFF:
 Reply ONLY JSON:
 {{"approve": true/false, "summary": "string"}}
 """
-    return llm.ask_json(prompt)
+    return llm.ask_json(prompt, priority="audit")
+
+
+def _check_verdict(result):
+    if "approve" not in result or "summary" not in result:
+        raise ValueError("Auditor did not return approve and summary")
+
+
+def audit_many(llm, items, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Audits several (diff, rule_toon) pairs with as few LLM calls as
+    possible. Returns the verdicts in the same order as items.
+    """
+    if batch_size <= 1:
+        return [audit(llm, diff, rule) for diff, rule in items]
+
+    return ask_json_batch(
+        llm, BATCH_TASK,
+        [f"RULE:\n{rule}\n\nDIFF:\n{diff}" for diff, rule in items],
+        '"approve": true/false, "summary": "string"',
+        validate=_check_verdict,
+        single=lambda i: audit(llm, *items[i]),
+        max_batch=batch_size,
+        priority="audit"
+    )
@@ -1,30 +1,124 @@
 import json
+import threading
+
+from llms.tokens import estimate_tokens
+
 
 class LLMClient:
-    def __init__(self, call_fn):
+    def __init__(self, call_fn, cache=None, model=None, temperature=0, scheduler=None):
         """
         call_fn: function(prompt: str) -> str
         Example: gemini_call or openai_call
+
+        cache: optional ResponseCache (llms/cache.py). model and temperature
+        are only used to build the cache key, so they must describe what
+        call_fn actually sends.
+
+        scheduler: optional LLMScheduler (llms/scheduler.py) that every
+        call_fn call goes through; cache hits bypass it.
         """
         self.call_fn = call_fn
+        self.cache = cache
+        self.scheduler = scheduler
+        self.model = model
+        self.temperature = temperature
+
+        # Estimated token counts of every prompt/response (llms/tokens.py)
+        self._token_lock = threading.Lock()
+        self._token_totals = {"calls": 0, "cached_calls": 0, "prompt_tokens": 0,
+                              "max_prompt_tokens": 0, "response_tokens": 0, "retries": 0}
+        self._local = threading.local()
 
-    def call(self, prompt: str) -> str:
+    def call(self, prompt: str, priority: str = "default") -> str:
         """
         Raw text call. Used for code generation.
+        priority: the scheduler's priority class (llms.scheduler.PRIORITIES).
         """
-        response = self.call_fn(prompt)
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(self.model, prompt, self.temperature)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._count_tokens(prompt, cached, cached=True)
+                return cached
+
+        scheduling = {}
+        if self.scheduler is not None:
+            response = self.scheduler.submit(self.call_fn, prompt, priority=priority)
+            scheduling = self.scheduler.last_call()
+        else:
+            response = self.call_fn(prompt)
 
         if not isinstance(response, str):
             raise ValueError("LLM response is not a string")
 
-        return response.strip()
+        response = response.strip()
+
+        if self.cache is not None:
+            self.cache.put(key, response, model=self.model)
+
+        self._count_tokens(prompt, response, cached=False, **scheduling)
+        return response
+
+    def _count_tokens(self, prompt, response, cached, retries=0, queue_wait_seconds=None):
+        last = {"prompt_tokens": estimate_tokens(prompt), "response_tokens": estimate_tokens(response),
+                "prompt_chars": len(prompt), "response_chars": len(response), "cached": cached}
+        if queue_wait_seconds is not None:
+            last.update(retries=retries, queue_wait_seconds=queue_wait_seconds)
+        self._local.last = last
+
+        thread_totals = getattr(self._local, "totals", None)
+        if thread_totals is None:
+            thread_totals = self._local.totals = {"calls": 0, "cached_calls": 0, "prompt_tokens": 0,
+                                                  "response_tokens": 0, "retries": 0}
+        with self._token_lock:
+            for totals in (self._token_totals, thread_totals):
+                totals["calls"] += 1
+                totals["cached_calls"] += int(cached)
+                totals["prompt_tokens"] += last["prompt_tokens"]
+                totals["response_tokens"] += last["response_tokens"]
+                totals["retries"] += retries
+            self._token_totals["max_prompt_tokens"] = max(self._token_totals["max_prompt_tokens"],
+                                                          last["prompt_tokens"])
+
+    def last_call_tokens(self) -> dict:
+        """
+        Estimated prompt/response tokens and sizes in characters of the last
+        call made from this thread, plus its retries and queue wait when a
+        scheduler is used ({} before the first call).
+        """
+        return dict(getattr(self._local, "last", {}))
+
+    def token_stats(self) -> dict:
+        """
+        Estimated token totals over all calls, including cache hits.
+        """
+        with self._token_lock:
+            return dict(self._token_totals)
+
+    def thread_token_stats(self) -> dict:
+        """
+        Like token_stats(), for the calls made from this thread only; a
+        stage's own calls can then be measured while other threads (e.g.
+        speculative generation) use the same client.
+        """
+        with self._token_lock:
+            return dict(getattr(self._local, "totals", {}))
+
+    def cache_stats(self) -> dict:
+        """
+        Hit/miss counters of the response cache (empty when caching is off).
+        """
+        if self.cache is None:
+            return {}
+        return self.cache.stats()
 
-    def ask_json(self, prompt: str) -> dict:
+    def ask_json(self, prompt: str, priority: str = "default") -> dict:
         """
         Call LLM and strictly parse JSON.
         Used for interpreter / verifier / auditor.
         """
-        raw = self.call(prompt)
+        raw = self.call(prompt, priority=priority)
 
         # Gemini sometimes wraps JSON in ``` or text
         cleaned = self._extract_json(raw)
@@ -32,6 +126,9 @@ class LLMClient:
         try:
             return json.loads(cleaned)
         except json.JSONDecodeError as e:
+            # Never keep serving an unparseable response from the cache
+            if self.cache is not None:
+                self.cache.discard(self.cache.make_key(self.model, prompt, self.temperature))
             raise ValueError(
                 f"LLM did not return valid JSON.\n"
                 f"Raw response:\n{raw}"
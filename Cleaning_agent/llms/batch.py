@@ -0,0 +1,119 @@
+import re
+
+# Items per batched LLM call unless the caller says otherwise; also the
+# default of run_pipeline's llm_batch_size and run.py's --llm-batch-size
+DEFAULT_BATCH_SIZE = 10
+
+ITEM_HEADER = re.compile(r"^### ITEM \d+$")
+REPLY_HEADER = "Reply STRICT JSON with exactly one result per item, in item order:"
+
+
+def _batch_prompt(task, items, reply_fields):
+    parts = [task.strip(), "", f"There are {len(items)} items. Answer each one independently.", ""]
+    for number, item in enumerate(items, 1):
+        parts.append(f"### ITEM {number}")
+        parts.append(item.strip())
+        parts.append("")
+    parts.append(REPLY_HEADER)
+    parts.append(f'{{ "results": [ {{ "id": <item number>, {reply_fields} }}, ... ] }}')
+    return "\n".join(parts)
+
+
+def split_batch_prompt(prompt):
+    """
+    Reverse of _batch_prompt, for offline replay (llms/replay.py): returns
+    (item texts, field names of one answer), or None if prompt is not a
+    batched prompt.
+    """
+    lines = prompt.splitlines()
+    starts = [i for i, line in enumerate(lines) if ITEM_HEADER.match(line)]
+    if not starts or REPLY_HEADER not in lines[starts[-1]:]:
+        return None
+
+    end = lines.index(REPLY_HEADER, starts[-1])
+    items = ["\n".join(lines[start + 1:stop]).strip() for start, stop in zip(starts, starts[1:] + [end])]
+    fields = [f for f in re.findall(r'"(\w+)":', "\n".join(lines[end + 1:])) if f not in ("results", "id")]
+    return items, fields
+
+
+def _parse_results(response, count, validate):
+    """
+    {item number: result} for every result that is well-formed; items with
+    a missing or invalid result are left out.
+    """
+    results = response.get("results") if isinstance(response, dict) else None
+    if not isinstance(results, list):
+        return {}
+
+    parsed = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        try:
+            number = int(result.get("id"))
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= number <= count or number in parsed:
+            continue
+        result = {k: v for k, v in result.items() if k != "id"}
+        try:
+            validate(result)
+        except ValueError:
+            continue
+        parsed[number] = result
+    return parsed
+
+
+def ask_json_batch(llm, task, items, reply_fields, validate, single, max_batch=DEFAULT_BATCH_SIZE, priority="default"):
+    """
+    Answers many small JSON questions that share one task in as few LLM
+    calls as possible.
+
+    task: instructions common to every item.
+    items: the per-item texts (e.g. one rule each).
+    reply_fields: the JSON fields of one answer, as shown to the model,
+    e.g. '"approve": true/false, "summary": "string"'.
+    validate(result): raises ValueError if one item's answer is unusable.
+    single(index): answers items[index] with its own, unbatched prompt.
+    priority: scheduler priority class of the batched calls.
+
+    Items are sent max_batch at a time. If the reply can't be parsed, or
+    some items come back missing or invalid, only those items are retried,
+    split in halves, down to one item per call; an item that still fails
+    on its own falls back to single(index), whose errors propagate.
+
+    Returns the answers in the same order as items.
+    """
+    answers = [None] * len(items)
+
+    def solve(indices):
+        try:
+            response = llm.ask_json(_batch_prompt(task, [items[i] for i in indices], reply_fields),
+                                    priority=priority)
+            parsed = _parse_results(response, len(indices), validate)
+        except ValueError as e:
+            print(f"WARNING: Batched LLM reply for {len(indices)} items could not be parsed: {e}")
+            parsed = {}
+
+        failed = []
+        for number, index in enumerate(indices, 1):
+            if number in parsed:
+                answers[index] = parsed[number]
+            else:
+                failed.append(index)
+
+        if not failed:
+            return
+        if len(indices) == 1:
+            answers[failed[0]] = single(failed[0])
+            return
+
+        print(f"INFO: Retrying {len(failed)} of {len(indices)} batched items in smaller batches.")
+        middle = (len(failed) + 1) // 2
+        for half in (failed[:middle], failed[middle:]):
+            if half:
+                solve(half)
+
+    for start in range(0, len(items), max_batch):
+        solve(list(range(start, min(start + max_batch, len(items)))))
+    return answers
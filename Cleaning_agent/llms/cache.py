@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache for raw LLM responses.
+
+    Each entry is one JSON file named after the SHA-256 of
+    (model, temperature, prompt), so identical prompts from repeated runs
+    of the same rulebook never reach the network twice.
+    """
+
+    def __init__(self, cache_dir, max_entries=5000, max_bytes=200 * 1024 * 1024, max_age_seconds=7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        # Walking the cache directory is O(entries), so only sweep periodically
+        self.evict_every = 100
+        self._puts_since_evict = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.evict()
+
+    @staticmethod
+    def make_key(model, prompt, temperature):
+        payload = json.dumps([model, temperature, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """
+        Returns the cached response text, or None on a miss or expired entry.
+        """
+        path = self._path(key)
+        try:
+            age = time.time() - os.path.getmtime(path)
+            if self.max_age_seconds is not None and age > self.max_age_seconds:
+                os.remove(path)
+                with self._lock:
+                    self.misses += 1
+                    self.evictions += 1
+                return None
+
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return entry["response"]
+
+    def put(self, key, response, model=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temp file first so concurrent readers never see half an entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": model, "created_at": time.time(), "response": response}, f)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._puts_since_evict += 1
+            due = self._puts_since_evict >= self.evict_every
+            if due:
+                self._puts_since_evict = 0
+        if due:
+            self.evict()
+
+    def discard(self, key):
+        self._remove(self._path(key))
+
+    def evict(self):
+        """
+        Drops expired entries, then the oldest ones until both the
+        entry-count and total-size limits are respected.
+        """
+        entries = []
+        now = time.time()
+        removed = 0
+
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+
+                if self.max_age_seconds is not None and now - st.st_mtime > self.max_age_seconds:
+                    removed += self._remove(path)
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+
+        while entries and (
+            (self.max_entries is not None and len(entries) > self.max_entries)
+            or (self.max_bytes is not None and total_bytes > self.max_bytes)
+        ):
+            _, size, path = entries.pop(0)
+            total_bytes -= size
+            removed += self._remove(path)
+
+        with self._lock:
+            self.evictions += removed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
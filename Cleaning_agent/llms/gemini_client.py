@@ -1,79 +1,85 @@
-import time
-import random
-from google import genai
-from google.genai import types, errors
+import threading
+
+from llms.scheduler import RateLimited, RetryableLLMError
 
 # IMPORTANT:
 # This uses Application Default Credentials (OAuth)
 # No API keys anywhere
 
-client = genai.Client(
-    vertexai=True,
-    project="tedxtrial",
-    location="global"  # 'global' often fails for Vertex GenAI; 'us-central1' is safer
-)
-
+_client = None
+_client_lock = threading.Lock()
 
-# --- START OF NEW CODE ---
 
-def gemini_call_with_retry(prompt, max_retries=7):
+def get_client():
     """
-    Wrapper for Gemini API with exponential backoff and correct error handling
-    for the google-genai (v0.2+) library.
+    The Vertex AI client, created on the first LLM call rather than at
+    import: google.genai is slow to import and creating the client needs
+    credentials, which importers that never call the LLM shouldn't pay for.
     """
-    base_wait_time = 1
-
-    for i in range(max_retries):
-        try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt,
-                config=types.GenerateContentConfig(  # 'config' is the argument name in new lib
-                    temperature=0
-                )
+    global _client
+    with _client_lock:
+        if _client is None:
+            from google import genai
+
+            _client = genai.Client(
+                vertexai=True,
+                project="tedxtrial",
+                location="global"  # 'global' often fails for Vertex GenAI; 'us-central1' is safer
             )
+    return _client
 
-            # In the new library, safety blocks often return a valid response object
-            # but with no text. We must check for this to avoid "NoneType" errors.
-            if not response.text:
-                # You can inspect response.candidates[0].finish_reason here if needed
-                print(f"ERROR: Response blocked or empty. Finish Reason: {response.candidates[0].finish_reason}")
-                raise ValueError("Prompt was blocked by safety settings or returned no content.")
-
-            return response.text
 
-        except errors.ClientError as e:
-            # The new library uses ClientError for HTTP status codes (4xx)
-            if e.code == 429:  # Rate Limit
-                if i < max_retries - 1:
-                    wait_time = base_wait_time * (2 ** i) + random.uniform(0, 1)
-                    print(f"Rate limit exceeded (429). Retrying in {wait_time:.2f} seconds...")
-                    time.sleep(wait_time)
-                    continue
+GEMINI_MODEL = "gemini-2.5-flash"
+GEMINI_TEMPERATURE = 0
 
-            # If it's a 400 (Bad Request), it's often a policy violation or invalid argument
-            if e.code == 400:
-                print(f"ERROR: Bad Request (Likely blocked or invalid): {e}")
-                raise
 
-            # Re-raise other ClientErrors (401, 403, 404, etc.)
-            raise e
-
-        except errors.ServerError as e:
-            # 5xx Errors (Google side issues) - Safe to retry
-            if i < max_retries - 1:
-                wait_time = base_wait_time * (2 ** i) + random.uniform(0, 1)
-                print(f"Server error ({e.code}). Retrying in {wait_time:.2f} seconds...")
-                time.sleep(wait_time)
-                continue
-            raise e
+def _retry_after(error):
+    """
+    The Retry-After header of a failed call in seconds, if the server sent one.
+    """
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
 
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-            raise e
 
-    raise Exception("LLM call failed after multiple retries.")
+def gemini_call(prompt):
+    """
+    One Gemini request. Quota errors (429) raise RateLimited and server
+    errors (5xx) RetryableLLMError; retrying them, with backoff and
+    without stampeding the quota, is left to llms.scheduler.LLMScheduler.
+    """
+    from google.genai import types, errors
 
+    client = get_client()
 
-def gemini_call(prompt):
-    return gemini_call_with_retry(prompt)
\ No newline at end of file
+    try:
+        response = client.models.generate_content(
+            model=GEMINI_MODEL,
+            contents=prompt,
+            config=types.GenerateContentConfig(  # 'config' is the argument name in new lib
+                temperature=GEMINI_TEMPERATURE
+            )
+        )
+    except errors.ClientError as e:
+        # The new library uses ClientError for HTTP status codes (4xx)
+        if e.code == 429:
+            raise RateLimited(f"Gemini rate limit exceeded: {e}", retry_after=_retry_after(e)) from e
+
+        # If it's a 400 (Bad Request), it's often a policy violation or invalid argument
+        if e.code == 400:
+            print(f"ERROR: Bad Request (Likely blocked or invalid): {e}")
+        raise
+    except errors.ServerError as e:
+        # 5xx Errors (Google side issues) - Safe to retry
+        raise RetryableLLMError(f"Gemini server error {e.code}: {e}", retry_after=_retry_after(e)) from e
+
+    # In the new library, safety blocks often return a valid response object
+    # but with no text. We must check for this to avoid "NoneType" errors.
+    if not response.text:
+        print(f"ERROR: Response blocked or empty. Finish Reason: {response.candidates[0].finish_reason}")
+        raise ValueError("Prompt was blocked by safety settings or returned no content.")
+
+    return response.text
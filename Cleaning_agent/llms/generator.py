@@ -15,8 +15,10 @@ CRITICAL RULES:
 - The function must return the modified DataFrame and a list of issues, like `return df, issues`.
 - **Keep the code simple and direct. Do not write complex or overly-clever code.**
 - **Define all helper variables (like lists or dictionaries) at the top level, outside the apply_rule function.** This is mandatory for clarity.
+- Assign results back explicitly (df['col'] = ... or df.loc[mask, 'col'] = ...). Do NOT use chained assignment like df['col'][mask] = ... or df['col'].fillna(..., inplace=True).
+- Respect each column's Data_Type and Dtype_Note in the metadata (e.g. a 'category' column only accepts its existing categories).
 - When parsing dates, use pd.to_datetime(column, format='mixed', errors='coerce'). Do NOT use 'infer_datetime_format'.
 - Do NOT invent reference data or make assumptions beyond the rule.
 - Do NOT return "no action required" or just print statements.
 """
-    return llm.call(prompt)
+    return llm.call(prompt, priority="generate")
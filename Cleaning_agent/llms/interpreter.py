@@ -1,3 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from llms.batch import DEFAULT_BATCH_SIZE, ask_json_batch
+
+BATCH_TASK = """
+You are analyzing human-written data rules, given as numbered items.
+
+Question, for each rule:
+Does this rule require executable logic
+to inspect, validate, log, or transform data?
+
+IMPORTANT:
+- Even if no data is modified, checking conditions counts as execution
+- Logging or flagging issues counts as execution
+- Reply false ONLY if the rule is purely informational
+"""
+
+
 def interpret_rule(llm, rule_toon):
     prompt = f"""
 You are analyzing a human-written data rule.
@@ -17,10 +35,43 @@ IMPORTANT:
 Reply STRICT JSON:
 {{ "requires_execution": true/false, "reason": "short explanation" }}
 """
-    result = llm.ask_json(prompt)
+    result = llm.ask_json(prompt, priority="interpret")
+    _check_intent(result)
+    return result
+
 
+def _check_intent(result):
     if "requires_execution" not in result:
         raise ValueError("Interpreter did not return requires_execution")
 
-    return result
 
+def interpret_rules(llm, rules, max_workers=8, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Classifies every rule concurrently. interpret_rule only looks at the
+    rule text, so there is no reason to wait for earlier rules' data.
+    Returns the intents in the same order as rules.
+
+    batch_size: rules classified per LLM call (see llms/batch.py); 1 sends
+    one prompt per rule.
+    """
+    if not rules:
+        return []
+
+    if batch_size <= 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(rules))) as pool:
+            return list(pool.map(lambda rule: interpret_rule(llm, rule), rules))
+
+    def interpret_batch(batch):
+        return ask_json_batch(
+            llm, BATCH_TASK,
+            [f"RULE (verbatim):\n{rule}" for rule in batch],
+            '"requires_execution": true/false, "reason": "short explanation"',
+            validate=_check_intent,
+            single=lambda i: interpret_rule(llm, batch[i]),
+            max_batch=batch_size,
+            priority="interpret"
+        )
+
+    batches = [rules[i:i + batch_size] for i in range(0, len(rules), batch_size)]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+        return [intent for intents in pool.map(interpret_batch, batches) for intent in intents]
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+from llms.batch import split_batch_prompt
+
+SECTION_HEADER = re.compile(r"^[A-Z][A-Z ()_]*:$")
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def prompt_kind(prompt: str) -> str:
+    """
+    First non-blank line of a prompt plus its section headers
+    ("RULE:", "CODE:", "DIFF:", ...). Fallback matching never crosses
+    kinds, so an audit reply is never handed to a verification prompt.
+    """
+    lines = [line.strip() for line in prompt.splitlines() if line.strip()]
+    if not lines:
+        return ""
+    headers = [line for line in lines[1:] if SECTION_HEADER.match(line)]
+    return " | ".join([lines[0]] + headers)
+
+
+def prompt_lines(prompt: str) -> list:
+    """
+    Short hashes of the prompt's non-blank lines, used to find the closest
+    recorded prompt when there is no exact match.
+    """
+    return sorted({
+        hashlib.sha1(line.strip().encode("utf-8")).hexdigest()[:10]
+        for line in prompt.splitlines() if line.strip()
+    })
+
+
+def _response_json(response):
+    """
+    The JSON object in a recorded response (fenced or not), or None.
+    """
+    first, last = response.find("{"), response.rfind("}")
+    if first == -1 or last <= first:
+        return None
+    try:
+        parsed = json.loads(response[first:last + 1])
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+class RecordingCall:
+    """
+    Wraps a real call_fn (e.g. gemini_call) and appends every
+    prompt/response pair to a JSONL file, in call order.
+
+    Usage: LLMClient(RecordingCall(gemini_call, "replay.jsonl"))
+
+    match_key: optional function(prompt) -> str stored with each entry, so
+    ReplayCall can match prompts that differ only in volatile parts
+    (metadata, diff) by e.g. the rule they are about.
+    """
+
+    def __init__(self, call_fn, path, match_key=None):
+        self.call_fn = call_fn
+        self.path = path
+        self.match_key = match_key
+        self._lock = threading.Lock()
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def __call__(self, prompt):
+        response = self.call_fn(prompt)
+
+        entry = {
+            "key": prompt_key(prompt),
+            "kind": prompt_kind(prompt),
+            "lines": prompt_lines(prompt),
+            "response": response,
+        }
+        if self.match_key is not None:
+            entry["match"] = self.match_key(prompt)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        return response
+
+
+class ReplayCall:
+    """
+    Offline call_fn that answers from a RecordingCall file.
+
+    A prompt that was recorded verbatim gets its recorded response (cycling
+    through them if it was recorded several times, e.g. retries). With
+    fallback="nearest", any other prompt gets the response of a recorded
+    prompt of the same kind: the one with the same match_key if one was
+    recorded, otherwise the one sharing the most lines with it.
+
+    A batched prompt (llms/batch.py) of a kind that was never recorded is
+    answered item by item: each item gets the recorded answer, among those
+    with the fields the batch asks for, that the same rules would pick
+    for the item on its own. So a fixture recorded one prompt per rule
+    also replays runs that batch.
+    """
+
+    def __init__(self, path, fallback="nearest", match_key=None):
+        self.path = path
+        self.fallback = fallback
+        self.match_key = match_key
+        self.calls = 0
+        self.exact_hits = 0
+        self.fallback_hits = 0
+        self._lock = threading.Lock()
+
+        with open(path, "r", encoding="utf-8") as f:
+            self.entries = [json.loads(line) for line in f if line.strip()]
+
+        self._served = {}
+        self._by_key = {}
+        self._by_kind = {}
+        for i, entry in enumerate(self.entries):
+            entry["lines"] = set(entry.get("lines", []))
+            self._by_key.setdefault(entry["key"], []).append(i)
+            self._by_kind.setdefault(entry.get("kind", ""), []).append(i)
+            entry["json"] = _response_json(entry["response"])
+
+    def _next_of(self, group_key, candidates):
+        n = self._served.get(group_key, 0)
+        self._served[group_key] = n + 1
+        return self.entries[candidates[n % len(candidates)]]["response"]
+
+    def _nearest(self, prompt):
+        kind = prompt_kind(prompt)
+        return self._closest(prompt, self._by_kind.get(kind, []), kind)
+
+    def _closest(self, text, candidates, group):
+        if not candidates:
+            return None
+
+        if self.match_key is not None:
+            match = self.match_key(text)
+            matched = [i for i in candidates if self.entries[i].get("match") == match]
+            if matched:
+                return self._next_of(("match", group, match), matched)
+
+        lines = set(prompt_lines(text))
+
+        def similarity(i):
+            recorded = self.entries[i]["lines"]
+            union = len(lines | recorded)
+            return len(lines & recorded) / union if union else 0.0
+
+        scores = {i: similarity(i) for i in candidates}
+        best = max(scores.values())
+        # Several recordings can tie (e.g. a retried rule); serve them in order
+        tied = [i for i in candidates if scores[i] == best]
+        return self._next_of(("nearest", tied[0]), tied)
+
+    def _batched(self, prompt):
+        batch = split_batch_prompt(prompt)
+        if batch is None:
+            return None
+        items, fields = batch
+
+        candidates = [i for i, entry in enumerate(self.entries)
+                      if entry["json"] is not None and all(f in entry["json"] for f in fields)]
+        results = []
+        for number, item in enumerate(items, 1):
+            answer = self._closest(item, candidates, tuple(fields))
+            if answer is None:
+                return None
+            results.append({"id": number, **_response_json(answer)})
+        return json.dumps({"results": results})
+
+    def __call__(self, prompt):
+        with self._lock:
+            self.calls += 1
+
+            key = prompt_key(prompt)
+            if key in self._by_key:
+                self.exact_hits += 1
+                return self._next_of(key, self._by_key[key])
+
+            if self.fallback == "nearest":
+                response = self._nearest(prompt)
+                if response is None:
+                    response = self._batched(prompt)
+                if response is not None:
+                    self.fallback_hits += 1
+                    return response
+
+        raise KeyError(f"No recorded response for prompt: {prompt_kind(prompt)[:80]}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "exact_hits": self.exact_hits,
+                "fallback_hits": self.fallback_hits,
+            }
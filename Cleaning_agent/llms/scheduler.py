@@ -0,0 +1,347 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from llms.tokens import estimate_tokens
+
+# Lower runs first: a rule waiting for its code holds up the whole pipeline,
+# an audit can land a few rules later
+PRIORITIES = {"generate": 0, "verify": 1, "default": 2, "interpret": 2, "audit": 3}
+
+
+class RetryableLLMError(Exception):
+    """
+    A call_fn failure worth retrying (e.g. an HTTP 5xx). retry_after is the
+    server's hint in seconds, if it gave one.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimited(RetryableLLMError):
+    """
+    The endpoint refused the call for quota reasons (HTTP 429).
+    """
+
+
+class TokenBucket:
+    """
+    rate units per second, holding at most capacity. take() may drive
+    the level below zero (a response turned out larger than estimated);
+    later callers then wait for the debt to refill.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.level = capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount):
+        """
+        Seconds until amount can be taken (0 if now). An amount larger than
+        capacity is allowed once the bucket is full.
+        """
+        self._refill()
+        needed = min(amount, self.capacity) - self.level
+        return 0.0 if needed <= 0 else needed / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.level -= amount
+
+
+class LLMScheduler:
+    """
+    Admission control in front of an LLM endpoint, shared by every
+    LLMClient (and so every rule and job) in the process.
+
+    A call is dispatched when it is the highest-priority waiting call
+    (PRIORITIES; first come first served within a class), fewer than
+    max_concurrency calls are in flight, and both token buckets allow
+    it: one request out of requests_per_minute, and the prompt's
+    estimated tokens out of tokens_per_minute (response tokens are
+    charged when the reply arrives).
+
+    call_fn signals quota errors by raising RateLimited and transient
+    server errors with RetryableLLMError. On a 429 every call is paused
+    for the server's retry_after (or an exponential backoff), the
+    effective rate is cut by rate_decrease, and the call goes back to
+    the front of its class. 429s of calls sent before the last one was
+    handled belong to the same burst and don't cut the rate again. Every
+    recovery_seconds without a 429, a success raises the rate again by
+    rate_recovery of the configured rate. A call is retried at most
+    max_retries times.
+
+        scheduler = LLMScheduler(requests_per_minute=60, tokens_per_minute=250_000)
+        text = scheduler.submit(call_fn, prompt, priority="generate")
+        scheduler.metrics()   # queue waits, throttles, current rate
+
+    clock and sleep can be replaced (e.g. by a fake clock in tests); sleep
+    is how a call waits out a server error's backoff.
+    """
+
+    def __init__(self, requests_per_minute=60, tokens_per_minute=None, max_concurrency=4, max_retries=7,
+                 burst_seconds=10, rate_decrease=0.7, rate_recovery=0.1, recovery_seconds=10,
+                 min_rate_fraction=0.1, max_backoff=60, clock=time.monotonic, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.max_retries = max_retries
+        self.rate_decrease = rate_decrease
+        self.rate_recovery = rate_recovery
+        self.recovery_seconds = recovery_seconds
+        self.min_rate_fraction = min_rate_fraction
+        self.max_backoff = max_backoff
+
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._waiting = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._consecutive_throttles = 0
+        self._last_throttle = None
+        self._last_change = None
+        self._rate_fraction = 1.0
+        self._metrics = {
+            "calls": 0, "retries": 0, "throttled": 0, "server_errors": 0, "failed": 0,
+            "queue_wait_seconds": 0.0, "max_queue_wait_seconds": 0.0, "paused_seconds": 0.0,
+            "by_priority": {},
+        }
+        self.configure(requests_per_minute, tokens_per_minute, max_concurrency, burst_seconds)
+
+    def configure(self, requests_per_minute=60, tokens_per_minute=None, max_concurrency=4, burst_seconds=10):
+        """
+        Changes the limits in place, e.g. when a warm worker starts a job
+        with other settings; calls already waiting keep their place.
+        """
+        with self._condition:
+            self.requests_per_minute = requests_per_minute
+            self.tokens_per_minute = tokens_per_minute
+            self.max_concurrency = max_concurrency
+            self.burst_seconds = burst_seconds
+            self._requests = self._bucket(requests_per_minute)
+            self._tokens = self._bucket(tokens_per_minute)
+            self._apply_rate()
+            self._condition.notify_all()
+
+    def _bucket(self, per_minute):
+        if not per_minute:
+            return None
+        rate = per_minute / 60
+        return TokenBucket(rate, max(1.0, rate * self.burst_seconds), clock=self.clock)
+
+    def _apply_rate(self):
+        for bucket, per_minute in ((self._requests, self.requests_per_minute),
+                                   (self._tokens, self.tokens_per_minute)):
+            if bucket is not None:
+                # A slower rate also means a smaller burst
+                bucket._refill()
+                bucket.rate = per_minute / 60 * self._rate_fraction
+                bucket.capacity = max(1.0, bucket.rate * self.burst_seconds)
+                bucket.level = min(bucket.level, bucket.capacity)
+
+    # ---------------- admission ----------------
+
+    def _wait_turn(self, priority, sequence, prompt_tokens):
+        """
+        Blocks until this call may be sent, then takes its slot and budget.
+        """
+        ticket = (priority, sequence)
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                delay = self._admission_delay(ticket, prompt_tokens)
+                if delay == 0:
+                    break
+                self._condition.wait(timeout=delay)
+
+            heapq.heappop(self._waiting)
+            self._in_flight += 1
+            if self._requests is not None:
+                self._requests.take(1)
+            if self._tokens is not None:
+                self._tokens.take(prompt_tokens)
+            # The next call in line may be admissible too
+            self._condition.notify_all()
+
+    def _admission_delay(self, ticket, prompt_tokens):
+        """
+        0 if ticket may go now, else how long to wait before checking
+        again (None: until notified).
+        """
+        if self._waiting[0] != ticket or self._in_flight >= self.max_concurrency:
+            return None
+        delay = self._paused_until - self.clock()
+        if self._requests is not None:
+            delay = max(delay, self._requests.wait_time(1))
+        if self._tokens is not None:
+            delay = max(delay, self._tokens.wait_time(prompt_tokens))
+        return max(delay, 0)
+
+    def _release(self, response_tokens=0):
+        with self._condition:
+            self._in_flight -= 1
+            if self._tokens is not None and response_tokens:
+                self._tokens.take(response_tokens)
+            self._condition.notify_all()
+
+    # ---------------- adaptive rate ----------------
+
+    def _on_success(self):
+        with self._condition:
+            self._consecutive_throttles = 0
+            now = self.clock()
+            if self._rate_fraction < 1.0 and now - self._last_change >= self.recovery_seconds:
+                self._rate_fraction = min(1.0, self._rate_fraction + self.rate_recovery)
+                self._last_change = now
+                self._apply_rate()
+
+    def _on_throttled(self, retry_after, sent_at):
+        with self._condition:
+            self._metrics["throttled"] += 1
+            if self._last_throttle is not None and sent_at < self._last_throttle:
+                # Sent before the last 429 was handled; already accounted for
+                return
+            self._last_throttle = self._last_change = self.clock()
+            self._consecutive_throttles += 1
+            self._rate_fraction = max(self.min_rate_fraction, self._rate_fraction * self.rate_decrease)
+            self._apply_rate()
+
+            if retry_after is None:
+                retry_after = min(self.max_backoff, 2 ** (self._consecutive_throttles - 1)) + random.uniform(0, 1)
+            now = self.clock()
+            paused_until = now + retry_after
+            if paused_until > self._paused_until:
+                self._metrics["paused_seconds"] += paused_until - max(now, self._paused_until)
+                self._paused_until = paused_until
+            print(f"WARNING: LLM rate limit hit (429); pausing {retry_after:.1f}s, "
+                  f"rate now {self._rate_fraction:.0%} of the configured limit.")
+            self._condition.notify_all()
+
+    # ---------------- calls ----------------
+
+    def submit(self, call_fn, prompt, priority="default"):
+        """
+        call_fn(prompt) under the scheduler's limits; returns its result
+        and re-raises its non-retryable errors, or the last retryable one
+        after max_retries retries.
+        """
+        rank = PRIORITIES.get(priority, PRIORITIES["default"])
+        # The sequence number is kept across retries, so a throttled call
+        # goes back to the front of its class
+        sequence = next(self._sequence)
+        prompt_tokens = estimate_tokens(prompt)
+        queued_at = self.clock()
+        waited = 0.0
+
+        self._local.last = {"retries": 0, "queue_wait_seconds": 0.0}
+        for attempt in range(self.max_retries + 1):
+            self._local.last = {"retries": attempt, "queue_wait_seconds": round(waited, 4)}
+            start = self.clock()
+            self._wait_turn(rank, sequence, prompt_tokens)
+            sent_at = self.clock()
+            waited += sent_at - start
+
+            try:
+                response = call_fn(prompt)
+            except RateLimited as e:
+                self._release()
+                self._on_throttled(e.retry_after, sent_at)
+                error = e
+            except RetryableLLMError as e:
+                self._release()
+                with self._condition:
+                    self._metrics["server_errors"] += 1
+                wait = e.retry_after if e.retry_after is not None else min(self.max_backoff, 2 ** attempt)
+                print(f"WARNING: LLM server error ({e}); retrying in {wait:.1f}s.")
+                self.sleep(wait + random.uniform(0, 0.5))
+                error = e
+            except Exception:
+                self._release()
+                self._record(priority, waited, failed=True)
+                raise
+            else:
+                self._local.last["queue_wait_seconds"] = round(waited, 4)
+                self._release(estimate_tokens(response) if isinstance(response, str) else 0)
+                self._on_success()
+                self._record(priority, waited)
+                return response
+
+            if attempt < self.max_retries:
+                with self._condition:
+                    self._metrics["retries"] += 1
+
+        self._record(priority, waited, failed=True)
+        raise RuntimeError(
+            f"LLM call failed after {self.max_retries} retries "
+            f"({self.clock() - queued_at:.1f}s): {error}"
+        ) from error
+
+    def last_call(self) -> dict:
+        """
+        Retries and queue wait of the last submit() from this thread.
+        """
+        return dict(getattr(self._local, "last", {}))
+
+    def _record(self, priority, waited, failed=False):
+        with self._condition:
+            metrics = self._metrics
+            metrics["calls"] += 1
+            metrics["failed"] += int(failed)
+            metrics["queue_wait_seconds"] += waited
+            metrics["max_queue_wait_seconds"] = max(metrics["max_queue_wait_seconds"], waited)
+            by_priority = metrics["by_priority"].setdefault(priority, {"calls": 0, "queue_wait_seconds": 0.0})
+            by_priority["calls"] += 1
+            by_priority["queue_wait_seconds"] += waited
+
+    def metrics(self) -> dict:
+        """
+        Counters since start, plus the current state: calls in flight and
+        waiting, and the adaptive rate as a fraction of the configured one.
+        """
+        with self._condition:
+            metrics = dict(self._metrics)
+            metrics["by_priority"] = {
+                name: {"calls": entry["calls"], "queue_wait_seconds": round(entry["queue_wait_seconds"], 3)}
+                for name, entry in self._metrics["by_priority"].items()
+            }
+            for key in ("queue_wait_seconds", "max_queue_wait_seconds", "paused_seconds"):
+                metrics[key] = round(metrics[key], 3)
+            metrics.update({
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiting),
+                "rate_fraction": round(self._rate_fraction, 3),
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "max_concurrency": self.max_concurrency,
+            })
+            return metrics
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_scheduler(**limits):
+    """
+    The process-wide scheduler, created on first use; later calls with
+    limits reconfigure it (see LLMScheduler.configure).
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = LLMScheduler(**limits)
+        elif limits:
+            _shared.configure(**limits)
+    return _shared
@@ -14,4 +14,4 @@ TASK:
 Reply ONLY JSON:
 {{"approved": true/false, "reason": "string"}}
 """
-    return llm.ask_json(prompt)
+    return llm.ask_json(prompt, priority="verify")
@@ -0,0 +1,76 @@
+import threading
+
+try:
+    import psutil
+except ImportError:  # optional: without it peak memory is simply not reported
+    psutil = None
+
+
+def _to_mb(num_bytes):
+    return None if num_bytes is None else round(num_bytes / (1024 * 1024), 2)
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes, or None without psutil.
+    """
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class PeakMemory:
+    """
+    Samples this process's RSS on a background thread while the block runs.
+
+        with PeakMemory() as mem:
+            ...
+        mem.peak_bytes, mem.delta_bytes
+
+    Very short spikes between samples can be missed; interval is a trade-off
+    between accuracy and overhead.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.baseline_bytes = None
+        self.peak_bytes = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        process = psutil.Process()
+        while not self._stop.is_set():
+            rss = process.memory_info().rss
+            if rss > self.peak_bytes:
+                self.peak_bytes = rss
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if psutil is None:
+            return self
+        self.baseline_bytes = current_rss()
+        self.peak_bytes = self.baseline_bytes
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak_bytes = max(self.peak_bytes, current_rss())
+        return False
+
+    @property
+    def delta_bytes(self):
+        if self.peak_bytes is None:
+            return None
+        return self.peak_bytes - self.baseline_bytes
+
+    def as_dict(self):
+        return {
+            "baseline_rss_mb": _to_mb(self.baseline_bytes),
+            "peak_rss_mb": _to_mb(self.peak_bytes),
+            "peak_delta_mb": _to_mb(self.delta_bytes),
+        }
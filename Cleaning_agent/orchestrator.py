@@ -1,105 +1,728 @@
 from sandbox import execute
-from diff_engine import compute_diff
+from diff_engine import compute_diff, has_changes
 from llms.generator import generate_code
 from llms.verifier import verify_code
-from llms.auditor import audit
-from llms.interpreter import interpret_rule
+from llms.auditor import audit, audit_many
+from llms.interpreter import interpret_rules
+from llms.batch import DEFAULT_BATCH_SIZE
 from ast_guard import sanitize_code, validate_code
-from csv_read_toon import generate_metadata_toon_from_df
+from csv_read_toon import generate_metadata_toon_from_df, ColumnProfileCache, UNCHANGED
+from schema import schema_fingerprint
+from chunked import is_row_local, execute_chunked, text_dtypes, ChunkFailed
+from stream_profile import profile_csv, generate_metadata_toon_from_profile
+from state import PipelineState
+from memory_monitor import PeakMemory
+from checkpoint import CheckpointStore
+from events import ProgressEvents
+from sandbox_pool import SandboxError
+from llms.tokens import estimate_tokens
+from fusion import code_columns, conflicts, fuse_code, attribute_diff
+from tracing import Tracer
 
 import os
-from datetime import datetime
+import shutil
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
+MAX_ATTEMPTS = 3
+RETRYABLE_ERRORS = (ValueError, NameError, TypeError, KeyError, AttributeError, SyntaxError, SandboxError)
 
-def run_pipeline(state, rules, metadata_toon, llm):
+
+def generate_verified_code(llm, rule, metadata_toon, tracer=None, rule_index=None):
+    """
+    Generates, sanitizes, validates and verifies code for one rule in a
+    single shot. Used for speculative generation; raises ValueError or
+    SyntaxError when the code is not acceptable.
+    """
+    if tracer is None:
+        tracer = Tracer()
+    with tracer.span("generate", rule_index=rule_index, speculative=True, llm_stats=llm.thread_token_stats):
+        raw_code = generate_code(llm, rule, metadata_toon)
+    with tracer.span("validate", rule_index=rule_index, speculative=True):
+        code = sanitize_code(raw_code)
+        validate_code(code)
+
+    with tracer.span("verify", rule_index=rule_index, speculative=True, llm_stats=llm.thread_token_stats):
+        verdict = verify_code(llm, code, rule)
+    if not verdict["approved"]:
+        raise ValueError(f"Code rejected by verifier: {verdict.get('reason')}")
+
+    return code
+
+
+def generate_and_execute(llm, rule, df, metadata_toon, code=None, before_execute=None, copy_mode="cow",
+                         events=None, rule_index=None, sandbox=None, tracer=None):
+    """
+    The generate -> validate -> verify -> execute retry loop for one rule.
+
+    code: already approved code (e.g. speculative) to try first.
+    before_execute: called once the code is approved, right before it runs.
+    copy_mode: how df is protected from the generated code (see sandbox.execute).
+    "cow" copies only the columns the code modifies, instead of the whole
+    frame on every attempt.
+    events: ProgressEvents receiving generate_attempt, verify_verdict,
+    attempt_failed and executed events tagged with rule_index.
+    sandbox: SandboxPool to run the code in a separate process with time
+    and memory limits (copy_mode is then irrelevant); being stopped by a
+    limit counts as a failed attempt.
+    tracer: Tracer receiving generate, validate, verify and execute spans
+    per attempt.
+
+    Returns (code, df_after, issues, execution) where execution holds the
+    run time and peak memory of the successful attempt. Re-raises the last
+    error once MAX_ATTEMPTS attempts have failed.
+    """
+    if events is None:
+        events = ProgressEvents()
+    if tracer is None:
+        tracer = Tracer()
+    last_error = None
+    code_approved = code is not None
+
+    for attempt in range(MAX_ATTEMPTS):
+        if not code_approved:
+            events.emit("generate_attempt", rule_index=rule_index, attempt=attempt + 1)
+            with tracer.span("generate", rule_index=rule_index, attempt=attempt + 1,
+                             llm_stats=llm.thread_token_stats):
+                raw_code = generate_code(
+                    llm,
+                    rule + (f"\n\nNOTE: Previous attempt failed due to: {last_error}" if last_error else ""),
+                    metadata_toon
+                )
+            events.emit("code_generated", rule_index=rule_index, attempt=attempt + 1, **llm.last_call_tokens())
+
+        try:
+            with tracer.span("validate", rule_index=rule_index, attempt=attempt + 1):
+                if not code_approved:
+                    code = sanitize_code(raw_code)
+                validate_code(code)
+            print("INFO: Code syntax is valid.")
+
+            if not code_approved:
+                with tracer.span("verify", rule_index=rule_index, attempt=attempt + 1,
+                                 llm_stats=llm.thread_token_stats):
+                    verdict = verify_code(llm, code, rule)
+                events.emit("verify_verdict", rule_index=rule_index, attempt=attempt + 1,
+                            approved=bool(verdict["approved"]), reason=verdict.get("reason"))
+                if not verdict["approved"]:
+                    raise ValueError(f"Code rejected by verifier: {verdict.get('reason')}")
+                code_approved = True
+                print("INFO: Code verification approved.")
+
+            if before_execute is not None:
+                before_execute()
+
+            start = time.perf_counter()
+            with tracer.span("execute", rule_index=rule_index, attempt=attempt + 1) as span:
+                with PeakMemory() as memory:
+                    if sandbox is not None:
+                        df_after, issues = sandbox.execute(code, df)
+                    else:
+                        df_after, issues = execute(code, df, copy_mode=copy_mode)
+
+                execution = {
+                    "seconds": round(time.perf_counter() - start, 4),
+                    "copy_mode": "process" if sandbox is not None else copy_mode
+                }
+                execution.update(memory.as_dict())
+                if sandbox is not None:
+                    execution.update(sandbox.last_call)
+                span.update(execution)
+            events.emit("executed", rule_index=rule_index, **execution)
+
+            print("INFO: Code executed successfully in validation.")
+            if execution["peak_rss_mb"] is not None:
+                print(f"INFO: Execution took {execution['seconds']}s, peak memory "
+                      f"{execution['peak_rss_mb']} MB (+{execution['peak_delta_mb']} MB).")
+            return code, df_after, issues, execution
+
+        except RETRYABLE_ERRORS as e:
+            print(f"WARNING: Validation failed on attempt {attempt + 1}: {e}")
+            events.emit("attempt_failed", rule_index=rule_index, attempt=attempt + 1, error=str(e))
+            last_error = str(e)
+            code_approved = False
+            if attempt == MAX_ATTEMPTS - 1:
+                print("ERROR: Code failed validation after multiple attempts.")
+                raise
+
+
+def _next_executable_rule(intents, first_rule, after_index):
+    for i in range(after_index + 1, first_rule + len(intents)):
+        if intents[i - first_rule]["requires_execution"]:
+            return i
+    return None
+
+
+def _fusion_group(rules, intents, first_rule, rule_index, code, fingerprint, rule_pack):
+    """
+    The run of consecutive executable rules, starting at rule_index (whose
+    compiled code is code), that all have compiled code for this schema and
+    pairwise non-conflicting column footprints (see fusion.code_columns).
+    Returns [(rule_index, code, (reads, writes)), ...]; a single entry
+    means there is nothing to fuse.
+    """
+    footprint, reason = code_columns(code)
+    if footprint is None:
+        return [(rule_index, code, None)]
+
+    group = [(rule_index, code, footprint)]
+    for index in range(rule_index + 1, len(rules)):
+        if not intents[index - first_rule]["requires_execution"]:
+            break
+        next_code = rule_pack.peek(rules[index], fingerprint)
+        if next_code is None:
+            break
+        next_footprint, reason = code_columns(next_code)
+        if next_footprint is None or any(conflicts(member[2], next_footprint) for member in group):
+            break
+        group.append((index, next_code, next_footprint))
+    return group
+
+
+def _diff_summary(diff):
+    # The per-column detail stays in results.json; events carry the headline numbers
+    return {key: diff[key] for key in (
+        "rows_before", "rows_after", "rows_removed", "rows_added", "changed_cells",
+        "columns_added", "columns_removed", "retyped_columns"
+    )}
+
+
+def run_pipeline(state, rules, metadata_toon, llm, interpret_workers=8, pipelined=False, profile_cache=None,
+                 checkpoints=None, copy_mode="cow", events=None, rule_pack=None, audit_compiled=False,
+                 sandbox=None, metadata_token_budget=None, column_index=None, llm_batch_size=DEFAULT_BATCH_SIZE, fuse=False,
+                 tracer=None, pending_audits=None):
+    """
+    After every completed rule the run's progress is saved with
+    checkpoints.save_run, so a crashed or killed run can continue from its
+    first incomplete rule: build state from checkpoints.load_run() (frame,
+    next_rule as rule_index, history, code, log_paths), pass its
+    metadata_toon and its pending_audits (audits queued for a batch when
+    the run stopped) and the same rules.
+
+    tracer: Tracer receiving a span per stage, rule and attempt
+    (tracing.STAGES); each rule's history entry gets its stage timings.
+
+    fuse: run consecutive rules with compiled code whose columns don't
+    overlap (one rule never writes a column another reads or writes) as
+    one composed apply_rule, with one execution, one diff, one checkpoint
+    and one metadata refresh for the group. Each rule still gets its own
+    history entry, log and audit, from the part of the group diff in the
+    columns it writes. If the fused code fails, or changes rows or columns
+    no member declared, the rules run one by one instead. Checkpoints of
+    steps inside a group are not written; the group's last step is.
+
+    llm_batch_size: rules interpreted, and diffs audited, per LLM call
+    (see llms/batch.py); 1 disables batching. Batched audits are deferred
+    until llm_batch_size of them are pending or the run ends; their
+    verdicts are then filled into the history and rule logs, and approved
+    code is added to the rule pack.
+
+    column_index: ColumnIndex mapping each rule to the columns it refers
+    to; the rule's generation prompt then carries full metadata for those
+    columns only and a name:dtype list of the rest. Rules it can't map
+    (or whole-table rules) get the full metadata.
+
+    metadata_token_budget: token budget for the metadata regenerated after
+    each rule (see generate_metadata_toon_from_df).
+
+    sandbox: SandboxPool that runs each rule's code in a worker process
+    with time and memory limits; None runs it in this process.
+
+    rule_pack: RulePack of approved code keyed by rule text and schema
+    fingerprint. A rule found there for the current schema runs its stored
+    code without generate/verify (and without audit unless audit_compiled);
+    newly approved code is added to it. If stored code fails on this
+    extract, the rule falls back to normal generation.
+
+    events: ProgressEvents that receives a structured event at each stage
+    (see events.py), e.g. for following the run live from the web app.
+
+    copy_mode: "cow" (default) or "deep"; see sandbox.execute.
+    checkpoints: CheckpointStore for the frame after each rule (default
+    ./checkpoints). Step n is the frame after rule n; step 0 is the input.
+    Starting at rule 0 clears it.
+
+    profile_cache: ColumnProfileCache used to build metadata_toon, if any;
+    metadata regeneration between rules then only re-profiles the columns
+    the diff reports as changed, added or retyped.
+
+    pipelined: while a rule executes and is audited, generate and verify
+    the next executable rule's code against the current metadata. The
+    speculative code is used only if the rule did not change the schema
+    (columns or dtypes) that the speculative prompt was built from.
+    """
     current_metadata_toon = metadata_toon
+    if events is None:
+        events = ProgressEvents()
+    if tracer is None:
+        tracer = Tracer()
+    if profile_cache is None:
+        profile_cache = ColumnProfileCache()
+
+    if checkpoints is None:
+        checkpoints = CheckpointStore("checkpoints")
+    if state.rule_index == 0:
+        checkpoints.clear()
+    if state.rule_index not in checkpoints.available_steps():
+        checkpoints.write_base(state.df, step=state.rule_index)
+
+    def rule_metadata(rule_text):
+        """
+        (metadata for rule_text's generation prompt, columns it focuses on or None)
+        """
+        if column_index is None:
+            return current_metadata_toon, None
+        column_index.update(state.df)
+        focus = column_index.relevant_columns(rule_text, state.df.columns)
+        if focus is None:
+            return current_metadata_toon, None
+        # The profile cache saw state.df when current_metadata_toon was built
+        with tracer.span("metadata", rule_index=state.rule_index, focus_columns=len(focus)):
+            focused = generate_metadata_toon_from_df(state.df, profile_cache=profile_cache, diff=UNCHANGED,
+                                                     token_budget=metadata_token_budget, focus_columns=focus)
+        return focused, focus
+
+    pending_audits = list(pending_audits or [])
+
+    def save_progress():
+        with tracer.span("checkpoint", rule_index=state.rule_index - 1, run_state=True):
+            checkpoints.save_run(state, rules, current_metadata_toon, pending_audits)
+
+    def record_verdict(rule_index, rule_text, audit_feedback, put_code):
+        verdict_text = "APPROVED" if audit_feedback.get("approve") else "REJECTED"
+        print(f"INFO: Audit of rule #{rule_index + 1} complete. Verdict: {verdict_text}")
+        events.emit("audit", rule_index=rule_index, approve=bool(audit_feedback.get("approve")),
+                    summary=audit_feedback["summary"])
+        if put_code is not None and audit_feedback.get("approve"):
+            rule_pack.put(rule_text, *put_code)
+
+    def flush_audits():
+        if not pending_audits:
+            return
+        print(f"INFO: Auditing {len(pending_audits)} rules in one batch.")
+        with tracer.span("audit", rules=[p["rule_index"] for p in pending_audits],
+                         llm_stats=llm.thread_token_stats):
+            verdicts = audit_many(llm, [(p["diff"], p["rule"]) for p in pending_audits], batch_size=llm_batch_size)
+        for pending, audit_feedback in zip(pending_audits, verdicts):
+            state.record_audit(pending["rule_index"], audit_feedback["summary"], audit_feedback)
+            record_verdict(pending["rule_index"], pending["rule"], audit_feedback, pending["put_code"])
+        pending_audits.clear()
+
+    def run_fused_group(group, fingerprint):
+        """
+        Runs group (see _fusion_group) in one pass. Returns False, leaving
+        state untouched, if the rules have to run one by one instead.
+        """
+        nonlocal current_metadata_toon, speculation, no_fusion_before
+        indices = [index for index, _, _ in group]
+        print(f"INFO: Fusing rules #{indices[0] + 1}-#{indices[-1] + 1} into one pass.")
+        events.emit("fusion_started", rule_index=indices[0], rules=indices)
+
+        start = time.perf_counter()
+        try:
+            fused = fuse_code([code for _, code, _ in group])
+            with tracer.span("execute", rule_index=indices[0], rules=indices) as span, PeakMemory() as memory:
+                if sandbox is not None:
+                    df_after, rule_issues = sandbox.execute(fused, state.df)
+                else:
+                    df_after, rule_issues = execute(fused, state.df, copy_mode=copy_mode)
+            span.update(memory.as_dict())
+        except RETRYABLE_ERRORS as e:
+            print(f"WARNING: Fused pass failed ({e}); running the rules one by one.")
+            events.emit("fusion_fallback", rule_index=indices[0], reason=str(e))
+            no_fusion_before = indices[-1] + 1
+            return False
+
+        execution = {
+            "seconds": round(time.perf_counter() - start, 4),
+            "copy_mode": "process" if sandbox is not None else copy_mode,
+            "fused_rules": len(group)
+        }
+        execution.update(memory.as_dict())
+        if sandbox is not None:
+            execution.update(sandbox.last_call)
+
+        df_before_group = state.df
+        with tracer.span("diff", rule_index=indices[0], rules=indices):
+            diff = compute_diff(df_before_group, df_after)
+        all_writes = set().union(*(footprint[1] for _, _, footprint in group))
+        touched = set(diff["changed_by_column"]) | set(diff["retyped_columns"]) | set(diff["columns_added"])
+        if (diff["aligned_on"] != "identical" or diff["row_delta"] != 0 or diff["columns_removed"]
+                or not touched <= all_writes):
+            print("WARNING: Fused pass changed rows or undeclared columns; running the rules one by one.")
+            events.emit("fusion_fallback", rule_index=indices[0], reason="unexpected changes")
+            no_fusion_before = indices[-1] + 1
+            return False
+
+        if speculation is not None and speculation[0] in indices:
+            speculation[2].cancel()
+            speculation = None
+
+        state.df = df_after
+        for position, (index, code, (reads, writes)) in enumerate(group):
+            rule_text = rules[index]
+            state.rule_index = index
+            state.code[index] = code
+            if position > 0:
+                # Counted as a hit now that its code actually ran
+                rule_pack.get(rule_text, fingerprint)
+                events.emit("rule_started", rule_index=index, rule=rule_text[:200])
+            events.emit("compiled_code_used", rule_index=index)
+            events.emit("executed", rule_index=index, **execution)
+
+            rule_diff = attribute_diff(diff, writes, all_writes - writes)
+            events.emit("diff", rule_index=index, **_diff_summary(rule_diff))
+
+            summary = "Validation rule executed with no data changes."
+            diff_result = None
+            audit_feedback = None
+            if has_changes(rule_diff):
+                diff_result = rule_diff
+                if not audit_compiled:
+                    summary = "Compiled rule executed in a fused pass; audit skipped."
+                elif llm_batch_size > 1:
+                    pending_audits.append({"rule_index": index, "rule": rule_text, "diff": rule_diff,
+                                           "put_code": None})
+                    summary = "Audit pending."
+                else:
+                    with tracer.span("audit", rule_index=index, llm_stats=llm.thread_token_stats):
+                        audit_feedback = audit(llm, rule_diff, rule_text)
+                    summary = audit_feedback["summary"]
+                    record_verdict(index, rule_text, audit_feedback, None)
+
+            state.snapshot(note=summary, diff=diff_result, audit=audit_feedback,
+                           execution=dict(execution, issues=len(rule_issues[position])),
+                           timings=tracer.rule_timings(index))
+            events.emit("rule_finished", rule_index=index)
+
+        with tracer.span("checkpoint", rule_index=indices[-1], rules=indices):
+            checkpoints.write_step(indices[-1] + 1, df_before_group, df_after, diff)
+
+        print("INFO: Regenerating metadata from the updated DataFrame.")
+        with tracer.span("metadata", rule_index=indices[-1], rules=indices):
+            current_metadata_toon = generate_metadata_toon_from_df(
+                state.df, profile_cache=profile_cache, diff=diff, token_budget=metadata_token_budget
+            )
+        if len(pending_audits) >= llm_batch_size:
+            flush_audits()
+
+        state.rule_index = indices[-1] + 1
+        save_progress()
+        return True
+
+    # After a failed fused pass its rules run one by one, not in smaller groups
+    no_fusion_before = 0
+    speculator = ThreadPoolExecutor(max_workers=1) if pipelined else None
+    speculation = None  # (rule_index, schema_fingerprint, future)
+    speculative_used = 0
+    speculative_discarded = 0
+
+    # Interpretation depends only on the rule text, so classify all remaining
+    # rules up front in parallel; the data loop below only waits on stages
+    # that need the previous rule's output.
+    first_rule = state.rule_index
+    events.emit("pipeline_started", rules=len(rules), first_rule=first_rule)
+
+    start = time.perf_counter()
+    # Batches are interpreted on a thread pool, so count every thread's LLM calls
+    with tracer.span("interpret", llm_stats=llm.token_stats):
+        intents = interpret_rules(llm, rules[first_rule:], max_workers=interpret_workers, batch_size=llm_batch_size)
+    print(f"INFO: Interpreted {len(intents)} rules.")
+    events.emit("interpret_done", rules=len(intents), seconds=round(time.perf_counter() - start, 4),
+                executable=sum(1 for i in intents if i["requires_execution"]))
 
     while state.rule_index < len(rules):
         rule = rules[state.rule_index]
+        events.emit("rule_started", rule_index=state.rule_index, rule=rule[:200])
 
-        intent = interpret_rule(llm, rule)
+        intent = intents[state.rule_index - first_rule]
 
         if not intent["requires_execution"]:
+            events.emit("rule_skipped", rule_index=state.rule_index, reason="informational")
             state.snapshot("Informational rule – skipped execution")
             state.rule_index += 1
+            save_progress()
             continue
 
-        MAX_ATTEMPTS = 3
-        last_error = None
-        code_approved = False
-        df_after, issues = (None, [])
+        code = None
+        fingerprint = schema_fingerprint(state.df)
+        compiled = rule_pack.get(rule, fingerprint) if rule_pack is not None else None
 
-        for attempt in range(MAX_ATTEMPTS):
-            if not code_approved:
-                raw_code = generate_code(
-                    llm,
-                    rule + (f"\n\nNOTE: Previous attempt failed due to: {last_error}" if last_error else ""),
-                    current_metadata_toon
-                )
-                code = sanitize_code(raw_code)
+        if compiled is not None:
+            code = compiled
+            print("INFO: Using compiled code from the rule pack.")
+            events.emit("compiled_code_used", rule_index=state.rule_index)
+            if speculation is not None and speculation[0] == state.rule_index:
+                speculation[2].cancel()
+                speculation = None
 
-            try:
-                validate_code(code)
-                print("INFO: Code syntax is valid.")
+            if fuse and state.rule_index >= no_fusion_before:
+                group = _fusion_group(rules, intents, first_rule, state.rule_index, code, fingerprint, rule_pack)
+                if len(group) > 1 and run_fused_group(group, fingerprint):
+                    continue
 
-                if not code_approved:
-                    verdict = verify_code(llm, code, rule)
-                    if not verdict["approved"]:
-                        raise ValueError(f"Code rejected by verifier: {verdict.get('reason')}")
-                    code_approved = True
-                    print("INFO: Code verification approved.")
+        elif speculation is not None and speculation[0] == state.rule_index:
+            _, spec_fingerprint, future = speculation
+            speculation = None
+            if spec_fingerprint == fingerprint:
+                try:
+                    code = future.result()
+                    speculative_used += 1
+                    print("INFO: Using speculatively generated code.")
+                    events.emit("speculation_used", rule_index=state.rule_index)
+                except Exception as e:
+                    speculative_discarded += 1
+                    print(f"INFO: Speculative code discarded: {e}")
+            else:
+                future.cancel()
+                speculative_discarded += 1
+                print("INFO: Schema changed, discarding speculative code.")
 
-                df_before = state.df.copy()
-                df_after, issues = execute(code, df_before)
+        def start_speculation():
+            # Start on the next rule's code while this one executes and is audited
+            nonlocal speculation
+            if speculator is None or speculation is not None:
+                return
+            next_index = _next_executable_rule(intents, first_rule, state.rule_index)
+            if next_index is not None and rule_pack is not None and rule_pack.has_rule(rules[next_index]):
+                # Most likely compiled already; don't spend LLM calls on it
+                return
+            if next_index is not None:
+                speculation = (
+                    next_index,
+                    schema_fingerprint(state.df),
+                    speculator.submit(generate_verified_code, llm, rules[next_index],
+                                      rule_metadata(rules[next_index])[0], tracer, next_index)
+                )
 
-                print("INFO: Code executed successfully in validation.")
-                break
+        metadata_toon, focus = rule_metadata(rule)
+        if focus is not None:
+            events.emit("columns_selected", rule_index=state.rule_index, columns=focus[:20],
+                        metadata_tokens=estimate_tokens(metadata_toon))
 
-            except (ValueError, NameError, TypeError, KeyError, AttributeError, SyntaxError) as e:
-                print(f"WARNING: Validation failed on attempt {attempt + 1}: {e}")
-                last_error = str(e)
-                code_approved = False
-                if attempt == MAX_ATTEMPTS - 1:
-                    print("ERROR: Code failed validation after multiple attempts.")
-                    raise
+        code, df_after, issues, execution = generate_and_execute(
+            llm, rule, state.df, metadata_toon, code=code, before_execute=start_speculation,
+            copy_mode=copy_mode, events=events, rule_index=state.rule_index, sandbox=sandbox, tracer=tracer
+        )
+        state.code[state.rule_index] = code
 
         summary = "Validation rule executed with no data changes."
         diff_result = None
         audit_feedback = None
 
         df_before_step = state.df
-        diff = compute_diff(df_before_step, df_after)
+        with tracer.span("diff", rule_index=state.rule_index):
+            diff = compute_diff(df_before_step, df_after)
+        events.emit("diff", rule_index=state.rule_index, **_diff_summary(diff))
+        from_pack = compiled is not None and code == compiled
 
-        if diff["row_delta"] != 0 or diff.get("changed_cells", 0) != 0:
-            print("INFO: Data changed, proceeding to audit.")
+        if has_changes(diff) and from_pack and not audit_compiled:
+            print("INFO: Data changed by compiled code; audit skipped.")
             diff_result = diff
+            summary = "Compiled rule executed; audit skipped."
+        elif has_changes(diff):
+            diff_result = diff
+            put_code = (fingerprint, code) if rule_pack is not None and not from_pack else None
 
-            audit_feedback = audit(llm, diff, rule)
-
-            summary = audit_feedback["summary"]
-            verdict_text = "APPROVED" if audit_feedback.get("approve") else "REJECTED"
-            print(f"INFO: Audit complete. Verdict: {verdict_text}")
+            if llm_batch_size > 1:
+                print("INFO: Data changed, audit queued.")
+                pending_audits.append({"rule_index": state.rule_index, "rule": rule, "diff": diff,
+                                       "put_code": put_code})
+                summary = "Audit pending."
+            else:
+                print("INFO: Data changed, proceeding to audit.")
+                with tracer.span("audit", rule_index=state.rule_index, llm_stats=llm.thread_token_stats):
+                    audit_feedback = audit(llm, diff, rule)
+                summary = audit_feedback["summary"]
+                record_verdict(state.rule_index, rule, audit_feedback, put_code)
         else:
             print("INFO: No data changed.")
+            if rule_pack is not None and not from_pack:
+                rule_pack.put(rule, fingerprint, code)
 
-        # Commit the changes to the main DataFrame
+        # Checkpoint only what this rule changed, then commit to the main DataFrame
+        with tracer.span("checkpoint", rule_index=state.rule_index):
+            checkpoints.write_step(state.rule_index + 1, df_before_step, df_after, diff)
         state.df = df_after
 
-        # Save CSV after each rule
-        os.makedirs("step_csv", exist_ok=True)
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_path = f"step_csv/output_after_rule_{state.rule_index+1}_{ts}.csv"
-        state.df.to_csv(csv_path, index=False)
-
         # Snapshot (writes per-rule log)
-        state.snapshot(note=summary, diff=diff_result, audit=audit_feedback)
+        state.snapshot(note=summary, diff=diff_result, audit=audit_feedback, execution=execution,
+                       timings=tracer.rule_timings(state.rule_index))
 
         # Regenerate metadata for the next loop
         print("INFO: Regenerating metadata from the updated DataFrame.")
-        current_metadata_toon = generate_metadata_toon_from_df(state.df)
+        with tracer.span("metadata", rule_index=state.rule_index):
+            current_metadata_toon = generate_metadata_toon_from_df(
+                state.df, profile_cache=profile_cache, diff=diff, token_budget=metadata_token_budget
+            )
+        events.emit("rule_finished", rule_index=state.rule_index)
+
+        if len(pending_audits) >= llm_batch_size:
+            flush_audits()
 
         # Move to the next rule
         state.rule_index += 1
+        save_progress()
+
+    if pending_audits:
+        flush_audits()
+        save_progress()
+
+    print(f"INFO: Column profiles reused {profile_cache.reused} times, recomputed {profile_cache.recomputed} times.")
+
+    if rule_pack is not None:
+        stats = rule_pack.stats()
+        print(f"INFO: Rule pack: {stats['hits']} rules ran compiled code, {stats['misses']} needed generation "
+              f"({stats['entries']} entries).")
+
+    if speculator is not None:
+        speculator.shutdown(wait=False, cancel_futures=True)
+        print(f"INFO: Speculative code used for {speculative_used} rules, discarded for {speculative_discarded}.")
 
     # 🔹 FINAL LOG after all rules are completed
-    state.snapshot(note="Pipeline completed. All rules processed.")
\ No newline at end of file
+    state.snapshot(note="Pipeline completed. All rules processed.")
+    events.emit("pipeline_finished", rules=len(rules))
+
+
+def run_streaming_pipeline(rules, input_path, output_path, llm, work_dir="stream_work",
+                           chunksize=100_000, max_workers=None, sample_rows=1000, interpret_workers=8,
+                           events=None, sandbox=None, metadata_token_budget=None, column_index=None,
+                           llm_batch_size=DEFAULT_BATCH_SIZE, tracer=None, full_profile=False):
+    """
+    Out-of-core variant of run_pipeline for inputs that do not fit in memory.
+
+    Code for each rule is generated, verified, executed and audited on a
+    sample (the first sample_rows rows of the current file). The approved
+    code is then applied to the whole file: row-local rules stream through
+    execute_chunked on a process pool, global rules (dedup, group-wise
+    fills, ...) load the frame and run in one piece as usual.
+
+    The metadata the LLM sees describes the sample, unless full_profile:
+    then it is a streaming profile of the whole current file (see
+    stream_profile.profile_csv), one extra pass over it per changed file.
+
+    Returns the PipelineState of the sample, whose history has one entry
+    per rule like run_pipeline's.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    if events is None:
+        events = ProgressEvents()
+    if tracer is None:
+        tracer = Tracer()
+    events.emit("pipeline_started", rules=len(rules), first_rule=0)
+
+    start = time.perf_counter()
+    with tracer.span("interpret", llm_stats=llm.token_stats):
+        intents = interpret_rules(llm, rules, max_workers=interpret_workers, batch_size=llm_batch_size)
+    print(f"INFO: Interpreted {len(intents)} rules.")
+    events.emit("interpret_done", rules=len(intents), seconds=round(time.perf_counter() - start, 4),
+                executable=sum(1 for i in intents if i["requires_execution"]))
+
+    file_name = os.path.basename(input_path)
+    current_path = input_path
+    state = PipelineState(df=pd.read_csv(current_path, nrows=sample_rows))
+    profile, profiled_path = None, None
+
+    for index, rule in enumerate(rules):
+        state.rule_index = index
+        events.emit("rule_started", rule_index=index, rule=rule[:200])
+
+        if not intents[index]["requires_execution"]:
+            events.emit("rule_skipped", rule_index=index, reason="informational")
+            state.snapshot("Informational rule – skipped execution")
+            continue
+
+        focus = None
+        if column_index is not None:
+            column_index.update(state.df)
+            focus = column_index.relevant_columns(rule, state.df.columns)
+        with tracer.span("metadata", rule_index=index, full_profile=full_profile):
+            if full_profile:
+                if profiled_path != current_path:
+                    profile = profile_csv(current_path, chunksize=chunksize, max_workers=max_workers)
+                    profiled_path = current_path
+                metadata_toon = generate_metadata_toon_from_profile(profile, file_name=file_name,
+                                                                    token_budget=metadata_token_budget,
+                                                                    focus_columns=focus)
+            else:
+                metadata_toon = generate_metadata_toon_from_df(state.df, file_name=file_name,
+                                                               token_budget=metadata_token_budget,
+                                                               focus_columns=focus)
+        code, sample_after, issues, _ = generate_and_execute(llm, rule, state.df, metadata_toon, events=events,
+                                                             rule_index=index, sandbox=sandbox, tracer=tracer)
+
+        summary = "Validation rule executed with no data changes."
+        diff_result = None
+        audit_feedback = None
+
+        with tracer.span("diff", rule_index=index, sample=True):
+            diff = compute_diff(state.df, sample_after)
+        events.emit("diff", rule_index=index, sample=True, **_diff_summary(diff))
+        if has_changes(diff):
+            print("INFO: Data changed on the sample, proceeding to audit.")
+            diff_result = diff
+            with tracer.span("audit", rule_index=index, llm_stats=llm.thread_token_stats):
+                audit_feedback = audit(llm, diff, rule)
+            summary = audit_feedback["summary"]
+            verdict_text = "APPROVED" if audit_feedback.get("approve") else "REJECTED"
+            print(f"INFO: Audit complete. Verdict: {verdict_text}")
+            events.emit("audit", rule_index=index, approve=bool(audit_feedback.get("approve")), summary=summary)
+        else:
+            print("INFO: No data changed on the sample.")
+
+        next_path = os.path.join(work_dir, f"after_rule_{index + 1}.csv")
+        row_local, reason = is_row_local(code)
+
+        with tracer.span("execute", rule_index=index, full_pass=True, row_local=row_local) as span:
+            if row_local:
+                print(f"INFO: Rule is row-local ({reason}), streaming in chunks of {chunksize} rows.")
+                try:
+                    # Chunks get the sample's text columns as text, like the code was verified on
+                    stats = execute_chunked(code, current_path, next_path, chunksize=chunksize,
+                                            max_workers=max_workers, dtype=text_dtypes(state.df))
+                except ChunkFailed as e:
+                    print(f"ERROR: {e}")
+                    events.emit("full_pass_failed", rule_index=index, error=str(e))
+                    raise RuntimeError(
+                        f"Streaming run stopped at rule #{index + 1}: {e}. "
+                        f"The data before this rule is in {current_path}."
+                    ) from e
+                rows_in, rows_out = stats["rows_in"], stats["rows_out"]
+            else:
+                print(f"INFO: Rule is global ({reason}), running on the whole frame.")
+                df = pd.read_csv(current_path, low_memory=False)
+                with PeakMemory() as memory:
+                    if sandbox is not None:
+                        df_out, _ = sandbox.execute(code, df)
+                    else:
+                        df_out, _ = execute(code, df)
+                peak_mb = memory.as_dict()["peak_rss_mb"]
+                if peak_mb is not None:
+                    print(f"INFO: Whole-frame pass peak memory {peak_mb} MB.")
+                span["peak_rss_mb"] = peak_mb
+                rows_in, rows_out = len(df), len(df_out)
+                df_out.to_csv(next_path, index=False)
+                del df, df_out
+
+        print(f"INFO: Full pass: {rows_in} rows in, {rows_out} rows out.")
+        events.emit("full_pass", rule_index=index, row_local=row_local, rows_in=rows_in, rows_out=rows_out)
+
+        # Only the latest intermediate file is needed
+        if current_path != input_path:
+            os.remove(current_path)
+        current_path = next_path
+
+        state.df = pd.read_csv(current_path, nrows=sample_rows)
+        state.snapshot(note=summary, diff=diff_result, audit=audit_feedback, timings=tracer.rule_timings(index))
+        events.emit("rule_finished", rule_index=index)
+
+    if current_path != input_path:
+        shutil.move(current_path, output_path)
+    else:
+        shutil.copyfile(input_path, output_path)
+
+    state.rule_index = len(rules)
+    state.snapshot(note="Pipeline completed. All rules processed.")
+    events.emit("pipeline_finished", rules=len(rules))
+    return state
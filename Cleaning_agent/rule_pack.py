@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from ast_guard import validate_code
+
+
+class RulePack:
+    """
+    Compiled rulebook: the approved apply_rule source of each rule, keyed by
+    the rule text and the schema fingerprint (column names and dtypes) of
+    the frame the code was generated for.
+
+    Re-running the same rulebook on a new extract with the same schema can
+    then execute the stored code directly; only rules whose text changed or
+    whose input schema differs go back to the LLM.
+
+    Stored as one JSON file:
+        {"version": 1, "entries": {key: {"rule", "schema_fingerprint", "code", "compiled_at"}}}
+    """
+
+    VERSION = 1
+
+    def __init__(self, path="rule_pack.json"):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.entries = self._read()
+        self._rules = {entry["rule"] for entry in self.entries.values()}
+
+    @staticmethod
+    def make_key(rule, fingerprint):
+        payload = json.dumps([rule.strip(), fingerprint], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != self.VERSION:
+            print(f"WARNING: Ignoring rule pack {self.path} with unsupported version {data.get('version')}.")
+            return {}
+        return data["entries"]
+
+    def has_rule(self, rule):
+        """
+        True if code for this rule text is stored for any schema.
+        """
+        return rule.strip() in self._rules
+
+    def peek(self, rule, fingerprint):
+        """
+        Like get(), without counting a hit or miss; for looking ahead at
+        rules that may still run some other way.
+        """
+        entry = self.entries.get(self.make_key(rule, fingerprint))
+        if entry is None:
+            return None
+        try:
+            validate_code(entry["code"])
+        except (ValueError, SyntaxError) as e:
+            print(f"WARNING: Ignoring compiled code that fails validation: {e}")
+            return None
+        return entry["code"]
+
+    def get(self, rule, fingerprint):
+        """
+        The stored code for rule on this schema, or None. Code is validated
+        again on load, since the pack is a plain file anyone can edit.
+        """
+        code = self.peek(rule, fingerprint)
+        with self._lock:
+            if code is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return code
+
+    def put(self, rule, fingerprint, code):
+        validate_code(code)
+        with self._lock:
+            self.entries[self.make_key(rule, fingerprint)] = {
+                "rule": rule.strip(),
+                "schema_fingerprint": fingerprint,
+                "code": code,
+                "compiled_at": time.time(),
+            }
+            self._rules.add(rule.strip())
+            self.save()
+
+    def save(self):
+        # Merge with what is on disk, so concurrent runs sharing a pack
+        # don't drop each other's rules
+        entries = self._read()
+        entries.update(self.entries)
+        self.entries = entries
+        self._rules = {entry["rule"] for entry in entries.values()}
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "entries": entries}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
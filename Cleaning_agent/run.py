@@ -1,11 +1,27 @@
+import argparse
 import json
+import os
+from contextlib import nullcontext
 import pandas as pd
 from state import PipelineState
-from orchestrator import run_pipeline
+from orchestrator import run_pipeline, run_streaming_pipeline
 from llms.base import LLMClient
-from llms.gemini_client import gemini_call
+from llms.cache import ResponseCache
+from llms.gemini_client import gemini_call, GEMINI_MODEL, GEMINI_TEMPERATURE
+from llms.scheduler import get_scheduler
+from llms.batch import DEFAULT_BATCH_SIZE
 from llms.rule_splitter import split_rules
-from csv_read_toon import generate_metadata_toon_from_df
+from csv_read_toon import generate_metadata_toon_from_df, ColumnProfileCache
+from checkpoint import CheckpointStore
+from rule_pack import RulePack
+from sandbox_pool import SandboxPool
+from column_index import ColumnIndex
+from events import ProgressEvents
+from tracing import Tracer
+from ingest import load_csv, print_memory_report
+
+# Stage timings and LLM token counts of the run, written even when it fails (jobs.py reads it)
+TRACE_PATH = "data/trace.json"
 
 
 def load_rules(path):
@@ -57,9 +73,15 @@ def print_audit_summary(history: list, rules: list):
     print("=" * 80)
 
 
-def save_results_json(history: list, rules: list, output_path: str):
+def save_results_json(history: list, rules: list, output_path: str, llm_tokens: dict = None,
+                      llm_scheduler: dict = None, trace: dict = None, ingest: dict = None):
     """
     Saves the pipeline history and rules to a JSON file for the web UI.
+    llm_tokens: LLMClient.token_stats() of the run.
+    llm_scheduler: LLMScheduler.metrics(), counted since the process
+    started (a warm worker runs many jobs).
+    trace: Tracer.as_dict() of the run (per-stage totals and spans).
+    ingest: the input's memory report (see ingest.load_csv).
     """
     results = {
         "rules": rules,
@@ -69,42 +91,358 @@ def save_results_json(history: list, rules: list, output_path: str):
             "processed_at": pd.Timestamp.now().isoformat()
         }
     }
+    if llm_tokens is not None:
+        results["summary"]["llm_tokens"] = llm_tokens
+    if llm_scheduler is not None:
+        results["summary"]["llm_scheduler"] = llm_scheduler
+    if trace is not None:
+        results["trace"] = trace
+    if ingest is not None:
+        results["summary"]["ingest"] = ingest
     
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(results, f, indent=2, default=str)
 
 
-def main():
-    df = pd.read_csv("data/input.csv")
+def save_trace_json(tracer, llm, output_path):
+    """
+    Saves the run's stage timings and LLM token counts. Written however
+    the run ends, so the web app's /metrics counts failed runs too.
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"trace": tracer.as_dict(), "llm_tokens": llm.token_stats()}, f, indent=2, default=str)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the cleaning pipeline on data/input.csv")
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="Generate the next rule's code speculatively while the current rule executes"
+    )
+    parser.add_argument(
+        "--keep-checkpoints",
+        type=int,
+        default=None,
+        help="Keep only the last N per-rule checkpoints (default: keep all)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the run saved in checkpoints/ from its first incomplete rule, with that run's rules "
+             "(starts from the first rule if no rule was completed)"
+    )
+    parser.add_argument(
+        "--copy-mode",
+        choices=["cow", "deep"],
+        default="cow",
+        help="How each rule's input frame is protected: copy-on-write (default) or a full deep copy"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Do not load the input into memory; stream row-local rules through a process pool in chunks"
+    )
+    parser.add_argument("--chunksize", type=int, default=100_000, help="Rows per chunk in --stream mode")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes in --stream mode")
+    parser.add_argument(
+        "--stream-profile",
+        action="store_true",
+        help="In --stream mode, build each rule's metadata from a streaming profile of the whole file "
+             "(sketches; estimates are labelled) instead of the first rows"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=".llm_cache",
+        help="LLM response cache directory; the web app points every job at one shared cache"
+    )
+    parser.add_argument(
+        "--rule-pack",
+        default="rule_pack.json",
+        help="Compiled rule pack: approved code per rule and schema is stored here and reused on later runs"
+    )
+    parser.add_argument("--no-rule-pack", action="store_true", help="Generate code for every rule, ignoring the pack")
+    parser.add_argument(
+        "--audit-compiled",
+        action="store_true",
+        help="Also audit rules that ran compiled code from the rule pack"
+    )
+    parser.add_argument(
+        "--fuse",
+        action="store_true",
+        help="Run consecutive compiled rules that touch separate columns in a single pass over the data"
+    )
+    parser.add_argument(
+        "--sandbox-workers",
+        type=int,
+        default=2,
+        help="Worker processes that run generated code with time and memory limits (0 = run it in this process)"
+    )
+    parser.add_argument("--sandbox-timeout", type=float, default=300, help="Seconds one rule's code may run")
+    parser.add_argument("--sandbox-max-rss-mb", type=int, default=None, help="Memory limit of a sandbox worker")
+    parser.add_argument(
+        "--metadata-token-budget",
+        type=int,
+        default=12000,
+        help="Approximate token budget of the metadata in each prompt; wide tables lose detail on "
+             "lower-priority columns to fit (0 = no budget)"
+    )
+    parser.add_argument(
+        "--llm-batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Rules interpreted, and diffs audited, per LLM request (1 = one request each)"
+    )
+    parser.add_argument(
+        "--llm-rpm",
+        type=int,
+        default=60,
+        help="LLM requests per minute this process may send; lowered automatically while the endpoint returns 429s. "
+             "The limit is per process: the web app splits its quota statically among its job slots, so an idle "
+             "slot's share goes unused and a 429 only slows down the process that got it"
+    )
+    parser.add_argument("--llm-tpm", type=int, default=0, help="Estimated LLM tokens per minute (0 = no limit)")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="LLM requests in flight at once")
+    parser.add_argument(
+        "--no-column-index",
+        action="store_true",
+        help="Give every generation prompt the metadata of all columns, not just the ones the rule refers to"
+    )
+    parser.add_argument(
+        "--column-aliases",
+        default=None,
+        help="JSON file of {column: [alias, ...]} used to match rules to columns"
+    )
+    parser.add_argument(
+        "--csv-engine",
+        choices=["pyarrow", "c"],
+        default="pyarrow",
+        help="CSV parser for the input: pyarrow (multi-threaded, falls back to c) or pandas' C parser"
+    )
+    parser.add_argument(
+        "--category-ratio",
+        type=float,
+        default=0,
+        help="Load text columns with at most this many distinct values per row (e.g. 0.5) as categoricals; "
+             "generated code must then add categories before assigning new values (default 0 = never)"
+    )
+    parser.add_argument(
+        "--downcast",
+        action="store_true",
+        help="Load integers as the smallest type that holds them, and floats as float32 where lossless"
+    )
+    parser.add_argument(
+        "--arrow-strings",
+        action="store_true",
+        help="Load the remaining text columns as Arrow-backed strings instead of Python objects"
+    )
+    parser.add_argument(
+        "--usecols",
+        default=None,
+        help="Comma-separated columns to read from the input; the others are left out of the output too"
+    )
+    parser.add_argument(
+        "--events",
+        default="data/events.jsonl",
+        help="Where to append structured progress events as JSON lines (the web app streams them live)"
+    )
+    args = parser.parse_args(argv)
+    if args.resume and args.stream:
+        parser.error("--resume needs the per-rule checkpoints, which --stream mode does not write")
+    return args
+
+
+def print_token_stats(llm):
+    tokens = llm.token_stats()
+    if tokens["calls"]:
+        print(f"INFO: LLM prompts: {tokens['calls']} calls, ~{tokens['prompt_tokens']} prompt tokens "
+              f"(largest ~{tokens['max_prompt_tokens']}), ~{tokens['response_tokens']} response tokens.")
+    if llm.scheduler is not None:
+        metrics = llm.scheduler.metrics()
+        print(f"INFO: LLM scheduler: {metrics['throttled']} rate-limited responses, {metrics['retries']} retries, "
+              f"{metrics['queue_wait_seconds']}s queued in total (longest {metrics['max_queue_wait_seconds']}s), "
+              f"rate at {metrics['rate_fraction']:.0%} of --llm-rpm.")
 
-    # Generate metadata directly from the dataframe
-    metadata = generate_metadata_toon_from_df(df)
 
-    with open("data/rules.toon", "r", encoding="utf-8") as f:
-        rules_toon = f.read()
+def print_stage_timings(tracer):
+    totals = tracer.stage_totals()
+    if totals:
+        print("INFO: Time per stage: " + ", ".join(
+            f"{stage} {entry['seconds']:.2f}s/{entry['count']}" for stage, entry in totals.items()
+        ))
 
-    llm = LLMClient(gemini_call)
 
-    rules = split_rules(llm, rules_toon)
+def make_column_index(args, df):
+    if args.no_column_index:
+        return None
+    aliases = None
+    if args.column_aliases:
+        with open(args.column_aliases, "r", encoding="utf-8") as f:
+            aliases = json.load(f)
+    return ColumnIndex(df, aliases=aliases)
 
-    state = PipelineState(df=df)
 
-    run_pipeline(
-        state=state,
+def make_sandbox(args):
+    if args.sandbox_workers <= 0:
+        return None
+    return SandboxPool(
+        workers=args.sandbox_workers,
+        timeout=args.sandbox_timeout,
+        max_rss_mb=args.sandbox_max_rss_mb
+    )
+
+
+def main_streaming(args, llm, rules, events, sandbox, tracer):
+    state = run_streaming_pipeline(
         rules=rules,
-        metadata_toon=metadata,
-        llm=llm
+        input_path="data/input.csv",
+        output_path="data/cleaned_output.csv",
+        llm=llm,
+        chunksize=args.chunksize,
+        max_workers=args.workers,
+        events=events,
+        sandbox=sandbox,
+        metadata_token_budget=args.metadata_token_budget or None,
+        column_index=make_column_index(args, pd.read_csv("data/input.csv", nrows=10_000)),
+        llm_batch_size=args.llm_batch_size,
+        tracer=tracer,
+        full_profile=args.stream_profile
     )
 
     print_audit_summary(state.history, rules)
+    print_token_stats(llm)
+    print_stage_timings(tracer)
+    save_results_json(state.history, rules, "data/results.json", llm_tokens=llm.token_stats(),
+                      llm_scheduler=llm.scheduler.metrics(), trace=tracer.as_dict())
 
-    state.df.to_csv("data/cleaned_output.csv", index=False)
-    
-    # Save results to JSON for the specific integration with the web app
-    save_results_json(state.history, rules, "data/results.json")
-    
     print("Pipeline complete. Output saved.")
 
 
+def main(argv=None):
+    """
+    Runs the pipeline on data/ under the current directory. argv defaults
+    to the command line; worker.py calls this in-process with a job's
+    arguments.
+    """
+    args = parse_args(argv)
+    # Closed however the run ends, so the events file is never left open in a warm worker
+    # A resumed run continues the events file and its sequence numbers
+    with ProgressEvents(args.events, append=args.resume) as events:
+        events.emit("run_started", pid=os.getpid())
+
+        llm = LLMClient(
+            gemini_call,
+            cache=ResponseCache(args.cache_dir),
+            model=GEMINI_MODEL,
+            temperature=GEMINI_TEMPERATURE,
+            scheduler=get_scheduler(
+                requests_per_minute=args.llm_rpm,
+                tokens_per_minute=args.llm_tpm or None,
+                max_concurrency=args.llm_concurrency
+            )
+        )
+
+        tracer = Tracer()
+        # A trace left by an earlier attempt of this job must not be counted again
+        if os.path.exists(TRACE_PATH):
+            os.remove(TRACE_PATH)
+        try:
+            if args.stream:
+                with open("data/rules.toon", "r", encoding="utf-8") as f:
+                    rules = split_rules(llm, f.read())
+                with make_sandbox(args) or nullcontext() as sandbox:
+                    main_streaming(args, llm, rules, events, sandbox, tracer)
+                events.emit("output_saved", path="data/cleaned_output.csv")
+                return
+
+            checkpoints = CheckpointStore("checkpoints", keep_last=args.keep_checkpoints)
+            resumed = checkpoints.load_run() if args.resume else None
+            if args.resume and resumed is None:
+                print("WARNING: No completed rule to resume from; starting from the first rule.")
+
+            # The profile cache lets the pipeline re-profile only the columns each rule touches
+            profile_cache = ColumnProfileCache()
+
+            if resumed is not None:
+                # The rules are the checkpointed run's, so rule indices line up with its history
+                rules = resumed["rules"]
+                df = resumed["df"]
+                ingest_report = None
+                metadata = resumed["metadata_toon"]
+                state = PipelineState(df=df, rule_index=resumed["next_rule"], history=resumed["history"],
+                                      code=resumed["code"], log_paths=resumed["log_paths"])
+                print(f"INFO: Resuming at rule #{state.rule_index + 1} of {len(rules)} "
+                      f"({len(df)} rows, {len(resumed['pending_audits'])} audits pending).")
+                events.emit("run_resumed", rule_index=state.rule_index, rules=len(rules), rows=len(df),
+                            pending_audits=len(resumed["pending_audits"]))
+            else:
+                df, ingest_report = load_csv(
+                    "data/input.csv",
+                    usecols=[c.strip() for c in args.usecols.split(",") if c.strip()] if args.usecols else None,
+                    engine=args.csv_engine,
+                    category_ratio=args.category_ratio,
+                    downcast=args.downcast,
+                    arrow_strings=args.arrow_strings
+                )
+                print_memory_report(ingest_report)
+                events.emit("input_loaded", rows=ingest_report["rows"], columns=ingest_report["columns"],
+                            file_mb=ingest_report["file_mb"], frame_mb=ingest_report["frame_mb"],
+                            parsed_frame_mb=ingest_report["parsed_frame_mb"], converted=len(ingest_report["conversions"]))
+
+                # Generate metadata directly from the dataframe
+                metadata = generate_metadata_toon_from_df(df, profile_cache=profile_cache,
+                                                          token_budget=args.metadata_token_budget or None)
+
+                with open("data/rules.toon", "r", encoding="utf-8") as f:
+                    rules_toon = f.read()
+
+                rules = split_rules(llm, rules_toon)
+
+                state = PipelineState(df=df)
+
+            with make_sandbox(args) or nullcontext() as sandbox:
+                run_pipeline(
+                    state=state,
+                    rules=rules,
+                    metadata_toon=metadata,
+                    llm=llm,
+                    pipelined=args.pipelined,
+                    profile_cache=profile_cache,
+                    checkpoints=checkpoints,
+                    copy_mode=args.copy_mode,
+                    events=events,
+                    rule_pack=None if args.no_rule_pack else RulePack(args.rule_pack),
+                    audit_compiled=args.audit_compiled,
+                    sandbox=sandbox,
+                    metadata_token_budget=args.metadata_token_budget or None,
+                    column_index=make_column_index(args, df),
+                    llm_batch_size=args.llm_batch_size,
+                    fuse=args.fuse,
+                    tracer=tracer,
+                    pending_audits=resumed["pending_audits"] if resumed is not None else None
+                )
+                if sandbox is not None:
+                    print(f"INFO: Sandbox stats: {sandbox.stats}")
+
+            print_audit_summary(state.history, rules)
+
+            stats = llm.cache_stats()
+            print(f"INFO: LLM cache hits: {stats['hits']}, misses: {stats['misses']}, evictions: {stats['evictions']}")
+            print_token_stats(llm)
+            print_stage_timings(tracer)
+
+            state.df.to_csv("data/cleaned_output.csv", index=False)
+
+            # Save results to JSON for the specific integration with the web app
+            save_results_json(state.history, rules, "data/results.json", llm_tokens=llm.token_stats(),
+                              llm_scheduler=llm.scheduler.metrics(), trace=tracer.as_dict(), ingest=ingest_report)
+            events.emit("output_saved", path="data/cleaned_output.csv")
+
+            print("Pipeline complete. Output saved.")
+        finally:
+            save_trace_json(tracer, llm, TRACE_PATH)
+
+
 if __name__ == "__main__":
     main()
@@ -1,9 +1,12 @@
 import datetime
+import warnings
 import pandas as pd
 import numpy as np
 
+COPY_MODES = ("cow", "deep", "none")
 
-def execute(code, df):
+
+def _run(code, df):
     env = {
         'pd': pd,
         'np': np,
@@ -24,3 +27,39 @@ def execute(code, df):
         return df_out, issues
 
     return result, []
+
+
+def execute(code, df, copy_mode="none"):
+    """
+    Runs the generated apply_rule(df).
+
+    copy_mode decides how the caller's frame is protected from the code:
+      "none" - pass df as is (the caller owns a throwaway frame)
+      "deep" - pass df.copy(), a full copy of every column
+      "cow"  - pass a lazy copy under pandas Copy-on-Write, so only the
+               columns apply_rule actually modifies get copied. Chained
+               assignment (df['a'][mask] = ...) silently does nothing under
+               CoW; if pandas warns about it we rerun with a deep copy.
+    """
+    if copy_mode == "none":
+        return _run(code, df)
+    if copy_mode == "deep":
+        return _run(code, df.copy())
+    if copy_mode != "cow":
+        raise ValueError(f"Unknown copy_mode: {copy_mode}")
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", pd.errors.ChainedAssignmentError)
+        with pd.option_context("mode.copy_on_write", True):
+            result = _run(code, df.copy(deep=False))
+
+    chained = [w for w in caught if issubclass(w.category, pd.errors.ChainedAssignmentError)]
+    for w in caught:
+        if w not in chained:
+            warnings.showwarning(w.message, w.category, w.filename, w.lineno)
+
+    if chained:
+        print("WARNING: Generated code relies on chained assignment; re-running with a deep copy.")
+        return _run(code, df.copy())
+
+    return result
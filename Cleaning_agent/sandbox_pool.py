@@ -0,0 +1,387 @@
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:  # optional: without it there is no RSS limit, only the time limit
+    psutil = None
+
+from sandbox import execute
+
+# How often the parent checks a running call's RSS and deadline
+WATCH_INTERVAL = 0.05
+
+
+class SandboxError(RuntimeError):
+    """
+    Generated code was stopped by the sandbox rather than failing by itself.
+    Retryable: the next attempt regenerates the code with this message.
+    """
+
+
+class SandboxTimeout(SandboxError):
+    pass
+
+
+class SandboxMemoryExceeded(SandboxError):
+    pass
+
+
+class SandboxCrashed(SandboxError):
+    pass
+
+
+# ---------------- frames over shared memory ----------------
+
+def frame_to_shared_memory(df):
+    """
+    Writes df as an Arrow IPC stream straight into a new shared memory
+    segment. Returns (segment, size). Raises pyarrow's ArrowInvalid /
+    ArrowTypeError (or TypeError) for frames Arrow cannot represent, such
+    as object columns mixing Python types.
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=True)
+
+    # Size the segment exactly, then write without an intermediate buffer
+    mock = pa.MockOutputStream()
+    with pa.ipc.new_stream(mock, table.schema) as writer:
+        writer.write_table(table)
+    size = mock.size()
+
+    shm = SharedMemory(create=True, size=max(size, 1))
+    target = pa.py_buffer(shm.buf)
+    sink = pa.FixedSizeBufferWriter(target)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    # Arrow objects hold exports of shm.buf; the segment can't be closed until they are gone
+    del writer, sink, target
+    return shm, size
+
+
+def _segment_path(name):
+    # Where POSIX shared memory segments are files (Linux)
+    return os.path.join("/dev/shm", name.lstrip("/"))
+
+
+def _read_stream(source):
+    import pyarrow as pa
+
+    with pa.ipc.open_stream(source) as reader:
+        table = reader.read_all()
+    # Object columns of Python ints with None come back as ints and None,
+    # not float64 (see _restore_objects)
+    return table.to_pandas(integer_object_nulls=True)
+
+
+def frame_from_shared_memory(name, size, unlink):
+    """
+    Reads a frame written by frame_to_shared_memory; unlink=True also
+    frees the segment.
+
+    Where segments are files (/dev/shm), Arrow maps the segment itself and
+    nothing is copied out of it: to_pandas copies the columns into new
+    blocks, and the index may keep pointing into the mapping, which Arrow
+    keeps alive for as long as that index lives (unlinking only removes
+    the segment's name). Elsewhere the payload is copied out first.
+
+    Both sides of the pipe share one multiprocessing resource tracker, so a
+    segment is tracked once no matter who opens it, and is cleaned up at
+    exit even if a worker is killed before the reader unlinks it.
+    """
+    import pyarrow as pa
+
+    path = _segment_path(name)
+    if os.path.exists(path):
+        with pa.memory_map(path) as source:
+            df = _read_stream(source)
+        if unlink:
+            shm = SharedMemory(name=name)
+            shm.close()
+            shm.unlink()
+        return df
+
+    shm = SharedMemory(name=name)
+    try:
+        # One memcpy out of the segment: a read straight from shm.buf would
+        # leave the index pointing into it, and shm.buf could not be closed
+        payload = pa.py_buffer(bytes(shm.buf[:size]))
+        shm.close()
+    finally:
+        if unlink:
+            shm.unlink()
+    return _read_stream(payload)
+
+
+# Null values of object columns; Arrow stores every null alike
+_NULL_KINDS = {float: "nan", np.float64: "nan", type(pd.NA): "na", type(pd.NaT): "nat"}
+_NULL_VALUES = {"none": None, "nan": np.nan, "na": pd.NA, "nat": pd.NaT}
+
+
+def _object_columns(df):
+    """
+    {column position: kind of null ("none" | "nan" | "na" | "nat") or
+    None} for df's object columns. Arrow reads an object column of ints
+    or floats back as int64 / float64 and its nulls as None (or NaN),
+    where generated code would have seen the object column as it was
+    (NaN is what the C parser and ingest.load_csv give for missing
+    text), so the reader restores both. Raises ValueError for a column
+    mixing kinds of null; that frame is sent pickled instead.
+    """
+    objects = {}
+    for position in range(df.shape[1]):
+        column = df.iloc[:, position]
+        if column.dtype != object:
+            continue
+        values = column.to_numpy()
+        kinds = {_NULL_KINDS.get(type(value), "none") for value in values[pd.isna(values)]}
+        if len(kinds) > 1:
+            raise ValueError(f"column {df.columns[position]!r} mixes {sorted(kinds)} nulls")
+        objects[position] = kinds.pop() if kinds else None
+    return objects
+
+
+def _restore_objects(df, objects):
+    for position, kind in objects.items():
+        column = df.iloc[:, position]
+        # Text with None came back as it went
+        if column.dtype == object and kind in (None, "none"):
+            continue
+        values = column.to_numpy(dtype=object, copy=True)
+        if kind is not None:
+            values[pd.isna(values)] = _NULL_VALUES[kind]
+        df.isetitem(position, values)
+    return df
+
+
+def _send_frame(df):
+    """
+    Frame descriptor for the pipe: Arrow in shared memory when possible,
+    a pickled frame otherwise.
+    """
+    try:
+        objects = _object_columns(df)
+        shm, size = frame_to_shared_memory(df)
+    except (TypeError, ValueError, NotImplementedError, ImportError) as e:
+        # pyarrow's ArrowInvalid / ArrowTypeError / ArrowNotImplementedError
+        # subclass ValueError / TypeError / NotImplementedError
+        return {"format": "pickle", "df": df, "reason": str(e)}, None
+    return {"format": "arrow", "name": shm.name, "size": size, "objects": objects}, shm
+
+
+def _receive_frame(frame, unlink):
+    if frame["format"] == "pickle":
+        return frame["df"]
+    df = frame_from_shared_memory(frame["name"], frame["size"], unlink=unlink)
+    return _restore_objects(df, frame["objects"])
+
+
+# ---------------- worker process ----------------
+
+def _worker_main(conn):
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        try:
+            df = _receive_frame(request["frame"], unlink=False)
+            # The columns are this process's own copy (only the read-only
+            # index may point into the segment), so no protective copy is needed
+            df_out, issues = execute(request["code"], df)
+            del df
+            frame, shm = _send_frame(df_out)
+            if shm is not None:
+                # The parent unlinks it after reading
+                shm.close()
+            conn.send({"frame": frame, "issues": list(issues)})
+        except Exception as e:
+            reply = {"error": e, "traceback": traceback.format_exc()}
+            try:
+                conn.send(reply)
+            except Exception:
+                # The exception itself could not be pickled
+                conn.send({"error": RuntimeError(f"{type(e).__name__}: {e}"), "traceback": reply["traceback"]})
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.calls = 0
+        self._ps = psutil.Process(self.process.pid) if psutil is not None else None
+
+    def rss(self):
+        if self._ps is None:
+            return None
+        try:
+            return self._ps.memory_info().rss
+        except psutil.Error:
+            return None
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Runs generated apply_rule code in a pool of pre-started worker
+    processes instead of in the pipeline's own process.
+
+    Each call gets a wall-clock limit (timeout seconds) and, with psutil,
+    a resident memory limit (max_rss_mb) on the worker. A worker that hits
+    either is killed and replaced, and the call raises SandboxTimeout or
+    SandboxMemoryExceeded; both are SandboxError, which the orchestrator
+    retries like any other failed attempt.
+
+    Frames go to and from the workers as Arrow IPC streams in shared
+    memory; only frames Arrow cannot represent fall back to pickling.
+
+        pool = SandboxPool(workers=2, timeout=120, max_rss_mb=4096)
+        df_after, issues = pool.execute(code, df)
+        pool.last_call   # transfer format, seconds, worker peak RSS
+        pool.close()
+    """
+
+    def __init__(self, workers=2, timeout=300, max_rss_mb=None, max_calls_per_worker=100, start_method=None):
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        self._context = mp.get_context(start_method)
+        if start_method == "forkserver":
+            # Workers fork from a server that has pandas and pyarrow loaded already
+            self._context.set_forkserver_preload(["sandbox_pool", "pyarrow"])
+
+        self.timeout = timeout
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024 if max_rss_mb else None
+        self.max_calls_per_worker = max_calls_per_worker
+        self.last_call = {}
+        self.stats = {"calls": 0, "timeouts": 0, "memory_kills": 0, "crashes": 0, "pickled_frames": 0}
+
+        if self.max_rss_bytes and psutil is None:
+            print("WARNING: psutil is not installed; the sandbox memory limit is not enforced.")
+
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        for _ in range(workers):
+            self._idle.put(_Worker(self._context))
+
+    def execute(self, code, df):
+        """
+        Same contract as sandbox.execute: returns (df_after, issues) and
+        re-raises the code's own exceptions.
+        """
+        worker = self._idle.get()
+        try:
+            if worker.calls >= self.max_calls_per_worker or not worker.process.is_alive():
+                worker.stop()
+                worker = _Worker(self._context)
+            return self._call(worker, code, df)
+        except SandboxError:
+            worker.kill()
+            worker = _Worker(self._context)
+            raise
+        finally:
+            self._idle.put(worker)
+
+    def _call(self, worker, code, df):
+        start = time.perf_counter()
+        frame, shm = _send_frame(df)
+        if frame["format"] == "pickle":
+            self._count("pickled_frames")
+        peak_rss = worker.rss()
+
+        try:
+            worker.conn.send({"code": code, "frame": frame})
+            deadline = start + self.timeout if self.timeout else None
+
+            while not worker.conn.poll(WATCH_INTERVAL):
+                rss = worker.rss()
+                if rss is not None:
+                    peak_rss = max(peak_rss or 0, rss)
+                if self.max_rss_bytes and rss is not None and rss > self.max_rss_bytes:
+                    self._count("memory_kills")
+                    raise SandboxMemoryExceeded(
+                        f"Generated code used more than {self.max_rss_bytes // (1024 * 1024)} MB of memory "
+                        f"and was stopped. Use vectorised operations that do not copy the whole frame."
+                    )
+                if deadline is not None and time.perf_counter() > deadline:
+                    self._count("timeouts")
+                    raise SandboxTimeout(
+                        f"Generated code did not finish within {self.timeout}s and was stopped. "
+                        f"Avoid row-by-row apply(axis=1) and Python loops; use vectorised pandas operations."
+                    )
+                if not worker.process.is_alive():
+                    break
+
+            try:
+                reply = worker.conn.recv()
+            except (EOFError, OSError):
+                self._count("crashes")
+                # exitcode stays None until the process has been reaped
+                worker.process.join(1)
+                raise SandboxCrashed(f"Sandbox worker exited with code {worker.process.exitcode} while running the code.")
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+        worker.calls += 1
+        self._count("calls")
+        if "error" in reply:
+            raise reply["error"]
+
+        df_after = _receive_frame(reply["frame"], unlink=True)
+        if reply["frame"]["format"] == "pickle":
+            self._count("pickled_frames")
+
+        self.last_call = {
+            "transfer": "arrow" if frame["format"] == reply["frame"]["format"] == "arrow" else "pickle",
+            "sandbox_seconds": round(time.perf_counter() - start, 4),
+            "worker_peak_rss_mb": round(peak_rss / (1024 * 1024), 2) if peak_rss else None,
+        }
+        return df_after, reply["issues"]
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def close(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
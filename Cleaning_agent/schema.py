@@ -0,0 +1,12 @@
+import hashlib
+import json
+
+
+def schema_fingerprint(df) -> str:
+    """
+    Hash of the frame's column names and dtypes, in order.
+    Two frames with the same fingerprint produce the same schema section
+    in generation prompts, so code written for one fits the other.
+    """
+    items = [[str(col), str(dtype)] for col, dtype in df.dtypes.items()]
+    return hashlib.sha256(json.dumps(items).encode("utf-8")).hexdigest()
@@ -0,0 +1,330 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+
+def _is_number(series):
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def hash_values(values: pd.Series):
+    """
+    64-bit hashes of values (without nulls). Numbers are hashed as float64,
+    so 5 in an int chunk and 5.0 in a float chunk hash alike.
+    """
+    if _is_number(values):
+        values = values.astype("float64")
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+class HyperLogLog:
+    """
+    Distinct-value estimate from 2**precision one-byte registers; the
+    standard error is about 1.04 / sqrt(2**precision) (0.8% at 14).
+    Merging two sketches gives the sketch of the union.
+    """
+
+    def __init__(self, precision=14):
+        # Above 53 bits the rank below would lose precision in float64
+        if not 11 <= precision <= 18:
+            raise ValueError("precision must be between 11 and 18")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        if not len(hashes):
+            return
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        rest_bits = 64 - self.precision
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        # Position of the first 1 bit in the remaining bits; they fit in a
+        # float64 mantissa, so frexp's exponent is their exact bit length
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = (rest_bits + 1 - bit_length).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Small cardinalities: linear counting is more accurate
+            return m * math.log(m / zeros)
+        return raw
+
+
+class QuantileSketch:
+    """
+    Mergeable quantiles with relative accuracy (DDSketch-style): values go
+    into logarithmic buckets, so any quantile is returned within
+    relative_accuracy of a value of the right rank. Size grows with the
+    log of the value range, not with the count.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = pd.Series(dtype=np.int64)
+        self.negative = pd.Series(dtype=np.int64)
+        self.zeros = 0
+        self.count = 0
+
+    def _buckets(self, values):
+        index = np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+        buckets, counts = np.unique(index, return_counts=True)
+        return pd.Series(counts, index=buckets)
+
+    def add(self, values):
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.zeros += int(np.count_nonzero(values == 0))
+        if np.any(values > 0):
+            self.positive = self.positive.add(self._buckets(values[values > 0]), fill_value=0).astype(np.int64)
+        if np.any(values < 0):
+            self.negative = self.negative.add(self._buckets(-values[values < 0]), fill_value=0).astype(np.int64)
+
+    def merge(self, other):
+        self.count += other.count
+        self.zeros += other.zeros
+        self.positive = self.positive.add(other.positive, fill_value=0).astype(np.int64)
+        self.negative = self.negative.add(other.negative, fill_value=0).astype(np.int64)
+
+    def _value(self, bucket):
+        return 2 * self.gamma ** bucket / (self.gamma + 1)
+
+    def quantile(self, q):
+        if not self.count:
+            return float("nan")
+        rank = q * (self.count - 1)
+        seen = 0
+        # Most negative first: the largest negative bucket holds the smallest values
+        for bucket, count in self.negative.sort_index(ascending=False).items():
+            seen += count
+            if seen > rank:
+                return -self._value(bucket)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for bucket, count in self.positive.sort_index().items():
+            seen += count
+            if seen > rank:
+                return self._value(bucket)
+        return self._value(self.positive.index.max())
+
+
+class ColumnSketch:
+    """
+    Everything profile_column reports about one column, built chunk by
+    chunk and mergeable across processes.
+
+    Counts, nulls, mean, std, min and max are exact. Distinct counts are
+    exact while the column has at most max_exact distinct values (a set
+    of hashes for numbers, the value counts for text), then come from a
+    HyperLogLog. Percentiles are exact while the column has at most
+    max_exact values, then come from a QuantileSketch. Value counts for
+    top/freq are exact while there are at most max_exact distinct values,
+    then only the max_exact most frequent are kept (their counts become
+    lower bounds).
+    """
+
+    def __init__(self, max_exact=10_000, precision=14, relative_accuracy=0.01):
+        self.max_exact = max_exact
+        self.dtypes = set()
+        self.count = 0
+        self.nulls = 0
+        self.hll = HyperLogLog(precision)
+        self.hashes = np.empty(0, dtype=np.uint64)
+        # Numeric columns: Chan et al. running moments
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.values = np.empty(0, dtype=np.float64)
+        self.quantiles = QuantileSketch(relative_accuracy)
+        # Text and boolean columns
+        self.value_counts = pd.Series(dtype=np.int64)
+        self.counts_exact = True
+
+    def update(self, series: pd.Series):
+        self.dtypes.add(str(series.dtype))
+        missing = series.isna()
+        present = series[~missing] if missing.any() else series
+        self.nulls += len(series) - len(present)
+        self.count += len(present)
+
+        hashes = hash_values(present)
+        self.hll.add_hashes(hashes)
+
+        if _is_number(series):
+            if self.hashes is not None:
+                self._merge_hashes(pd.unique(hashes))
+            values = present.to_numpy(dtype=np.float64)
+            if len(values):
+                mean = values.mean()
+                self._merge_moments(len(values), mean, float(((values - mean) ** 2).sum()),
+                                    values.min(), values.max())
+            self.quantiles.add(values)
+            if self.values is not None:
+                self._merge_values(values)
+        else:
+            self._merge_counts(present.value_counts(sort=False))
+
+    def merge(self, other):
+        self.dtypes |= other.dtypes
+        self.count += other.count
+        self.nulls += other.nulls
+        self.hll.merge(other.hll)
+        if other.hashes is None:
+            self.hashes = None
+        elif self.hashes is not None:
+            self._merge_hashes(other.hashes)
+        self._merge_moments(other.n, other.mean, other.m2, other.min, other.max)
+        self.quantiles.merge(other.quantiles)
+        if other.values is None:
+            self.values = None
+        elif self.values is not None:
+            self._merge_values(other.values)
+        self.counts_exact &= other.counts_exact
+        self._merge_counts(other.value_counts)
+
+    def _merge_hashes(self, hashes):
+        merged = np.union1d(self.hashes, hashes)
+        self.hashes = merged if len(merged) <= self.max_exact else None
+
+    def _merge_values(self, values):
+        self.values = np.concatenate([self.values, values]) if len(self.values) + len(values) <= self.max_exact else None
+
+    def _merge_moments(self, n, mean, m2, lo, hi):
+        if not n:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.mean += delta * n / total
+        self.n = total
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    def _merge_counts(self, counts):
+        if not len(counts):
+            return
+        if len(self.value_counts):
+            # Not Series.add: that sorts the values, and ties for top go to the first seen
+            counts = pd.concat([self.value_counts, counts]).groupby(level=0, sort=False).sum()
+        self.value_counts = counts
+        if len(self.value_counts) > self.max_exact:
+            self.value_counts = self.value_counts.nlargest(self.max_exact)
+            self.counts_exact = False
+
+    def data_type(self):
+        """
+        The dtype pandas would give the whole column: chunks of int and
+        float make float64, any chunk of text makes object.
+        """
+        if len(self.dtypes) == 1:
+            return next(iter(self.dtypes))
+        if all(d.startswith(("int", "uint", "float")) for d in self.dtypes):
+            return "float64"
+        return "object"
+
+    def profile(self, total_rows):
+        """
+        (profile, approximate) where profile has profile_column's keys and
+        approximate lists the metrics that are estimates, as
+        "Unique_Values_Count" or "Descriptive_Stats.<stat>".
+        """
+        approximate = []
+        data_type = self.data_type()
+        numeric = data_type.startswith(("int", "uint", "float"))
+        # Text and numbers mixed across chunks: distinct values of each kind don't line up
+        mixed = data_type == "object" and self.n > 0
+
+        if numeric and self.hashes is not None:
+            unique = len(self.hashes)
+        elif not numeric and self.counts_exact and not mixed:
+            unique = len(self.value_counts)
+        else:
+            unique = int(round(self.hll.estimate()))
+            approximate.append("Unique_Values_Count")
+
+        if numeric:
+            nan = float("nan")
+            stats = {
+                "count": float(self.n),
+                "mean": float(self.mean) if self.n else nan,
+                "std": math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else nan,
+                "min": float(self.min) if self.n else nan,
+            }
+            if self.values is not None:
+                percentiles = np.percentile(self.values, [25, 50, 75]) if self.n else [nan] * 3
+            else:
+                percentiles = [self.quantiles.quantile(q) for q in (0.25, 0.5, 0.75)]
+                approximate += ["Descriptive_Stats.25%", "Descriptive_Stats.50%", "Descriptive_Stats.75%"]
+            stats.update({"25%": float(percentiles[0]), "50%": float(percentiles[1]),
+                          "75%": float(percentiles[2]), "max": float(self.max) if self.n else nan})
+        else:
+            counts = self.value_counts.sort_values(ascending=False, kind="stable")
+            stats = {
+                "count": float(self.count),
+                "unique": float(unique),
+                "top": counts.index[0] if len(counts) else None,
+                "freq": float(counts.iloc[0]) if len(counts) else None,
+            }
+            if "Unique_Values_Count" in approximate:
+                approximate.append("Descriptive_Stats.unique")
+            if not self.counts_exact or mixed:
+                approximate += ["Descriptive_Stats.top", "Descriptive_Stats.freq"]
+
+        null_percentage = (self.nulls / total_rows) * 100 if total_rows > 0 else 0
+        profile = {
+            "Data_Type": data_type,
+            "Non_Null_Count": int(self.count),
+            "Null_Count": int(self.nulls),
+            "Null_Percentage": round(float(null_percentage), 2),
+            "Unique_Values_Count": int(unique),
+            "Descriptive_Stats": stats,
+        }
+        return profile, approximate
+
+
+class RowReservoir:
+    """
+    A uniform random sample of up to size rows of a stream of chunks.
+    Reservoirs of disjoint parts merge into a uniform sample of the whole.
+    """
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.seen = 0
+        self.rows = None
+
+    def update(self, chunk: pd.DataFrame):
+        other = RowReservoir(self.size, self.rng)
+        other.seen = len(chunk)
+        take = min(self.size, len(chunk))
+        other.rows = chunk.iloc[np.sort(self.rng.choice(len(chunk), size=take, replace=False))]
+        self.merge(other)
+
+    def merge(self, other):
+        if other.rows is None:
+            return
+        if self.rows is None:
+            self.seen, self.rows = other.seen, other.rows
+            return
+        total = self.seen + other.seen
+        size = min(self.size, total)
+        # How many of the merged sample come from each side
+        from_self = int(self.rng.hypergeometric(self.seen, other.seen, size)) if size else 0
+        keep = self.rows.iloc[np.sort(self.rng.choice(len(self.rows), size=from_self, replace=False))]
+        add = other.rows.iloc[np.sort(self.rng.choice(len(other.rows), size=size - from_self, replace=False))]
+        self.rows = pd.concat([keep, add]).sort_index()
+        self.seen = total
@@ -8,8 +8,12 @@ class PipelineState:
     df: pd.DataFrame
     rule_index: int = 0
     history: list = field(default_factory=list)
+    # Code each executed rule ran, by rule index
+    code: dict = field(default_factory=dict, repr=False)
+    log_paths: dict = field(default_factory=dict, repr=False)
 
-    def snapshot(self, note: str, diff: dict = None, audit: dict = None):
+    def snapshot(self, note: str, diff: dict = None, audit: dict = None, execution: dict = None,
+                 timings: dict = None):
         entry = {
             "rule_index": self.rule_index,
             "rows": len(self.df),
@@ -25,12 +29,19 @@ class PipelineState:
         if audit:
             entry["audit"] = audit
 
+        if execution:
+            entry["execution"] = execution
+
+        if timings:
+            entry["timings"] = timings
+
         self.history.append(entry)
 
         #  NEW: Save this snapshot as a log file
         os.makedirs("logs", exist_ok=True)
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         log_path = f"logs/rule_{self.rule_index+1}_{ts}.txt"
+        self.log_paths[self.rule_index] = log_path
 
         with open(log_path, "w", encoding="utf-8") as f:
             f.write(f"Rule Index: {self.rule_index+1}\n")
@@ -46,3 +57,32 @@ class PipelineState:
                 f.write("\nAudit:\n")
                 for k, v in audit.items():
                     f.write(f"  {k}: {v}\n")
+
+            if execution:
+                f.write("\nExecution:\n")
+                for k, v in execution.items():
+                    f.write(f"  {k}: {v}\n")
+
+            if timings:
+                f.write("\nTimings (seconds):\n")
+                for k, v in timings.items():
+                    f.write(f"  {k}: {v}\n")
+
+    def record_audit(self, rule_index: int, note: str, audit: dict):
+        """
+        Fills in the audit of a rule whose snapshot was taken before its
+        (batched) audit came back.
+        """
+        for entry in reversed(self.history):
+            if entry["rule_index"] == rule_index:
+                entry["note"] = note
+                entry["audit"] = audit
+                break
+
+        log_path = self.log_paths.get(rule_index)
+        if log_path and os.path.exists(log_path):
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(f"\nNote (after audit): {note}\n")
+                f.write("\nAudit:\n")
+                for k, v in audit.items():
+                    f.write(f"  {k}: {v}\n")
@@ -0,0 +1,137 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from csv_read_toon import _metadata_toon
+from sketches import ColumnSketch, RowReservoir
+
+SAMPLE_ROWS = 3
+
+PROFILE_NOTE = (
+    "Profiled by streaming the file in chunks. Metrics a column lists under Approximate are estimates: "
+    "distinct counts within about 1%, percentiles within 1% of a value of that rank, top/freq from the "
+    "most frequent values only. All other metrics are exact. Sample rows are a uniform random sample."
+)
+
+
+class ChunkProfile:
+    """
+    Sketches of one or more chunks of a CSV: a ColumnSketch per column and
+    a reservoir of sample rows. Profiles of disjoint chunks merge into the
+    profile of their union.
+    """
+
+    def __init__(self, columns, sample_rows=SAMPLE_ROWS, seed=0, max_exact=10_000):
+        self.columns = list(columns)
+        self.rows = 0
+        self.sketches = {col: ColumnSketch(max_exact=max_exact) for col in self.columns}
+        self.sample = RowReservoir(sample_rows, np.random.default_rng(seed))
+
+    def update(self, chunk: pd.DataFrame):
+        self.rows += len(chunk)
+        for col in self.columns:
+            self.sketches[col].update(chunk[col])
+        self.sample.update(chunk)
+
+    def merge(self, other):
+        self.rows += other.rows
+        for col in self.columns:
+            self.sketches[col].merge(other.sketches[col])
+        self.sample.merge(other.sample)
+
+    def profiles(self):
+        """
+        {column: Column_Details entry}, with an Approximate list on the
+        columns that have estimated metrics.
+        """
+        result = {}
+        for col in self.columns:
+            profile, approximate = self.sketches[col].profile(self.rows)
+            if approximate:
+                profile["Approximate"] = approximate
+            result[col] = profile
+        return result
+
+
+def _profile_chunk(chunk, chunk_number, sample_rows, seed, max_exact):
+    # Runs in a worker process; must stay a module-level function to be picklable
+    profile = ChunkProfile(chunk.columns, sample_rows=sample_rows, seed=(seed, chunk_number), max_exact=max_exact)
+    profile.update(chunk)
+    return profile
+
+
+def profile_csv(path, chunksize=100_000, max_workers=None, sample_rows=SAMPLE_ROWS, seed=0, max_exact=10_000,
+                usecols=None):
+    """
+    Profiles a CSV of any size with bounded memory: chunks are read one at
+    a time, sketched on a process pool (like chunked.execute_chunked) and
+    the sketches merged in file order, so the result does not depend on
+    max_workers. max_workers=1 sketches in this process.
+
+    Returns the merged ChunkProfile; its rows, profiles() and sample.rows
+    give Total_Rows, Column_Details and the sample rows.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    merged = None
+    pending = deque()
+
+    def add(profile):
+        nonlocal merged
+        if merged is None:
+            merged = ChunkProfile(profile.columns, sample_rows=sample_rows, seed=seed, max_exact=max_exact)
+        merged.merge(profile)
+
+    reader = pd.read_csv(path, chunksize=chunksize, low_memory=False, usecols=usecols)
+    if max_workers == 1:
+        for chunk_number, chunk in enumerate(reader):
+            add(_profile_chunk(chunk, chunk_number, sample_rows, seed, max_exact))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for chunk_number, chunk in enumerate(reader):
+                pending.append(pool.submit(_profile_chunk, chunk, chunk_number, sample_rows, seed, max_exact))
+                while len(pending) >= max_workers * 2:
+                    add(pending.popleft().result())
+            while pending:
+                add(pending.popleft().result())
+
+    if merged is None:
+        # Header only
+        merged = ChunkProfile(pd.read_csv(path, nrows=0, usecols=usecols).columns, sample_rows=sample_rows,
+                              seed=seed, max_exact=max_exact)
+    print(f"INFO: Streamed profile of {path}: {merged.rows} rows x {len(merged.columns)} columns "
+          f"in {time.perf_counter() - start:.2f}s.")
+    return merged
+
+
+def generate_metadata_toon_from_profile(profile: ChunkProfile, file_name: str = "dataframe",
+                                        token_budget: int = None, priority_columns: list = None,
+                                        focus_columns: list = None) -> str:
+    """
+    Like csv_read_toon.generate_metadata_toon_from_df, for a profile_csv
+    result: the same Column_Details, plus a Profile_Note and an
+    Approximate list per column naming its estimated metrics. The sample
+    rows are Sample_Rows_Random_<n>, a uniform sample, instead of the
+    first three.
+    """
+    sample = profile.sample.rows
+    if sample is None:
+        sample = pd.DataFrame(columns=profile.columns)
+    return _metadata_toon(sample, file_name, profile.profiles(), token_budget, priority_columns, focus_columns,
+                          total_rows=profile.rows, sample_key=f"Sample_Rows_Random_{profile.sample.size}",
+                          profile_note=PROFILE_NOTE)
+
+
+def generate_metadata_toon_from_csv(path, file_name: str = None, chunksize=100_000, max_workers=None,
+                                    token_budget: int = None, priority_columns: list = None,
+                                    focus_columns: list = None) -> str:
+    """
+    Streams path through profile_csv and returns its metadata TOON.
+    """
+    profile = profile_csv(path, chunksize=chunksize, max_workers=max_workers)
+    return generate_metadata_toon_from_profile(profile, file_name or os.path.basename(path), token_budget,
+                                               priority_columns, focus_columns)
@@ -0,0 +1,24 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# The pipeline modules are imported flat, as run.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+
+@pytest.fixture
+def bench(tmp_path, monkeypatch):
+    """
+    benchmarks/bench_pipeline.py: its dataset, rules and replay fixture
+    drive the pipeline offline. The pipeline writes logs/ and checkpoints/
+    into the cwd, so the test runs in tmp_path.
+    """
+    spec = importlib.util.spec_from_file_location("bench_pipeline", os.path.join(BENCHMARKS, "bench_pipeline.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.chdir(tmp_path)
+    return module
@@ -0,0 +1,150 @@
+import inspect
+import json
+
+import orchestrator
+import run
+from llms.auditor import audit_many
+from llms.base import LLMClient
+from llms.batch import DEFAULT_BATCH_SIZE, ask_json_batch, split_batch_prompt
+from llms.interpreter import interpret_rules
+from llms.replay import RecordingCall, ReplayCall
+
+RULES = [
+    "Trim whitespace from all string columns.",
+    "All monetary values are in USD.",
+    "Drop cancelled orders.",
+]
+
+
+def answer_single(prompt):
+    informational = "USD" in prompt
+    return "```json\n" + json.dumps({
+        "requires_execution": not informational,
+        "reason": "Informational." if informational else "Transforms data.",
+    }) + "\n```"
+
+
+def test_batch_size_defaults_agree():
+    def default(fn, name):
+        return inspect.signature(fn).parameters[name].default
+
+    assert default(interpret_rules, "batch_size") == DEFAULT_BATCH_SIZE
+    assert default(audit_many, "batch_size") == DEFAULT_BATCH_SIZE
+    assert default(ask_json_batch, "max_batch") == DEFAULT_BATCH_SIZE
+    assert default(orchestrator.run_pipeline, "llm_batch_size") == DEFAULT_BATCH_SIZE
+    assert default(orchestrator.run_streaming_pipeline, "llm_batch_size") == DEFAULT_BATCH_SIZE
+    assert run.parse_args([]).llm_batch_size == DEFAULT_BATCH_SIZE
+
+
+def test_split_batch_prompt():
+    calls = []
+
+    class FakeLLM:
+        def ask_json(self, prompt, priority="default"):
+            calls.append(prompt)
+            return {"results": [{"id": 1, "approve": True, "summary": "ok"},
+                                {"id": 2, "approve": True, "summary": "ok"}]}
+
+    ask_json_batch(FakeLLM(), "Audit these.", ["RULE:\nA\n\nDIFF:\nx", "RULE:\nB\n\nDIFF:\ny"],
+                   '"approve": true/false, "summary": "string"', validate=lambda r: None, single=None)
+
+    assert split_batch_prompt(calls[0]) == (["RULE:\nA\n\nDIFF:\nx", "RULE:\nB\n\nDIFF:\ny"], ["approve", "summary"])
+    assert split_batch_prompt("RULE:\nA") is None
+
+
+def test_replay_answers_batched_prompt_from_single_recordings(tmp_path):
+    path = str(tmp_path / "replay.jsonl")
+    expected = interpret_rules(LLMClient(RecordingCall(answer_single, path)), RULES, batch_size=1)
+
+    replay = ReplayCall(path)
+    intents = interpret_rules(LLMClient(replay), RULES, batch_size=DEFAULT_BATCH_SIZE)
+
+    assert intents == expected
+    assert [intent["requires_execution"] for intent in intents] == [True, False, True]
+    assert replay.stats() == {"calls": 1, "exact_hits": 0, "fallback_hits": 1}
+
+
+class ScriptedLLM:
+    """
+    Answers batched prompts for the items in `known` only; single(index)
+    is answered by the test.
+    """
+
+    def __init__(self, known=None, broken=False):
+        self.known = known
+        self.broken = broken
+        self.batch_sizes = []
+
+    def ask_json(self, prompt, priority="default"):
+        items, _ = split_batch_prompt(prompt)
+        self.batch_sizes.append(len(items))
+        if self.broken:
+            raise ValueError("LLM did not return valid JSON.")
+        return {"results": [{"id": number, "approve": True, "summary": item}
+                            for number, item in enumerate(items, 1) if self.known is None or item in self.known]}
+
+
+def ask(llm, items, max_batch=DEFAULT_BATCH_SIZE):
+    singles = []
+
+    def single(index):
+        singles.append(index)
+        return {"approve": False, "summary": "single"}
+
+    def validate(result):
+        if "approve" not in result:
+            raise ValueError("no approve")
+
+    answers = ask_json_batch(llm, "Audit these.", items, '"approve": true/false, "summary": "string"',
+                             validate=validate, single=single, max_batch=max_batch)
+    return answers, singles
+
+
+def test_items_are_sent_max_batch_at_a_time():
+    llm = ScriptedLLM()
+    items = [f"item {i}" for i in range(25)]
+    answers, singles = ask(llm, items)
+
+    assert llm.batch_sizes == [10, 10, 5]
+    assert [a["summary"] for a in answers] == items and singles == []
+
+
+def test_missing_items_are_retried_in_halves_then_alone():
+    items = [f"item {i}" for i in range(6)]
+    llm = ScriptedLLM(known=set(items) - {"item 1", "item 4"})
+    answers, singles = ask(llm, items)
+
+    # 2 missing -> halves of 1 -> each asked alone, then single()
+    assert llm.batch_sizes == [6, 1, 1]
+    assert singles == [1, 4]
+    assert [a["summary"] for a in answers] == ["item 0", "single", "item 2", "item 3", "single", "item 5"]
+
+
+def test_unparseable_reply_falls_back_to_single_prompts():
+    llm = ScriptedLLM(broken=True)
+    answers, singles = ask(llm, ["a", "b", "c", "d"])
+
+    assert llm.batch_sizes == [4, 2, 1, 1, 2, 1, 1]
+    assert singles == [0, 1, 2, 3]
+
+
+def test_pipeline_audits_in_one_batch_and_fills_in_the_verdicts(bench):
+    from llms.replay import prompt_kind
+    from state import PipelineState
+
+    replay = ReplayCall(bench.FIXTURE_PATH, match_key=bench.rule_match_key)
+    kinds = []
+
+    def call(prompt):
+        kinds.append(prompt_kind(prompt).split(" | ")[0])
+        return replay(prompt)
+
+    df = bench.make_dataset(200)
+    state = PipelineState(df=df)
+    orchestrator.run_pipeline(state=state, rules=bench.BENCH_RULES,
+                              metadata_toon=orchestrator.generate_metadata_toon_from_df(df), llm=LLMClient(call))
+
+    assert sum(kind.startswith("Each numbered item below is a data cleaning RULE") for kind in kinds) == 1
+    audited = [entry for entry in state.history if "audit" in entry]
+    assert [entry["rule_index"] for entry in audited] == [0, 1, 2, 4, 6]
+    assert all(entry["audit"]["approve"] and entry["note"] == entry["audit"]["summary"] for entry in audited)
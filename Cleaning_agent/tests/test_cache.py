@@ -0,0 +1,75 @@
+import os
+import time
+
+import pytest
+
+from llms.base import LLMClient
+from llms.cache import ResponseCache
+
+
+class CountingCall:
+    def __init__(self, response='{"approve": true}'):
+        self.response = response
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return self.response
+
+
+def test_repeated_prompt_is_served_from_cache(tmp_path):
+    call = CountingCall()
+    cache = ResponseCache(str(tmp_path))
+    llm = LLMClient(call, cache=cache, model="m")
+
+    assert llm.call("prompt") == llm.call("prompt") == '{"approve": true}'
+    # A new client over the same directory (a later run) still hits
+    assert LLMClient(call, cache=ResponseCache(str(tmp_path)), model="m").call("prompt") == '{"approve": true}'
+
+    assert call.prompts == ["prompt"]
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "hit_rate": 0.5}
+    assert llm.token_stats()["cached_calls"] == 1
+
+
+@pytest.mark.parametrize("other", [{"model": "other"}, {"temperature": 0.7}])
+def test_model_and_temperature_are_part_of_the_key(tmp_path, other):
+    call = CountingCall()
+    cache = ResponseCache(str(tmp_path))
+    LLMClient(call, cache=cache, model="m").call("prompt")
+    LLMClient(call, cache=cache, **{"model": "m", **other}).call("prompt")
+
+    assert len(call.prompts) == 2
+
+
+def test_unparseable_json_is_not_kept(tmp_path):
+    call = CountingCall("not json")
+    llm = LLMClient(call, cache=ResponseCache(str(tmp_path)))
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            llm.ask_json("prompt")
+    assert len(call.prompts) == 2
+
+
+def test_expired_entry_is_a_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_age_seconds=60)
+    key = cache.make_key("m", "prompt", 0)
+    cache.put(key, "old")
+    stale = time.time() - 120
+    os.utime(cache._path(key), (stale, stale))
+
+    assert cache.get(key) is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evict_drops_oldest_entries_first(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_entries=2)
+    keys = [cache.make_key("m", f"prompt {i}", 0) for i in range(3)]
+    for age, key in zip((30, 20, 10), keys):
+        cache.put(key, key)
+        then = time.time() - age
+        os.utime(cache._path(key), (then, then))
+
+    cache.evict()
+
+    assert [cache.get(key) for key in keys] == [None, keys[1], keys[2]]
@@ -0,0 +1,160 @@
+import os
+
+import pandas as pd
+import pytest
+
+import orchestrator
+from checkpoint import CheckpointStore
+from diff_engine import compute_diff
+from llms.base import LLMClient
+from llms.replay import ReplayCall
+from state import PipelineState
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints"))
+    df = pd.DataFrame({"name": [" a", "b ", "c"], "n": [1, 2, 3]})
+    store.write_base(df, step=0)
+    # Rule 1 skipped, rules 2-3 fused and written as step 3
+    after = df.assign(name=df["name"].str.strip())
+    store.write_step(3, df, after, compute_diff(df, after))
+    return store, df, after
+
+
+def test_unrecorded_steps_resolve_to_latest_before(store, tmp_path):
+    store, df, after = store
+    assert store.available_steps() == [0, 3]
+    pd.testing.assert_frame_equal(store.load(1), df)
+    pd.testing.assert_frame_equal(store.load(2), df)
+    pd.testing.assert_frame_equal(store.load(3), after)
+    pd.testing.assert_frame_equal(store.load(5), after)
+
+    path = store.export_csv(2, str(tmp_path / "step2.csv"))
+    pd.testing.assert_frame_equal(pd.read_csv(path), df)
+
+
+def test_load_before_first_step_raises(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints"))
+    # A resumed run starts its checkpoints at the rule it resumes from
+    store.write_base(pd.DataFrame({"n": [1]}), step=2)
+    with pytest.raises(KeyError, match="at or before step 1"):
+        store.load(1)
+
+
+def run_rules(store, df, rules):
+    frames = [df]
+    store.write_base(df, step=0)
+    for step, rule in enumerate(rules, 1):
+        after = rule(frames[-1])
+        store.write_step(step, frames[-1], after, compute_diff(frames[-1], after))
+        frames.append(after)
+    return frames
+
+
+RULES = [
+    lambda df: df.assign(name=df["name"].str.strip()),
+    lambda df: df[df["n"] != 2],
+    lambda df: df.assign(total=df["n"] * 1.5),
+    lambda df: df.drop(columns=["name"]),
+]
+
+
+def test_every_step_is_a_delta_and_rebuilds_exactly(tmp_path):
+    root = str(tmp_path / "checkpoints")
+    frames = run_rules(CheckpointStore(root), pd.DataFrame({"name": [" a", "b ", "c", " d"], "n": [1, 2, 3, 4]}),
+                       RULES)
+
+    # A new store (a later process) finds the steps through the manifest
+    store = CheckpointStore(root)
+    assert [e["kind"] for e in store.steps] == ["full", "delta", "delta", "delta", "delta"]
+    for step, expected in enumerate(frames):
+        pd.testing.assert_frame_equal(store.load(step), expected)
+
+
+def test_rebase_and_retention(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints"), keep_last=2, rebase_every=2)
+    frames = run_rules(store, pd.DataFrame({"name": [" a", "b ", "c", " d"], "n": [1, 2, 3, 4]}), RULES)
+
+    # Full frames at steps 0, 2 and 4; steps before the full frame that
+    # the oldest kept step (3) is rebuilt from are deleted
+    assert [(e["step"], e["kind"]) for e in store.steps] == [(2, "full"), (3, "delta"), (4, "full")]
+    assert sorted(os.listdir(tmp_path / "checkpoints")) == [
+        "manifest.json", "step_0002_full.parquet", "step_0003_delta.parquet", "step_0004_full.parquet"]
+    pd.testing.assert_frame_equal(store.load(3), frames[3])
+
+
+def test_run_state_round_trip(store):
+    store, df, after = store
+    assert store.load_run() is None
+
+    state = PipelineState(df=after, rule_index=3, history=[{"rule_index": 0, "note": "ok"}],
+                          code={0: "code 0", 2: "code 2"}, log_paths={0: "logs/rule_1.txt"})
+    pending = [{"rule_index": 2, "rule": "Trim names.", "diff": {"changed_cells": 3}, "put_code": None}]
+    store.save_run(state, ["a", "b", "c", "d"], "metadata", pending)
+
+    resumed = store.load_run()
+    pd.testing.assert_frame_equal(resumed["df"], after)
+    assert (resumed["next_rule"], resumed["rules"], resumed["metadata_toon"]) == (3, ["a", "b", "c", "d"], "metadata")
+    assert resumed["code"] == {0: "code 0", 2: "code 2"}
+    assert resumed["log_paths"] == {0: "logs/rule_1.txt"}
+    assert resumed["pending_audits"] == pending
+
+
+class Crash(Exception):
+    pass
+
+
+def generated_rule(bench, prompt):
+    """
+    The benchmark rule a code-generation prompt is for, else None.
+    """
+    return bench.rule_match_key(prompt) if prompt.lstrip().startswith("Generate Python code") else None
+
+
+def test_crashed_run_resumes_at_its_first_incomplete_rule(bench):
+    df = bench.make_dataset(200)
+    metadata = orchestrator.generate_metadata_toon_from_df(df)
+
+    def run_pipeline(state, call, metadata_toon=metadata, pending_audits=None, root="checkpoints"):
+        orchestrator.run_pipeline(state=state, rules=bench.BENCH_RULES, metadata_toon=metadata_toon,
+                                  llm=LLMClient(call), checkpoints=CheckpointStore(root),
+                                  pending_audits=pending_audits)
+
+    def replay():
+        return ReplayCall(bench.FIXTURE_PATH, match_key=bench.rule_match_key)
+
+    uninterrupted = PipelineState(df=df.copy())
+    run_pipeline(uninterrupted, replay(), root="uninterrupted")
+
+    first_replay = replay()
+
+    def crash_at_rule_5(prompt):
+        # Killed while generating code for rule index 4
+        if generated_rule(bench, prompt) == "4":
+            raise Crash()
+        return first_replay(prompt)
+
+    with pytest.raises(Crash):
+        run_pipeline(PipelineState(df=df.copy()), crash_at_rule_5)
+
+    resumed = CheckpointStore("checkpoints").load_run()
+    assert resumed["next_rule"] == 4
+    assert [entry["rule_index"] for entry in resumed["history"]] == [0, 1, 2, 3]
+    # Audits of the changing rules were still waiting for a full batch
+    assert [pending["rule_index"] for pending in resumed["pending_audits"]] == [0, 1, 2]
+
+    state = PipelineState(df=resumed["df"], rule_index=resumed["next_rule"], history=resumed["history"],
+                          code=resumed["code"], log_paths=resumed["log_paths"])
+    second = []
+
+    def record(prompt):
+        second.append(prompt)
+        return first_replay(prompt)
+
+    run_pipeline(state, record, metadata_toon=resumed["metadata_toon"], pending_audits=resumed["pending_audits"])
+
+    pd.testing.assert_frame_equal(state.df, uninterrupted.df)
+    assert [entry["note"] for entry in state.history] == [entry["note"] for entry in uninterrupted.history]
+    # Only the rules after the crash generated code
+    assert [generated_rule(bench, prompt) for prompt in second if generated_rule(bench, prompt)] == ["4", "5", "6"]
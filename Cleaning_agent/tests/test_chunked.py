@@ -0,0 +1,141 @@
+import pandas as pd
+import pytest
+
+from chunked import ChunkFailed, execute_chunked, is_row_local, text_dtypes
+from sandbox import execute
+
+STRIP = "def apply_rule(df):\n    df['name'] = df['name'].str.strip()\n    return df\n"
+
+
+@pytest.fixture
+def csv_with_empty_chunk(tmp_path):
+    path = tmp_path / "in.csv"
+    # The second chunk of 3 rows has no names at all
+    pd.DataFrame({"id": range(9), "name": [" a", "b ", " c", None, None, None, "g ", " h", "i"]}).to_csv(
+        path, index=False)
+    return str(path)
+
+
+def test_text_columns_stay_text_in_every_chunk(csv_with_empty_chunk, tmp_path):
+    out = str(tmp_path / "out.csv")
+    stats = execute_chunked(STRIP, csv_with_empty_chunk, out, chunksize=3, max_workers=1)
+    assert stats["rows_out"] == 9
+    assert pd.read_csv(out)["name"].tolist()[:3] == ["a", "b", "c"]
+
+
+def test_dtypes_from_sample(csv_with_empty_chunk, tmp_path):
+    sample = pd.read_csv(csv_with_empty_chunk, nrows=3)
+    assert text_dtypes(sample) == {"name": object}
+    out = str(tmp_path / "out.csv")
+    execute_chunked(STRIP, csv_with_empty_chunk, out, chunksize=3, max_workers=1, dtype=text_dtypes(sample))
+    assert len(pd.read_csv(out)) == 9
+
+
+def test_chunks_on_a_pool_match_one_pass_in_order(tmp_path):
+    path = tmp_path / "in.csv"
+    df = pd.DataFrame({"id": range(1000), "status": ["ok", "test", "ok", "cancelled"] * 250,
+                       "amount": [i * 0.5 for i in range(1000)]})
+    df.to_csv(path, index=False)
+    code = (
+        "def apply_rule(df):\n"
+        "    df = df[~df['status'].isin(['test', 'cancelled'])].copy()\n"
+        "    df['amount'] = df['amount'].round().astype(int)\n"
+        "    return df\n"
+    )
+    assert is_row_local(code)
+
+    out = str(tmp_path / "out.csv")
+    stats = execute_chunked(code, str(path), out, chunksize=64, max_workers=2)
+
+    expected, _ = execute(code, df)
+    assert (stats["chunks"], stats["rows_in"], stats["rows_out"]) == (16, 1000, 500)
+    pd.testing.assert_frame_equal(pd.read_csv(out), expected.reset_index(drop=True))
+
+
+def test_chunk_failure_is_reported_and_output_removed(csv_with_empty_chunk, tmp_path):
+    out = str(tmp_path / "out.csv")
+    code = "def apply_rule(df):\n    df['name'] = df['name'].str.strip().astype(float)\n    return df\n"
+    with pytest.raises(ChunkFailed, match="chunk 1 \\(rows 1-3\\)"):
+        execute_chunked(code, csv_with_empty_chunk, out, chunksize=3, max_workers=1)
+    assert not (tmp_path / "out.csv").exists()
+
+
+GLOBAL_RULES = {
+    "percentile_cap": (
+        "def apply_rule(df):\n"
+        "    cap = np.percentile(df['amount'].dropna(), 99)\n"
+        "    df['amount'] = np.where(df['amount'] > cap, cap, df['amount'])\n"
+        "    return df\n"
+    ),
+    "nan_zscore": (
+        "def apply_rule(df):\n"
+        "    values = df['amount'].to_numpy(dtype=float)\n"
+        "    df['z'] = (values - np.nanmean(values)) / np.nanstd(values)\n"
+        "    return df\n"
+    ),
+    "qcut": (
+        "def apply_rule(df):\n"
+        "    df['band'] = pd.qcut(df['amount'], 4, labels=False)\n"
+        "    return df\n"
+    ),
+    "isin_column": (
+        "def apply_rule(df):\n"
+        "    df['known'] = df['customer'].isin(df['referrer'])\n"
+        "    return df\n"
+    ),
+    "set_lookup": (
+        "def apply_rule(df):\n"
+        "    seen = set(df['customer'])\n"
+        "    df['referrer_known'] = df['referrer'].apply(lambda v: v in seen)\n"
+        "    return df\n"
+    ),
+    "map_series": (
+        "def apply_rule(df):\n"
+        "    names = df.set_axis(df['id'])['name']\n"
+        "    df['parent_name'] = df['parent_id'].map(names)\n"
+        "    return df\n"
+    ),
+    "membership_in_values": (
+        "def apply_rule(df):\n"
+        "    ids = df['id'].values\n"
+        "    df['orphan'] = df['parent_id'].apply(lambda v: v not in ids)\n"
+        "    return df\n"
+    ),
+}
+
+ROW_LOCAL_RULES = {
+    "strip": STRIP,
+    "where_and_to_numeric": (
+        "def apply_rule(df):\n"
+        "    amount = pd.to_numeric(df['amount'], errors='coerce')\n"
+        "    df['amount'] = np.where(amount < 0, np.nan, amount)\n"
+        "    return df\n"
+    ),
+    "literal_lookups": (
+        "def apply_rule(df):\n"
+        "    valid = {'US', 'FR'}\n"
+        "    df['ok'] = df['country'].isin(valid)\n"
+        "    df['country'] = df['country'].map({'usa': 'US'}).fillna(df['country'])\n"
+        "    return df\n"
+    ),
+    "schema_loops": (
+        "def apply_rule(df):\n"
+        "    if 'name' in df.columns and 'name' in df:\n"
+        "        for col in list(df.select_dtypes(include='object').columns):\n"
+        "            if pd.api.types.is_string_dtype(df[col]):\n"
+        "                df[col] = df[col].str.strip()\n"
+        "    return df\n"
+    ),
+}
+
+
+@pytest.mark.parametrize("name", sorted(GLOBAL_RULES))
+def test_whole_column_code_is_global(name):
+    row_local, reason = is_row_local(GLOBAL_RULES[name])
+    assert not row_local, reason
+
+
+@pytest.mark.parametrize("name", sorted(ROW_LOCAL_RULES))
+def test_elementwise_code_is_row_local(name):
+    row_local, reason = is_row_local(ROW_LOCAL_RULES[name])
+    assert row_local, reason
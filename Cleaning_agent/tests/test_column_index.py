@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+import orchestrator
+from column_index import ALIAS_SCORE, EXACT_SCORE, FUZZY_SCORE, TOKENS_SCORE, VALUE_SCORE, ColumnIndex
+from llms.base import LLMClient
+from llms.replay import ReplayCall
+from state import PipelineState
+
+
+@pytest.fixture
+def index():
+    df = pd.DataFrame({
+        "UnitPrice": [1.0, 2.0],
+        "ship_to_country": ["usa", "uk"],
+        "Status": ["Cancelled", "Shipped"],
+        "cust_email": ["a@x.com", "b@y.org"],
+    })
+    return ColumnIndex(df, aliases={"cust_email": ["e-mail address"]})
+
+
+@pytest.mark.parametrize("rule, column, score", [
+    ("Round unit price to 2 decimals.", "UnitPrice", EXACT_SCORE),
+    ("Lower-case the e-mail address.", "cust_email", ALIAS_SCORE),
+    ("Upper-case the country we ship to.", "ship_to_country", TOKENS_SCORE),
+    ("Round UnitPrise to 2 decimals.", "UnitPrice", FUZZY_SCORE),
+    ("Drop 'Cancelled' rows.", "Status", VALUE_SCORE),
+])
+def test_rule_matches_its_column(index, rule, column, score):
+    assert index.scores(rule)[column] == score
+    assert index.relevant_columns(rule)[0] == column
+
+
+@pytest.mark.parametrize("rule", ["Trim all string columns.", "Remove duplicate rows."])
+def test_whole_table_or_unmatched_rules_get_full_metadata(index, rule):
+    assert index.relevant_columns(rule) is None
+
+
+def test_new_and_dropped_columns(index):
+    df = pd.DataFrame({"UnitPrice": [1.0], "LineTotal": [2.0]})
+    index.update(df)
+    assert index.relevant_columns("Round line total.", df.columns) == ["LineTotal"]
+    assert index.relevant_columns("Upper-case Status.", df.columns) is None
+
+
+def test_focused_prompts_give_the_same_result(bench):
+    df = bench.make_dataset(200)
+
+    def run(column_index):
+        replay = ReplayCall(bench.FIXTURE_PATH, match_key=bench.rule_match_key)
+        prompts = []
+
+        def call(prompt):
+            prompts.append(prompt)
+            return replay(prompt)
+
+        state = PipelineState(df=df.copy())
+        orchestrator.run_pipeline(state=state, rules=bench.BENCH_RULES,
+                                  metadata_toon=orchestrator.generate_metadata_toon_from_df(df),
+                                  llm=LLMClient(call), column_index=column_index)
+        generate = [p for p in prompts if p.lstrip().startswith("Generate Python code")]
+        return state, generate
+
+    full, full_prompts = run(None)
+    focused, focused_prompts = run(ColumnIndex(df))
+
+    pd.testing.assert_frame_equal(focused.df, full.df)
+    # "Standardize case for the Country column" only needs Country in detail
+    assert len(focused_prompts[1]) < len(full_prompts[1])
+    assert "Other_Columns" in focused_prompts[1] and "Other_Columns" not in full_prompts[1]
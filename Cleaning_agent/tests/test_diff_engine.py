@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from diff_engine import compute_diff, has_changes
+
+DTYPES = ["Int64", "Float64", "string", "string[pyarrow]", "boolean"]
+VALUES = {
+    "Int64": [1, None, 3, None],
+    "Float64": [1.5, None, 3.5, None],
+    "string": ["a", None, "c", None],
+    "string[pyarrow]": ["a", None, "c", None],
+    "boolean": [False, None, False, None],
+}
+NEW_VALUE = {"Int64": 9, "Float64": 9.5, "string": "z", "string[pyarrow]": "z", "boolean": True}
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_nullable_columns_with_na(dtype):
+    before = pd.DataFrame({"col": pd.array(VALUES[dtype], dtype=dtype)})
+    after = before.copy()
+    after.loc[0, "col"] = NEW_VALUE[dtype]   # value -> value
+    after.loc[1, "col"] = NEW_VALUE[dtype]   # NA -> value
+    after.loc[2, "col"] = pd.NA              # value -> NA
+    # row 3 stays NA
+
+    diff = compute_diff(before, after)
+    assert diff["changed_by_column"] == {"col": 3}
+    assert compute_diff(before, before.copy())["changed_by_column"] == {}
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_nullable_columns_after_dropping_rows(dtype):
+    before = pd.DataFrame({"col": pd.array(VALUES[dtype], dtype=dtype)})
+    after = before.drop(index=[0])
+    after.loc[1, "col"] = NEW_VALUE[dtype]
+
+    diff = compute_diff(before, after)
+    assert diff["rows_removed"] == 1
+    assert diff["changed_by_column"] == {"col": 1}
+
+
+def test_object_column_mixing_na_none_and_nan():
+    before = pd.DataFrame({"col": ["a", pd.NA, None, np.nan, "e"]})
+    after = pd.DataFrame({"col": ["a", None, np.nan, pd.NA, "f"]})
+    assert compute_diff(before, after)["changed_by_column"] == {"col": 1}
+
+
+def test_replace_empty_string_with_na():
+    before = pd.DataFrame({"col": ["a", "", "c"]})
+    after = before.replace("", pd.NA)
+    assert compute_diff(before, after)["changed_by_column"] == {"col": 1}
+
+
+def test_astype_int64_is_a_retype_not_a_change():
+    before = pd.DataFrame({"col": [1.0, np.nan, 3.0]})
+    after = before.astype("Int64")
+    diff = compute_diff(before, after)
+    assert diff["retyped_columns"] == ["col"]
+    assert diff["changed_by_column"] == {}
+
+
+def test_categorical_with_new_categories():
+    before = pd.DataFrame({"col": pd.Categorical(["x", "y", None, "x"])})
+    after = pd.DataFrame({"col": pd.Categorical(["x", "z", None, "w"])})
+    assert compute_diff(before, after)["changed_by_column"] == {"col": 2}
+
+
+def test_categorical_same_categories():
+    before = pd.DataFrame({"col": pd.Categorical(["x", "y", None], categories=["x", "y"])})
+    after = before.copy()
+    after.loc[2, "col"] = "x"
+    assert compute_diff(before, after)["changed_by_column"] == {"col": 1}
+
+
+@pytest.fixture
+def orders():
+    return pd.DataFrame({
+        "name": ["a", "b", None, "d"],
+        "price": [1.0, np.nan, 3.0, np.nan],
+    })
+
+
+def test_unchanged_nan_is_not_a_change(orders):
+    after = orders.copy()
+    after.loc[1, "price"] = 2.0
+
+    diff = compute_diff(orders, after)
+    assert diff["aligned_on"] == "identical"
+    assert diff["changed_by_column"] == {"price": 1}
+    assert diff["nulls_before"] == {"name": 1, "price": 2}
+    assert diff["nulls_after"] == {"name": 1, "price": 1}
+    assert not has_changes(compute_diff(orders, orders.copy()))
+
+
+def test_sorted_rows_align_on_index(orders):
+    diff = compute_diff(orders, orders.sort_values("name"))
+    assert diff["aligned_on"] == "index"
+    assert diff["changed_cells"] == 0
+
+
+def test_dropped_rows_after_reset_index_align_on_hashes(orders):
+    after = orders.drop(index=[0, 2]).reset_index(drop=True)
+
+    diff = compute_diff(orders, after)
+    assert diff["aligned_on"] == "hash"
+    assert (diff["rows_removed"], diff["rows_added"], diff["changed_cells"]) == (2, 0, 0)
+
+
+def test_columns_added_and_removed(orders):
+    after = orders.drop(columns=["name"]).assign(total=orders["price"] * 2)
+
+    diff = compute_diff(orders, after)
+    assert diff["columns_added"] == ["total"]
+    assert diff["columns_removed"] == ["name"]
+    assert diff["changed_cells"] == 0
+    assert has_changes(diff)
@@ -0,0 +1,58 @@
+import json
+
+from events import ProgressEvents
+
+
+def read_events(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_append_continues_seq_after_cut_off_line(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    with ProgressEvents(path) as events:
+        events.emit("run_started")
+        events.emit("rule_started", rule_index=0)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"seq": 3, "ev')
+
+    with ProgressEvents(path, append=True) as events:
+        assert events.emit("run_started")["seq"] == 3
+
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    assert lines[2] == '{"seq": 3, "ev'
+    assert [e["seq"] for e in map(json.loads, [lines[0], lines[1], lines[3]])] == [1, 2, 3]
+
+
+def test_new_run_starts_a_new_file(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    with ProgressEvents(path) as events:
+        events.emit("run_started")
+    with ProgressEvents(path) as events:
+        events.emit("run_started")
+    assert [e["seq"] for e in read_events(path)] == [1]
+
+
+def test_pipeline_emits_each_stage(bench):
+    import orchestrator
+    from llms.base import LLMClient
+    from llms.replay import ReplayCall
+    from state import PipelineState
+
+    df = bench.make_dataset(200)
+    with ProgressEvents("events.jsonl") as events:
+        orchestrator.run_pipeline(state=PipelineState(df=df), rules=bench.BENCH_RULES,
+                                  metadata_toon=orchestrator.generate_metadata_toon_from_df(df),
+                                  llm=LLMClient(ReplayCall(bench.FIXTURE_PATH, match_key=bench.rule_match_key)),
+                                  events=events)
+    records = read_events("events.jsonl")
+
+    assert [r["seq"] for r in records] == list(range(1, len(records) + 1))
+    assert (records[0]["event"], records[-1]["event"]) == ("pipeline_started", "pipeline_finished")
+    first_rule = [r["event"] for r in records if r.get("rule_index") == 0]
+    assert first_rule[:2] == ["rule_started", "generate_attempt"]
+    assert {"code_generated", "verify_verdict", "executed", "diff", "audit", "rule_finished"} <= set(first_rule)
+    assert [r["rule_index"] for r in records if r["event"] == "rule_skipped"] == [3]
+    executed = next(r for r in records if r["event"] == "executed")
+    assert executed["seconds"] >= 0 and "peak_rss_mb" in executed
@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+
+import orchestrator
+from events import ProgressEvents
+from fusion import attribute_diff, code_columns, conflicts, fuse_code
+from diff_engine import compute_diff
+from llms.base import LLMClient
+from llms.replay import ReplayCall
+from rule_pack import RulePack
+from sandbox import execute
+from state import PipelineState
+
+UPPER = "def apply_rule(df):\n    df['Country'] = df['Country'].str.upper()\n    return df\n"
+TOTAL = (
+    "def apply_rule(df):\n"
+    "    issues = []\n"
+    "    df['Total'] = (df['Quantity'] * df['Price']).round(2)\n"
+    "    if (df['Total'] > 100).any():\n"
+    "        issues.append('large total')\n"
+    "    return df, issues\n"
+)
+LOOP = (
+    "COLUMNS = ['Name', 'Country']\n"
+    "def apply_rule(df):\n"
+    "    for col in COLUMNS:\n"
+    "        df[col] = df[col].str.strip()\n"
+    "    return df\n"
+)
+
+
+def test_footprints_of_named_columns():
+    assert code_columns(UPPER)[0] == ({"Country"}, {"Country"})
+    assert code_columns(TOTAL)[0] == ({"Quantity", "Price", "Total"}, {"Total"})
+    assert code_columns(LOOP)[0] == ({"Name", "Country"}, {"Name", "Country"})
+
+
+@pytest.mark.parametrize("code", [
+    "def apply_rule(df):\n    return df[df['Status'] != 'Test']\n",
+    "def apply_rule(df):\n    for col in df.columns:\n        df[col] = df[col].astype(str)\n    return df\n",
+    "def apply_rule(df):\n    df.iloc[:, 0] = 1\n    return df\n",
+])
+def test_unclear_code_is_not_fusable(code):
+    assert code_columns(code)[0] is None
+
+
+def test_conflicts():
+    upper, total, loop = (code_columns(code)[0] for code in (UPPER, TOTAL, LOOP))
+    assert not conflicts(upper, total)
+    assert conflicts(upper, loop)
+
+
+def test_fused_code_runs_the_rules_in_order():
+    df = pd.DataFrame({"Country": ["usa", "uk"], "Quantity": [2, 30], "Price": [1.5, 4.0]})
+    fused, rule_issues = execute(fuse_code([UPPER, TOTAL]), df.copy())
+
+    expected, issues = execute(TOTAL, execute(UPPER, df.copy())[0])
+    pd.testing.assert_frame_equal(fused, expected)
+    assert rule_issues == [[], issues] == [[], ["large total"]]
+
+    diff = compute_diff(df, fused)
+    upper_diff = attribute_diff(diff, {"Country"}, {"Total"})
+    assert (upper_diff["changed_by_column"], upper_diff["columns_added"]) == ({"Country": 2}, [])
+    total_diff = attribute_diff(diff, {"Total"}, {"Country"})
+    assert (total_diff["changed_cells"], total_diff["columns_added"]) == (0, ["Total"])
+
+
+def test_fused_run_gives_the_same_result(bench):
+    df = bench.make_dataset(200)
+    pack = RulePack("rule_pack.json")
+
+    def run(fuse):
+        events = []
+
+        class Recording(ProgressEvents):
+            def emit(self, event, **fields):
+                events.append(event)
+                return super().emit(event, **fields)
+
+        state = PipelineState(df=df.copy())
+        orchestrator.run_pipeline(state=state, rules=bench.BENCH_RULES,
+                                  metadata_toon=orchestrator.generate_metadata_toon_from_df(df),
+                                  llm=LLMClient(ReplayCall(bench.FIXTURE_PATH, match_key=bench.rule_match_key)),
+                                  rule_pack=pack, fuse=fuse, events=Recording())
+        return state, events
+
+    run(False)  # compiles the pack
+    unfused, _ = run(False)
+    fused, events = run(True)
+
+    pd.testing.assert_frame_equal(fused.df, unfused.df)
+    assert "fusion_started" in events
+    assert [entry["rule_index"] for entry in fused.history] == [entry["rule_index"] for entry in unfused.history]
+    fused_rules = [entry["rule_index"] for entry in fused.history if "fused_rules" in entry.get("execution", {})]
+    # Rule index 3 is informational and index 4 drops rows, so the passes
+    # are split around them
+    assert fused_rules == [1, 2, 5, 6]
@@ -0,0 +1,19 @@
+import importlib.util
+import os
+
+import pytest
+
+BENCH_STARTUP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks",
+                             "bench_startup.py")
+
+spec = importlib.util.spec_from_file_location("bench_startup", BENCH_STARTUP)
+bench_startup = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench_startup)
+
+
+# Import time itself is left to the benchmark; it is too noisy for a test
+@pytest.mark.parametrize("module, path", [(module, path) for module, path, _ in bench_startup.TARGETS])
+def test_import_is_light_and_side_effect_free(module, path):
+    measured = bench_startup.import_once(module, path)
+    assert measured["heavy"] == []
+    assert measured["created_files"] == []
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from ingest import load_csv, optimize_dtypes
+
+CSV = (
+    "id,dob,visit,start,name,score\n"
+    "1,2020-01-02,2020-01-02T10:00:00,12:30:00,a,1.5\n"
+    "2,,2021-03-04T05:06:07,13:00:00,,\n"
+    "3,1999-12-31,,,c,2.0\n"
+)
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "input.csv"
+    path.write_text(CSV)
+    return str(path)
+
+
+@pytest.mark.parametrize("usecols", [None, ["id", "dob", "name"]])
+def test_pyarrow_frame_matches_c_parser(csv_path, usecols):
+    pytest.importorskip("pyarrow")
+    arrow, report = load_csv(csv_path, usecols=usecols, engine="pyarrow", category_ratio=0)
+    c, _ = load_csv(csv_path, usecols=usecols, engine="c", category_ratio=0)
+    assert report["engine"] == "pyarrow"
+    assert arrow.dtypes.to_dict() == c.dtypes.to_dict()
+    pd.testing.assert_frame_equal(arrow, c)
+
+
+def test_dates_stay_strings(csv_path):
+    pytest.importorskip("pyarrow")
+    df, _ = load_csv(csv_path, engine="pyarrow", category_ratio=0)
+    assert df["dob"].dtype == object
+    assert df["dob"][0] == "2020-01-02"
+    assert df["visit"][0] == "2020-01-02T10:00:00"
+    assert pd.isna(df["dob"][1])
+
+
+def test_repetitive_text_becomes_categorical_and_the_report_shows_the_saving(tmp_path):
+    path = tmp_path / "orders.csv"
+    rows = [f"{i},{['usa', 'uk', 'france'][i % 3]},order {i},{i % 100},{i / 4}" for i in range(3000)]
+    path.write_text("id,country,note,qty,price\n" + "\n".join(rows) + "\n")
+
+    df, report = load_csv(str(path), engine="c", downcast=True)
+
+    assert df["country"].dtype == "category"
+    assert df["note"].dtype == object  # every value distinct
+    assert report["conversions"] == {"id": "int64 -> int16", "country": "object -> category",
+                                     "qty": "int64 -> int8", "price": "float64 -> float32"}
+    assert report["frame_mb"] < report["parsed_frame_mb"]
+    assert (report["rows"], report["columns"], report["engine"]) == (3000, 5, "c")
+    assert df["country"].tolist()[:3] == ["usa", "uk", "france"]
+
+
+def test_lossy_float_downcast_is_skipped():
+    df = pd.DataFrame({"price": [0.1, 2.0], "weight": [0.5, None]})
+    assert optimize_dtypes(df, downcast=True) == {"weight": "float64 -> float32"}
+    assert df["price"].dtype == "float64"
+
+
+def test_arrow_strings_for_high_cardinality_text():
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({"name": ["a", "b", "c", None]})
+    assert optimize_dtypes(df, arrow_strings=True) == {"name": "object -> string"}
+    assert pd.isna(df["name"][3])
@@ -0,0 +1,45 @@
+import json
+import threading
+
+import orchestrator
+from llms.base import LLMClient
+from llms.interpreter import interpret_rules
+from llms.replay import ReplayCall, prompt_kind
+from state import PipelineState
+
+RULES = ["Trim names.", "Values are in USD.", "Drop test orders."]
+
+
+def test_rules_are_interpreted_concurrently_in_order():
+    # Every rule's call has to be in flight at once to get past the barrier
+    barrier = threading.Barrier(len(RULES), timeout=5)
+
+    def call(prompt):
+        barrier.wait()
+        informational = "USD" in prompt
+        return json.dumps({"requires_execution": not informational, "reason": next(r for r in RULES if r in prompt)})
+
+    intents = interpret_rules(LLMClient(call), RULES, batch_size=1)
+
+    assert [intent["reason"] for intent in intents] == RULES
+    assert [intent["requires_execution"] for intent in intents] == [True, False, True]
+
+
+def test_pipeline_interprets_every_rule_before_the_data_loop(bench):
+    replay = ReplayCall(bench.FIXTURE_PATH, match_key=bench.rule_match_key)
+    kinds = []
+
+    def call(prompt):
+        kinds.append(prompt_kind(prompt))
+        return replay(prompt)
+
+    df = bench.make_dataset(200)
+    state = PipelineState(df=df)
+    orchestrator.run_pipeline(state=state, rules=bench.BENCH_RULES,
+                              metadata_toon=orchestrator.generate_metadata_toon_from_df(df),
+                              llm=LLMClient(call), llm_batch_size=1)
+
+    interpreting = [kind.startswith("You are analyzing a human-written data rule") for kind in kinds]
+    assert interpreting == [True] * len(bench.BENCH_RULES) + [False] * (len(kinds) - len(bench.BENCH_RULES))
+    # The informational rule was skipped without generating code
+    assert state.history[3]["note"] == "Informational rule – skipped execution"
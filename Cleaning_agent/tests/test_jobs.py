@@ -0,0 +1,231 @@
+import json
+import os
+import sys
+import time
+
+# jobs.py lives next to app.py, one folder above the pipeline modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest  # noqa: E402
+
+from jobs import COMPLETED, FAILED, RUN_STATE_PATH, JobManager, QueueFull  # noqa: E402
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = JobManager(root=str(tmp_path / "jobs"), max_workers=1, warm=False)
+    yield manager
+    manager.shutdown()
+
+
+def test_failed_before_start_stream_gets_job_finished(manager):
+    job_id = manager.create()
+    manager.fail(job_id, "Failed to process rules file: bad sheet")
+
+    # A stream starts after seq 0 and must still see the final event
+    events, missed, closed = manager.events(job_id).wait_after(0, timeout=0)
+    assert [e["event"] for e in events] == ["job_finished"]
+    assert events[0]["seq"] == 1
+    assert events[0]["status"] == FAILED
+    assert missed == 0 and not closed
+
+    events, _, closed = manager.events(job_id).wait_after(1, timeout=0)
+    assert events == [] and closed
+
+
+def test_failed_run_trace_counted_in_metrics(manager):
+    job_id = manager.create()
+    trace = {"stages": {"generate": {"count": 2, "seconds": 1.5}}, "peak_rss_mb": 120.0}
+    with open(os.path.join(manager.data_dir(job_id), "trace.json"), "w", encoding="utf-8") as f:
+        json.dump({"trace": trace, "llm_tokens": {"calls": 2, "prompt_tokens": 300}}, f)
+
+    manager._record_run(job_id, FAILED, 4.0)
+
+    assert manager._stage_totals["generate"] == {"count": 2, "seconds": 1.5}
+    assert manager._llm_totals["calls"] == 2
+    assert manager._llm_totals["prompt_tokens"] == 300
+    assert manager._job_seconds[FAILED] == [1, 4.0]
+
+
+def wait_until_finished(manager, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if manager.get(job_id)["status"] in (COMPLETED, FAILED):
+            return manager.get(job_id)
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def stream_events(manager, job_id, last_event_id):
+    import app as web
+
+    web._job_manager = manager
+    client = web.app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = "analyst"
+    response = client.get(f"/api/jobs/{job_id}/events", headers={"Last-Event-ID": str(last_event_id)})
+    messages = [json.loads(line[len("data: "):]) for line in response.get_data(as_text=True).splitlines()
+                if line.startswith("data: ")]
+    return [(m["seq"], m["event"]) for m in messages]
+
+
+def test_resumed_job_continues_event_numbering(manager, monkeypatch):
+    import app as web
+
+    monkeypatch.setattr(web, "_job_manager", None)
+    # No input.csv: run.py fails right after run_started
+    job_id = manager.create(user="analyst")
+    manager.submit(job_id)
+    wait_until_finished(manager, job_id)
+    assert stream_events(manager, job_id, 0) == [(1, "run_started"), (2, "job_finished")]
+
+    # A completed rule to resume from (unreadable, so the resumed run fails too)
+    os.makedirs(os.path.join(manager.job_dir(job_id), "checkpoints"), exist_ok=True)
+    with open(os.path.join(manager.job_dir(job_id), RUN_STATE_PATH), "w", encoding="utf-8") as f:
+        f.write("{}")
+    manager.resume(job_id)
+    wait_until_finished(manager, job_id)
+
+    # The browser saw up to job_finished (2) before resuming
+    assert stream_events(manager, job_id, 2) == [(3, "run_started"), (4, "job_finished")]
+    assert [seq for seq, _ in stream_events(manager, job_id, 0)] == [1, 2, 3, 4]
+
+    # Rebuilt from the file after a server restart: the same events, no extra job_finished
+    manager._events.pop(job_id)
+    assert stream_events(manager, job_id, 2) == [(3, "run_started"), (4, "job_finished")]
+
+
+def test_resumed_job_queues_behind_waiting_jobs(manager, monkeypatch):
+    # Nothing starts: the positions stay as queued
+    monkeypatch.setattr(manager._pool, "submit", lambda *args: None)
+    first = manager.create()
+    manager.submit(first)
+    second = manager.create()
+    manager.submit(second)
+    assert (manager.get(first)["position"], manager.get(second)["position"]) == (1, 2)
+
+    manager._update(first, status=FAILED)
+    os.makedirs(os.path.join(manager.job_dir(first), "checkpoints"), exist_ok=True)
+    with open(os.path.join(manager.job_dir(first), RUN_STATE_PATH), "w", encoding="utf-8") as f:
+        f.write("{}")
+    manager.resume(first)
+
+    assert (manager.get(second)["position"], manager.get(first)["position"]) == (1, 2)
+
+
+@pytest.mark.parametrize("headers, query", [({"Last-Event-ID": "abc"}, ""), ({}, "?after=1.5")])
+def test_bad_last_event_id_is_rejected(manager, monkeypatch, headers, query):
+    import app as web
+
+    monkeypatch.setattr(web, "_job_manager", manager)
+    job_id = manager.create(user="analyst")
+    client = web.app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = "analyst"
+    response = client.get(f"/api/jobs/{job_id}/events{query}", headers=headers)
+    assert response.status_code == 400
+    assert "event number" in response.get_json()["error"]
+
+
+def test_queue_is_bounded(tmp_path, monkeypatch):
+    import io
+
+    import app as web
+
+    manager = JobManager(root=str(tmp_path / "jobs"), max_workers=1, max_queued=2, warm=False)
+    monkeypatch.setattr(manager._pool, "submit", lambda *args: None)
+    monkeypatch.setattr(web, "_job_manager", manager)
+    try:
+        for _ in range(2):
+            manager.submit(manager.create(user="analyst"))
+        with pytest.raises(QueueFull):
+            manager.create()
+
+        client = web.app.test_client()
+        with client.session_transaction() as session:
+            session["user"] = "analyst"
+        response = client.post("/run", data={"file": (io.BytesIO(b"a\n1\n"), "input.csv"),
+                                             "rules": (io.BytesIO(b""), "rules.xlsx")})
+        assert response.status_code == 503
+    finally:
+        manager.shutdown()
+
+
+def test_jobs_are_private_and_isolated(manager, monkeypatch):
+    import app as web
+
+    monkeypatch.setattr(web, "_job_manager", manager)
+    monkeypatch.setattr(manager._pool, "submit", lambda *args: None)
+    mine, theirs = manager.create(user="analyst"), manager.create(user="other")
+    assert manager.data_dir(mine) != manager.data_dir(theirs)
+    assert os.path.isdir(manager.data_dir(mine))
+
+    client = web.app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = "analyst"
+    assert client.get(f"/api/jobs/{mine}").get_json()["status"] == "queued"
+    assert client.get(f"/api/jobs/{theirs}").status_code == 404
+
+
+def test_unfinished_jobs_fail_after_a_restart(tmp_path):
+    root = str(tmp_path / "jobs")
+    manager = JobManager(root=root, max_workers=1, warm=False)
+    manager._pool.submit = lambda *args: None
+    job_id = manager.create()
+    manager.submit(job_id)
+    manager.shutdown(wait=False)
+
+    restarted = JobManager(root=root, max_workers=1, warm=False)
+    try:
+        job = restarted.get(job_id)
+        assert job["status"] == FAILED
+        assert "restarted" in job["error"]
+    finally:
+        restarted.shutdown()
+
+
+def test_event_buffer_reports_missed_events_and_wakes_streams():
+    import threading
+
+    from jobs import EventBuffer
+
+    buffer = EventBuffer(maxlen=3)
+    for seq in range(1, 6):
+        buffer.append({"seq": seq, "event": "rule_started"})
+
+    # A stream that saw event 1 lost 2 and 3 to the bound
+    events, missed, closed = buffer.wait_after(1, timeout=0)
+    assert ([e["seq"] for e in events], missed, closed) == ([3, 4, 5], 1, False)
+    events, missed, _ = buffer.wait_after(0, timeout=0)
+    assert missed == 2
+
+    threading.Timer(0.1, buffer.append, [{"seq": 6, "event": "job_finished"}]).start()
+    events, _, _ = buffer.wait_after(5, timeout=5)
+    assert [e["seq"] for e in events] == [6]
+
+    buffer.close()
+    assert buffer.wait_after(6, timeout=0) == ([], 0, True)
+
+
+def test_warm_worker_runs_jobs_and_is_recycled(tmp_path):
+    manager = JobManager(root=str(tmp_path / "jobs"), max_workers=1, warm=True, max_jobs_per_worker=2)
+    try:
+        jobs = []
+        for _ in range(3):
+            # No input.csv: each run fails right after run_started
+            job_id = manager.create()
+            manager.submit(job_id)
+            jobs.append(wait_until_finished(manager, job_id))
+
+        assert [job["mode"] for job in jobs] == ["warm"] * 3
+        pids = [job["worker_pid"] for job in jobs]
+        assert pids[0] == pids[1] != pids[2]
+        assert all(job["status"] == FAILED and "FileNotFoundError" in job["error"] for job in jobs)
+        with open(os.path.join(manager.job_dir(jobs[0]["id"]), "run.log"), encoding="utf-8") as f:
+            assert "FileNotFoundError" in f.read()
+
+        metrics = manager.metrics()
+        assert metrics["job_overhead"]["warm"]["jobs"] == 3
+        assert [worker["jobs_run"] for worker in metrics["workers"]] == [1]
+    finally:
+        manager.shutdown()
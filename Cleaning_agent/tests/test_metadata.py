@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import toon
+from csv_read_toon import ColumnProfileCache, generate_metadata_toon_from_df
+from diff_engine import compute_diff
+from llms.tokens import estimate_tokens
+
+
+@pytest.fixture
+def orders():
+    return pd.DataFrame({
+        "name": [" ann", "bob ", None, "dan"],
+        "country": ["usa", "uk", "uk", None],
+        "price": [1.0, 2.5, None, 4.0],
+    })
+
+
+def test_only_changed_columns_are_reprofiled(orders):
+    cache = ColumnProfileCache()
+    generate_metadata_toon_from_df(orders, profile_cache=cache)
+    assert (cache.reused, cache.recomputed) == (0, 3)
+
+    after = orders.assign(name=orders["name"].str.strip())
+    metadata = generate_metadata_toon_from_df(after, profile_cache=cache, diff=compute_diff(orders, after))
+
+    assert (cache.reused, cache.recomputed) == (2, 4)
+    assert metadata == generate_metadata_toon_from_df(after)
+
+
+def test_changes_are_found_without_a_diff(orders):
+    cache = ColumnProfileCache()
+    generate_metadata_toon_from_df(orders, profile_cache=cache)
+
+    after = orders.assign(country=orders["country"].str.upper())
+    metadata = generate_metadata_toon_from_df(after, profile_cache=cache)
+
+    # Fingerprints tell the unchanged columns apart
+    assert (cache.reused, cache.recomputed) == (2, 4)
+    assert metadata == generate_metadata_toon_from_df(after)
+
+
+def test_row_count_change_reprofiles_every_column(orders):
+    cache = ColumnProfileCache()
+    generate_metadata_toon_from_df(orders, profile_cache=cache)
+
+    after = orders.drop(index=[0]).drop(columns=["price"])
+    metadata = generate_metadata_toon_from_df(after, profile_cache=cache, diff=compute_diff(orders, after))
+
+    assert (cache.reused, cache.recomputed) == (0, 5)
+    assert metadata == generate_metadata_toon_from_df(after)
+
+
+@pytest.fixture
+def wide():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({f"col_{i:03d}": rng.normal(size=50) for i in range(150)}
+                        | {"email": ["a@x.com"] * 50})
+
+
+def shortened(wide, budget):
+    metadata = generate_metadata_toon_from_df(wide, token_budget=budget, priority_columns=["email", "col_000"])
+    assert estimate_tokens(generate_metadata_toon_from_df(wide)) > budget >= estimate_tokens(metadata)
+    document = toon.loads(metadata)
+    assert document["Detail_Note"].startswith("Detail left out to keep the prompt short")
+    return document
+
+
+def test_stats_go_first_from_the_lowest_priority_column(wide):
+    document = shortened(wide, 12000)
+    details = document["Column_Details"]
+    assert "Descriptive_Stats" in details["email"] and "Descriptive_Stats" in details["col_000"]
+    assert "Descriptive_Stats" not in details["col_149"]
+    assert "Other_Columns" not in document
+
+
+def test_tight_budget_collapses_low_priority_columns(wide):
+    document = shortened(wide, 3000)
+    assert "email" in document["Column_Details"] and "col_000" in document["Column_Details"]
+    assert {"Name": "col_149", "Data_Type": "float64"} in document["Other_Columns"]
+
+
+def test_metadata_within_budget_is_unchanged(wide):
+    assert generate_metadata_toon_from_df(wide, token_budget=10 ** 6) == generate_metadata_toon_from_df(wide)
@@ -0,0 +1,42 @@
+import pandas as pd
+
+import orchestrator
+from events import ProgressEvents
+from llms.base import LLMClient
+from llms.replay import ReplayCall
+from state import PipelineState
+
+
+class RecordingEvents(ProgressEvents):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, event, **fields):
+        record = super().emit(event, **fields)
+        self.records.append(record)
+        return record
+
+
+def run(bench, df, pipelined):
+    events = RecordingEvents()
+    state = PipelineState(df=df.copy())
+    orchestrator.run_pipeline(state=state, rules=bench.BENCH_RULES,
+                              metadata_toon=orchestrator.generate_metadata_toon_from_df(df),
+                              llm=LLMClient(ReplayCall(bench.FIXTURE_PATH, match_key=bench.rule_match_key)),
+                              pipelined=pipelined, events=events)
+    return state, events
+
+
+def test_speculative_code_gives_the_same_result(bench):
+    df = bench.make_dataset(300)
+    sequential, _ = run(bench, df, pipelined=False)
+    pipelined, events = run(bench, df, pipelined=True)
+
+    pd.testing.assert_frame_equal(pipelined.df, sequential.df)
+    assert [entry["note"] for entry in pipelined.history] == [entry["note"] for entry in sequential.history]
+
+    used = [record["rule_index"] for record in events.records if record["event"] == "speculation_used"]
+    # Rule index 2 adds LineTotal, so the code speculated for index 4 against
+    # the old schema is discarded; index 3 is informational
+    assert used == [1, 2, 5, 6]
@@ -0,0 +1,66 @@
+import pytest
+
+from llms.replay import RecordingCall, ReplayCall
+
+INTERPRET = "You are analyzing a rule.\nRULE:\n{rule}\nMETADATA:\nrows: {rows}"
+AUDIT = "Audit this.\nRULE:\n{rule}\nDIFF:\n{diff}"
+
+
+def record(path, prompts, responses, match_key=None):
+    answers = iter(responses)
+    recording = RecordingCall(lambda prompt: next(answers), path, match_key=match_key)
+    for prompt in prompts:
+        recording(prompt)
+
+
+def test_exact_prompt_replays_its_recordings_in_order(tmp_path):
+    path = str(tmp_path / "replay.jsonl")
+    prompt = INTERPRET.format(rule="Trim", rows=10)
+    record(path, [prompt, prompt], ["first", "retry"])
+
+    replay = ReplayCall(path)
+    assert [replay(prompt) for _ in range(3)] == ["first", "retry", "first"]
+    assert replay.stats() == {"calls": 3, "exact_hits": 3, "fallback_hits": 0}
+
+
+def test_nearest_prompt_of_the_same_kind(tmp_path):
+    path = str(tmp_path / "replay.jsonl")
+    record(path, [INTERPRET.format(rule="Trim", rows=10), INTERPRET.format(rule="Drop", rows=10),
+                  AUDIT.format(rule="Trim", diff="x")], ["trim", "drop", "audit"])
+
+    replay = ReplayCall(path)
+    # Other metadata: closest by shared lines, never an audit reply
+    assert replay(INTERPRET.format(rule="Drop", rows=99)) == "drop"
+    assert replay(AUDIT.format(rule="Drop", diff="y")) == "audit"
+    assert replay.stats()["fallback_hits"] == 2
+
+    with pytest.raises(KeyError):
+        replay("Something else entirely.")
+    with pytest.raises(KeyError):
+        ReplayCall(path, fallback=None)(INTERPRET.format(rule="Drop", rows=99))
+
+
+def test_match_key_wins_over_shared_lines(tmp_path):
+    path = str(tmp_path / "replay.jsonl")
+
+    def rule_key(prompt):
+        return "drop" if "Drop" in prompt else "trim"
+
+    record(path, [INTERPRET.format(rule="Trim", rows=10), INTERPRET.format(rule="Drop", rows=20)],
+           ["trim", "drop"], match_key=rule_key)
+
+    # Shares more lines with the Trim recording, but is about Drop
+    prompt = INTERPRET.format(rule="Drop them", rows=10)
+    assert ReplayCall(path)(prompt) == "trim"
+    assert ReplayCall(path, match_key=rule_key)(prompt) == "drop"
+
+
+def test_pipeline_benchmark_runs_offline(bench):
+    df = bench.make_dataset(500)
+    replay = ReplayCall(bench.FIXTURE_PATH, match_key=bench.rule_match_key)
+    result = bench.run_once(df, replay)
+
+    # "Drop test/cancelled orders." removed rows; every stage was timed
+    assert result["rows_in"] == 500 > result["rows_out"]
+    assert {"interpret", "generate", "verify", "execute", "diff", "audit"} <= set(result["stages_s"])
+    assert replay.stats()["calls"] == replay.stats()["exact_hits"] + replay.stats()["fallback_hits"]
@@ -0,0 +1,74 @@
+import json
+
+import pandas as pd
+
+import orchestrator
+from llms.base import LLMClient
+from llms.replay import ReplayCall, prompt_kind
+from rule_pack import RulePack
+from schema import schema_fingerprint
+from state import PipelineState
+
+CODE = "def apply_rule(df):\n    df['name'] = df['name'].str.strip()\n    return df\n"
+
+
+def test_code_is_keyed_by_rule_and_schema(tmp_path):
+    path = str(tmp_path / "rule_pack.json")
+    fingerprint = schema_fingerprint(pd.DataFrame({"name": ["a"]}))
+    RulePack(path).put("Trim names.", fingerprint, CODE)
+
+    pack = RulePack(path)
+    assert pack.get("  Trim names.\n", fingerprint) == CODE
+    assert pack.get("Trim names.", schema_fingerprint(pd.DataFrame({"name": [1]}))) is None
+    assert pack.get("Trim all names.", fingerprint) is None
+    assert pack.has_rule("Trim names.")
+    assert pack.stats() == {"entries": 1, "hits": 1, "misses": 2}
+
+
+def test_edited_code_that_fails_validation_is_ignored(tmp_path):
+    path = str(tmp_path / "rule_pack.json")
+    RulePack(path).put("Trim names.", "fp", CODE)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    for entry in data["entries"].values():
+        entry["code"] = "import os\n" + entry["code"]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+    assert RulePack(path).get("Trim names.", "fp") is None
+
+
+def test_packs_sharing_a_file_keep_each_others_rules(tmp_path):
+    path = str(tmp_path / "rule_pack.json")
+    first, second = RulePack(path), RulePack(path)
+    first.put("Trim names.", "fp", CODE)
+    second.put("Trim names again.", "fp", CODE)
+
+    assert RulePack(path).stats()["entries"] == 2
+
+
+def test_second_run_uses_compiled_code_only(bench):
+    df = bench.make_dataset(200)
+    pack = RulePack("rule_pack.json")
+
+    def run():
+        kinds = []
+        replay = ReplayCall(bench.FIXTURE_PATH, match_key=bench.rule_match_key)
+
+        def call(prompt):
+            kinds.append(prompt_kind(prompt).split(" | ")[0])
+            return replay(prompt)
+
+        state = PipelineState(df=df.copy())
+        orchestrator.run_pipeline(state=state, rules=bench.BENCH_RULES,
+                                  metadata_toon=orchestrator.generate_metadata_toon_from_df(df),
+                                  llm=LLMClient(call), rule_pack=pack)
+        return state, kinds
+
+    compiled_from, _ = run()
+    state, kinds = run()
+
+    pd.testing.assert_frame_equal(state.df, compiled_from.df)
+    # Only the (batched) interpretation went to the LLM
+    assert len(kinds) == 1 and kinds[0].startswith("You are analyzing human-written data rules")
+    assert pack.stats()["hits"] == 6
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+import run
+from events import ProgressEvents
+
+
+@pytest.fixture
+def opened_events(monkeypatch):
+    opened = []
+
+    class RecordingEvents(ProgressEvents):
+        def __init__(self, path=None, append=False):
+            super().__init__(path, append=append)
+            opened.append(self)
+
+    monkeypatch.setattr(run, "ProgressEvents", RecordingEvents)
+    return opened
+
+
+@pytest.mark.parametrize("extra", [[], ["--stream"]])
+def test_events_file_closed_when_run_fails(tmp_path, monkeypatch, opened_events, extra):
+    # No data/input.csv or rules: the run fails right after run_started
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(FileNotFoundError):
+        run.main(["--events", "data/events.jsonl", "--cache-dir", str(tmp_path / "cache")] + extra)
+
+    [events] = opened_events
+    assert events._file is None
+    with open(tmp_path / "data" / "events.jsonl", encoding="utf-8") as f:
+        assert json.loads(f.readline())["event"] == "run_started"
+
+
+def test_trace_saved_when_run_fails(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    # Left by an earlier attempt: must be replaced, not counted twice
+    (tmp_path / "data" / "trace.json").write_text('{"trace": {"stages": {"execute": {"count": 9}}}}')
+    with pytest.raises(FileNotFoundError):
+        run.main(["--events", "data/events.jsonl", "--cache-dir", str(tmp_path / "cache")])
+
+    with open(tmp_path / "data" / "trace.json", encoding="utf-8") as f:
+        saved = json.load(f)
+    assert "execute" not in saved["trace"].get("stages", {})
+    assert saved["llm_tokens"]["calls"] == 0
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from memory_monitor import PeakMemory, psutil
+from sandbox import execute
+
+UPPER = "def apply_rule(df):\n    df['name'] = df['name'].str.upper()\n    return df\n"
+CHAINED = "def apply_rule(df):\n    df['n'][df['n'] > 1] = 0\n    return df\n"
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({"name": ["a", "b", "c"], "n": np.array([1, 2, 3])})
+
+
+def test_cow_copies_only_modified_columns(df):
+    original = df.copy()
+    df_after, issues = execute(UPPER, df, copy_mode="cow")
+
+    pd.testing.assert_frame_equal(df, original)
+    assert df_after["name"].tolist() == ["A", "B", "C"]
+    assert issues == []
+    # The untouched column was never copied
+    assert np.shares_memory(df_after["n"].to_numpy(), df["n"].to_numpy())
+
+
+def test_deep_copies_every_column(df):
+    df_after, _ = execute(UPPER, df, copy_mode="deep")
+    assert not np.shares_memory(df_after["n"].to_numpy(), df["n"].to_numpy())
+
+
+# The deep-copy rerun still warns about the chained assignment itself
+@pytest.mark.filterwarnings("ignore::FutureWarning", "ignore::pandas.errors.SettingWithCopyWarning")
+def test_chained_assignment_reruns_on_a_deep_copy(df):
+    original = df.copy()
+    df_after, _ = execute(CHAINED, df, copy_mode="cow")
+
+    assert df_after["n"].tolist() == [1, 0, 0]
+    pd.testing.assert_frame_equal(df, original)
+
+
+def test_unknown_copy_mode(df):
+    with pytest.raises(ValueError, match="Unknown copy_mode"):
+        execute(UPPER, df, copy_mode="shallow")
+
+
+@pytest.mark.skipif(psutil is None, reason="psutil is not installed")
+def test_peak_memory_sees_a_temporary_allocation():
+    with PeakMemory() as memory:
+        block = np.ones(64 * 1024 * 1024 // 8)
+        del block
+
+    stats = memory.as_dict()
+    assert stats["peak_rss_mb"] >= stats["baseline_rss_mb"] + 32
+    assert stats["peak_delta_mb"] == round(stats["peak_rss_mb"] - stats["baseline_rss_mb"], 2)
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sandbox import execute
+from sandbox_pool import SandboxCrashed, SandboxMemoryExceeded, SandboxPool, SandboxTimeout, psutil
+
+TYPES_SEEN = '''
+def apply_rule(df):
+    df["as_str"] = df["name"].astype(str)
+    df["name_type"] = df["name"].apply(lambda v: type(v).__name__)
+    df["na_type"] = df["with_na"].apply(lambda v: type(v).__name__)
+    df["none_type"] = df["with_none"].apply(lambda v: type(v).__name__)
+    df["empty_type"] = df["empty"].apply(lambda v: type(v).__name__)
+    df["made_nan"] = df["name"].where(df["number"] > 1, np.nan)
+    df["made_none"] = df["name"].where(df["number"] > 1, None)
+    return df
+'''
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with SandboxPool(workers=1) as pool:
+        yield pool
+
+
+def frame():
+    return pd.DataFrame({
+        "name": ["a", np.nan, "c"],
+        "number": [1.0, None, 3.0],
+        "with_na": ["x", pd.NA, "y"],
+        "with_none": ["x", None, "y"],
+        "empty": [np.nan] * 3,
+        "nullable": pd.array([1, None, 2], dtype="Int64"),
+        "when": pd.to_datetime(["2024-01-01", None, "2024-03-01"]),
+    })
+
+
+def test_same_result_as_in_process(pool):
+    df = frame()
+    expected, _ = execute(TYPES_SEEN, df)
+    actual, _ = pool.execute(TYPES_SEEN, df)
+    pd.testing.assert_frame_equal(actual, expected)
+    assert actual["as_str"].tolist() == ["a", "nan", "c"]
+    assert actual["name_type"].tolist() == ["str", "float", "str"]
+
+
+def test_mixed_nulls_are_kept(pool):
+    df = pd.DataFrame({"name": ["a", None, np.nan, pd.NA]})
+    code = "def apply_rule(df):\n    df['kind'] = df['name'].apply(lambda v: type(v).__name__)\n    return df\n"
+    expected, _ = execute(code, df)
+    actual, _ = pool.execute(code, df)
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_object_columns_keep_their_python_values(pool):
+    df = pd.DataFrame({
+        "ints": pd.Series([1, 2, 3], dtype=object),
+        "ints_none": pd.Series([1, None, 3], dtype=object),
+        "floats_none": pd.Series([1.5, None, 2.5], dtype=object),
+        "flags": pd.Series([True, False, None], dtype=object),
+    })
+    code = (
+        "def apply_rule(df):\n"
+        "    for col in list(df.columns):\n"
+        "        df[col + '_types'] = df[col].apply(lambda v: type(v).__name__)\n"
+        "    return df\n"
+    )
+    expected, _ = execute(code, df.copy())
+    actual, _ = pool.execute(code, df)
+    pd.testing.assert_frame_equal(actual, expected)
+    assert actual["ints"].dtype == object
+    assert actual["ints_none_types"].tolist() == ["int", "NoneType", "int"]
+
+
+def test_crash_reports_exit_code():
+    code = "def apply_rule(df):\n    import os\n    os._exit(3)\n"
+    with SandboxPool(workers=1) as pool:
+        with pytest.raises(SandboxCrashed, match="exited with code 3"):
+            pool.execute(code, pd.DataFrame({"a": [1]}))
+        # The crashed worker is replaced
+        assert pool.execute("def apply_rule(df):\n    return df\n", pd.DataFrame({"a": [1]}))[0]["a"].tolist() == [1]
+
+
+IDENTITY = "def apply_rule(df):\n    return df\n"
+
+
+def test_timeout_kills_the_worker():
+    code = "def apply_rule(df):\n    import time\n    time.sleep(30)\n    return df\n"
+    with SandboxPool(workers=1, timeout=0.5) as pool:
+        pid = pool._idle.queue[0].process.pid
+        with pytest.raises(SandboxTimeout, match="did not finish within 0.5s"):
+            pool.execute(code, pd.DataFrame({"a": [1]}))
+        assert pool._idle.queue[0].process.pid != pid
+        assert pool.execute(IDENTITY, pd.DataFrame({"a": [1]}))[0]["a"].tolist() == [1]
+        assert pool.stats["timeouts"] == 1
+
+
+@pytest.mark.skipif(psutil is None, reason="psutil is not installed")
+def test_memory_limit_kills_the_worker():
+    code = "def apply_rule(df):\n    import time\n    block = np.ones(2 ** 30 // 8)\n    time.sleep(30)\n    return df\n"
+    with SandboxPool(workers=1, timeout=20, max_rss_mb=512) as pool:
+        with pytest.raises(SandboxMemoryExceeded, match="more than 512 MB"):
+            pool.execute(code, pd.DataFrame({"a": [1]}))
+        assert pool.stats["memory_kills"] == 1
+
+
+def test_frames_travel_through_shared_memory(pool):
+    df = pd.DataFrame({"a": np.arange(1000), "b": ["x"] * 1000})
+    pool.execute(IDENTITY, df)
+    assert pool.last_call["transfer"] == "arrow"
@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+
+from llms.scheduler import LLMScheduler, RateLimited, RetryableLLMError, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def flaky(failures, retry_after=None):
+    calls = []
+
+    def call_fn(prompt):
+        calls.append(prompt)
+        if len(calls) <= failures:
+            raise RetryableLLMError("HTTP 503", retry_after=retry_after)
+        return "ok"
+
+    return call_fn, calls
+
+
+def test_server_error_backoff_uses_injected_sleep():
+    clock = FakeClock()
+    scheduler = LLMScheduler(requests_per_minute=None, clock=clock, sleep=clock.sleep)
+    call_fn, calls = flaky(2)
+
+    assert scheduler.submit(call_fn, "prompt") == "ok"
+    assert len(calls) == 3
+    # Exponential backoff (1s, 2s) plus up to 0.5s of jitter, on the fake clock only
+    assert [int(s) for s in clock.sleeps] == [1, 2]
+    assert scheduler.metrics()["server_errors"] == 2
+    assert scheduler.last_call()["retries"] == 2
+
+
+def test_server_retry_after_is_honoured_and_retries_are_bounded():
+    clock = FakeClock()
+    scheduler = LLMScheduler(requests_per_minute=None, max_retries=2, clock=clock, sleep=clock.sleep)
+    call_fn, calls = flaky(10, retry_after=7)
+
+    with pytest.raises(RuntimeError, match="after 2 retries"):
+        scheduler.submit(call_fn, "prompt")
+    assert len(calls) == 3
+    assert all(7 <= s <= 7.5 for s in clock.sleeps)
+
+
+def test_token_bucket_refills_and_carries_debt():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=4, clock=clock)
+
+    bucket.take(4)
+    assert bucket.wait_time(1) == 0.5
+    # A response larger than estimated leaves the bucket in debt
+    bucket.take(2)
+    assert bucket.wait_time(1) == 1.5
+    clock.now += 10
+    assert bucket.level == -2 and bucket.wait_time(4) == 0
+    # More than capacity only needs a full bucket
+    assert bucket.wait_time(100) == 0
+
+
+def test_requests_per_minute_spaces_calls_out():
+    # 10 requests a second with room for one: three calls take about 0.2s
+    scheduler = LLMScheduler(requests_per_minute=600, burst_seconds=0.1)
+    start = time.monotonic()
+    for _ in range(3):
+        scheduler.submit(lambda prompt: "ok", "prompt")
+    assert time.monotonic() - start >= 0.15
+
+
+def test_waiting_calls_go_by_priority():
+    scheduler = LLMScheduler(requests_per_minute=None, max_concurrency=1)
+    release = threading.Event()
+    order = []
+
+    def call_fn(prompt):
+        if prompt == "first":
+            release.wait(timeout=5)
+        order.append(prompt)
+        return "ok"
+
+    threads = [threading.Thread(target=scheduler.submit, args=(call_fn, "first"))]
+    threads[0].start()
+    for priority in ("audit", "interpret", "generate"):
+        thread = threading.Thread(target=scheduler.submit, args=(call_fn, priority), kwargs={"priority": priority})
+        thread.start()
+        threads.append(thread)
+        while scheduler.metrics()["waiting"] < len(threads) - 1:
+            time.sleep(0.001)
+
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == ["first", "generate", "interpret", "audit"]
+    assert set(scheduler.metrics()["by_priority"]) == {"default", "audit", "interpret", "generate"}
+
+
+def test_rate_limit_cuts_the_rate_and_recovers():
+    clock = FakeClock()
+    scheduler = LLMScheduler(requests_per_minute=None, recovery_seconds=10, clock=clock, sleep=clock.sleep)
+    throttled = []
+
+    def call_fn(prompt):
+        if len(throttled) < 2:
+            throttled.append(prompt)
+            raise RateLimited("HTTP 429", retry_after=0)
+        return "ok"
+
+    assert scheduler.submit(call_fn, "prompt") == "ok"
+    metrics = scheduler.metrics()
+    assert (metrics["throttled"], metrics["retries"]) == (2, 2)
+    assert metrics["rate_fraction"] == 0.49
+
+    # A success raises the rate again only once recovery_seconds have passed
+    scheduler.submit(call_fn, "prompt")
+    assert scheduler.metrics()["rate_fraction"] == 0.49
+    clock.now += 10
+    scheduler.submit(call_fn, "prompt")
+    assert scheduler.metrics()["rate_fraction"] == 0.59
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from csv_read_toon import profile_column
+from sketches import ColumnSketch, HyperLogLog, QuantileSketch, hash_values
+from stream_profile import profile_csv
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 500
+    df = pd.DataFrame({
+        "id": np.arange(n),
+        # Nulls only in some chunks: those read as float64, the rest as int64
+        "qty": np.where(np.arange(n) % 97 == 0, np.nan, rng.integers(0, 50, n)),
+        "price": rng.normal(20, 5, n).round(2),
+        "country": rng.choice(["usa", "uk", "fr", None], n),
+    })
+    path = tmp_path / "orders.csv"
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def assert_same_profile(streamed, exact):
+    assert streamed.keys() == exact.keys()
+    for key, value in exact.items():
+        if key == "Descriptive_Stats":
+            assert streamed[key].keys() == value.keys()
+            for stat, expected in value.items():
+                assert streamed[key][stat] == (expected if isinstance(expected, str) else pytest.approx(expected))
+        else:
+            assert streamed[key] == value
+
+
+def test_small_file_profile_is_exact(csv_path):
+    full = pd.read_csv(csv_path)
+    profile = profile_csv(csv_path, chunksize=60, max_workers=1)
+
+    assert profile.rows == len(full)
+    for col, streamed in profile.profiles().items():
+        assert "Approximate" not in streamed
+        assert_same_profile(streamed, profile_column(full[col], len(full)))
+    assert len(profile.sample.rows) == 3
+
+
+def test_profile_does_not_depend_on_workers(csv_path):
+    one = profile_csv(csv_path, chunksize=60, max_workers=1)
+    two = profile_csv(csv_path, chunksize=60, max_workers=2)
+    assert one.profiles() == two.profiles()
+    pd.testing.assert_frame_equal(one.sample.rows, two.sample.rows)
+
+
+def test_large_columns_fall_back_to_sketches():
+    rng = np.random.default_rng(1)
+    values = pd.Series(rng.lognormal(3, 1, 50_000))
+    sketch = ColumnSketch(max_exact=1000)
+    for start in range(0, len(values), 5_000):
+        sketch.update(values[start:start + 5_000])
+
+    profile, approximate = sketch.profile(len(values))
+    assert approximate == ["Unique_Values_Count", "Descriptive_Stats.25%", "Descriptive_Stats.50%",
+                           "Descriptive_Stats.75%"]
+    assert profile["Unique_Values_Count"] == pytest.approx(values.nunique(), rel=0.03)
+    for q in ("25%", "50%", "75%"):
+        assert profile["Descriptive_Stats"][q] == pytest.approx(values.quantile(float(q[:-1]) / 100), rel=0.02)
+    # Moments stay exact
+    assert profile["Descriptive_Stats"]["std"] == pytest.approx(values.std())
+
+
+def test_merged_sketches_equal_the_sketch_of_the_whole():
+    values = pd.Series(np.random.default_rng(2).normal(0, 100, 20_000))
+    first, second = values[:7_000], values[7_000:]
+
+    whole, merged = HyperLogLog(), HyperLogLog()
+    whole.add_hashes(hash_values(values))
+    merged.add_hashes(hash_values(first))
+    other = HyperLogLog()
+    other.add_hashes(hash_values(second))
+    merged.merge(other)
+    np.testing.assert_array_equal(merged.registers, whole.registers)
+
+    whole_q, merged_q, other_q = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    whole_q.add(values.to_numpy())
+    merged_q.add(first.to_numpy())
+    other_q.add(second.to_numpy())
+    merged_q.merge(other_q)
+    assert [merged_q.quantile(q) for q in (0.1, 0.5, 0.9)] == [whole_q.quantile(q) for q in (0.1, 0.5, 0.9)]
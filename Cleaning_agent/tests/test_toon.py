@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import toon
+from rules_read_toon import convert_toon
+
+
+@pytest.mark.parametrize("text", [
+    "plain", "a, b", "key: value", '"quoted"', " padded ", "", "null", "true", "42", "-1.5e3",
+    "line\nbreak", "[x]", "{y}", "naïve",
+])
+def test_strings_that_could_be_misread_round_trip(text):
+    assert toon.loads(toon.dumps({"value": text})) == {"value": text}
+    assert toon.loads(toon.dumps({"values": [text, "other"]})) == {"values": [text, "other"]}
+
+
+def test_nested_document_round_trips():
+    data = {
+        "File": "orders.csv",
+        "Rows": 3,
+        "Ratio": 0.25,
+        "Flags": {"sorted": False, "owner": None},
+        "Columns[]": ["a", "b"],
+        "Table": [{"name": "a", "n": 1}, {"name": "b, c", "n": None}],
+        "Mixed": [1, {"k": "v"}, [2, 3]],
+    }
+    assert toon.loads(toon.dumps(data)) == data
+
+
+def test_frames_are_written_as_tables():
+    df = pd.DataFrame({
+        "name": ["a", None, "c, d"],
+        "n": [1.5, np.nan, 3.0],
+        "flag": [True, False, True],
+        "when": pd.to_datetime(["2024-01-01", None, "2024-03-01"]),
+    })
+    text = toon.dumps({"Sheet": df})
+
+    assert text.splitlines()[0] == "Sheet[3]{name,n,flag,when}:"
+    assert toon.loads(text) == {"Sheet": [
+        {"name": "a", "n": 1.5, "flag": True, "when": "2024-01-01 00:00:00"},
+        {"name": None, "n": None, "flag": False, "when": None},
+        {"name": "c, d", "n": 3.0, "flag": True, "when": "2024-03-01 00:00:00"},
+    ]}
+
+
+def test_rule_sheets_round_trip_through_the_rules_reader(tmp_path):
+    sheet = pd.DataFrame({"Name": ["R1", "R2"],
+                          "description": ['Trim "Email", then flag blanks', "Standardize\ncountry"]})
+    convert_toon({"Rules": sheet}, "rules.xlsx", output_folder=str(tmp_path))
+
+    with open(tmp_path / "rules.toon", encoding="utf-8") as f:
+        assert toon.load(f) == {"rules.xlsx": {"Rules": sheet.to_dict("records")}}
+
+
+def test_metadata_documents_decode():
+    from csv_read_toon import generate_metadata_toon_from_df
+
+    df = pd.DataFrame({"name": [" a", "b", None], "n": [1, 2, 3]})
+    metadata = toon.loads(generate_metadata_toon_from_df(df, file_name="orders"))
+
+    assert metadata["File_Name"] == "orders"
+    assert metadata["Sample_Rows_Head_3"] == [{"name": " a", "n": 1}, {"name": "b", "n": 2}, {"name": None, "n": 3}]
+    assert metadata["Column_Details"]["name"]["Null_Count"] == 1
+    assert metadata["Column_Details"]["n"]["Descriptive_Stats"]["mean"] == 2.0
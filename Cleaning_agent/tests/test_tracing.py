@@ -0,0 +1,51 @@
+import pytest
+
+import orchestrator
+from llms.base import LLMClient
+from llms.replay import ReplayCall
+from state import PipelineState
+from tracing import Tracer
+
+
+def test_spans_record_attributes_llm_deltas_and_errors():
+    tracer = Tracer()
+    counters = {"calls": 0, "prompt_tokens": 0}
+
+    with tracer.span("generate", rule_index=0, attempt=1, llm_stats=lambda: dict(counters)) as span:
+        counters.update(calls=2, prompt_tokens=150)
+        span["code_lines"] = 12
+    with pytest.raises(ValueError):
+        with tracer.span("execute", rule_index=0, peak_rss_mb=80.0):
+            raise ValueError("bad code")
+    with tracer.span("generate", rule_index=1, peak_rss_mb=95.5):
+        pass
+
+    first, failed, _ = tracer.spans
+    assert (first["llm_calls"], first["llm_prompt_tokens"], first["code_lines"]) == (2, 150, 12)
+    assert "llm_retries" not in first
+    assert failed["error"] == "ValueError"
+
+    totals = tracer.stage_totals()
+    assert (totals["generate"]["count"], totals["generate"]["llm_calls"]) == (2, 2)
+    assert set(tracer.rule_timings(0)) == {"generate", "execute"}
+    trace = tracer.as_dict()
+    assert trace["peak_rss_mb"] == 95.5
+    assert [s["start"] for s in trace["spans"]] == sorted(s["start"] for s in trace["spans"])
+
+
+def test_pipeline_traces_every_stage(bench):
+    df = bench.make_dataset(200)
+    tracer = Tracer()
+    state = PipelineState(df=df)
+    orchestrator.run_pipeline(state=state, rules=bench.BENCH_RULES,
+                              metadata_toon=orchestrator.generate_metadata_toon_from_df(df),
+                              llm=LLMClient(ReplayCall(bench.FIXTURE_PATH, match_key=bench.rule_match_key)),
+                              tracer=tracer)
+
+    totals = tracer.stage_totals()
+    assert {"interpret", "generate", "validate", "verify", "execute", "diff", "audit", "metadata",
+            "checkpoint"} <= set(totals)
+    assert totals["generate"]["llm_calls"] >= 6
+    assert all(span["peak_rss_mb"] is not None for span in tracer.spans if span["stage"] == "execute")
+    # Each rule's history entry carries its own stage timings
+    assert {"generate", "execute"} <= set(state.history[0]["timings"])
@@ -0,0 +1,399 @@
+"""
+TOON encoder and decoder shared by the metadata and rule readers.
+
+Format (indentation is two spaces per level):
+
+    key: value                    scalar
+    key:                          nested object, fields indented below
+    key[3]: a,b,c                 list of scalars
+    key[2]{col1,col2}:            table: list of dicts with the same keys
+      1,x
+      2,"y, z"
+    key[2]:                       any other list, one "- " item per line
+      - value
+      -
+        field: value
+
+Scalars are null, true, false, numbers and strings. A string is quoted
+(JSON escapes) when it could be misread: it contains , : " [ ] { } or a
+control character, has leading/trailing whitespace, is empty, or looks
+like null/true/false or a number. NaN, NaT and None all encode as null.
+
+DataFrames are written as tables column-wise: each column is formatted
+with vectorised pandas operations in blocks of CHUNK_ROWS rows, and the
+rows are written straight to the output stream.
+
+    dump(data, stream)      dumps(data) -> str
+    load(stream)            loads(text) -> dict / list / scalar
+
+Decoding is not type-preserving for values JSON can't hold either
+(timestamps come back as strings); tables come back as lists of dicts.
+"""
+import io
+import json
+import math
+import numbers
+import re
+import sys
+
+INDENT = "  "
+CHUNK_ROWS = 50_000
+
+_NEEDS_QUOTES_RE = re.compile(
+    r'[,:"\[\]{}\\\x00-\x1f]|^\s|\s$|^$|^(?:null|true|false|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)$'
+)
+_INT_RE = re.compile(r"-?\d+")
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_CELL_RE = re.compile(r',((?:[^,"]+|"(?:[^"\\]+|\\.)*")*)')
+_HEADER_RE = re.compile(r"\[(\d+)\](?:\{(.*)\})?:(?: (.*))?$")
+
+
+def _quote(text):
+    return json.dumps(text, ensure_ascii=False)
+
+
+def _format_string(text):
+    return _quote(text) if _NEEDS_QUOTES_RE.search(text) else text
+
+
+def _is_missing(value):
+    try:
+        return bool(value != value)
+    except (TypeError, ValueError):
+        # pd.NA refuses to become a bool
+        return True
+
+
+def format_scalar(value):
+    """
+    One scalar as it appears in TOON.
+    """
+    if value is None:
+        return "null"
+    if isinstance(value, str):
+        return _format_string(value)
+    if isinstance(value, bool) or type(value).__name__ == "bool_":
+        return "true" if value else "false"
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        return repr(value) if math.isfinite(value) else "null"
+    if _is_missing(value):
+        return "null"
+    return _format_string(str(value))
+
+
+def _format_key(key):
+    # A key starting with "-" would read as a list item
+    key = str(key)
+    return _quote(key) if key.startswith("-") else _format_string(key)
+
+
+# ---------------- encoder ----------------
+
+def _is_frame(value):
+    # pandas is only needed if the caller already passes frames
+    pd = sys.modules.get("pandas")
+    return pd is not None and isinstance(value, pd.DataFrame)
+
+
+def _is_scalar(value):
+    return not isinstance(value, (dict, list, tuple)) and not _is_frame(value)
+
+
+def _table_fields(items):
+    """
+    The shared keys if items is a non-empty list of dicts with the same keys
+    and only scalar values, else None.
+    """
+    if not items or not isinstance(items[0], dict):
+        return None
+    keys = list(items[0].keys())
+    for item in items:
+        if not isinstance(item, dict) or list(item.keys()) != keys:
+            return None
+        if not all(_is_scalar(v) for v in item.values()):
+            return None
+    return keys
+
+
+def _format_column(series):
+    """
+    The TOON cells of one column, formatted without a per-cell Python loop
+    wherever the dtype allows it.
+    """
+    import numpy as np
+    import pandas as pd
+
+    kind = series.dtype.kind if isinstance(series.dtype, np.dtype) else "O"
+    if kind == "b":
+        return pd.Series(np.where(series.to_numpy(), "true", "false"), index=series.index, dtype=object)
+    if kind in "iu":
+        return series.astype(str).astype(object)
+    if kind == "f":
+        values = series.to_numpy()
+        cells = series.astype(str).astype(object)
+        cells[~np.isfinite(values)] = "null"
+        return cells
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    elif kind in "mM" or pd.api.types.infer_dtype(series, skipna=True) in ("string", "empty"):
+        codes, uniques = pd.factorize(series)
+    else:
+        # Mixed Python objects: factorize could merge 1, 1.0 and True
+        return series.astype(object).map(format_scalar)
+
+    # Text columns repeat a few values a lot: format each distinct value once
+    # and gather, with code -1 (missing) picking the trailing "null"
+    labels = np.array([format_scalar(u) for u in uniques] + ["null"], dtype=object)
+    return pd.Series(labels[codes], index=series.index)
+
+
+def _write_frame_rows(df, stream, prefix):
+    for start in range(0, len(df), CHUNK_ROWS):
+        chunk = df.iloc[start:start + CHUNK_ROWS]
+        columns = [_format_column(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+        if not columns:
+            rows = [""] * len(chunk)
+        elif len(columns) == 1:
+            rows = columns[0]
+        else:
+            rows = columns[0].str.cat(columns[1:], sep=",")
+        stream.write(prefix)
+        stream.write(("\n" + prefix).join(rows))
+        stream.write("\n")
+
+
+def _write_table(key, items, fields, stream, indent):
+    prefix = INDENT * indent
+    header = ",".join(_format_key(f) for f in fields)
+    # Rows without fields would be blank lines: write such a table as empty
+    length = len(items) if len(fields) else 0
+    stream.write(f"{prefix}{key}[{length}]{{{header}}}:\n")
+    if _is_frame(items):
+        if len(items) and len(fields):
+            _write_frame_rows(items, stream, prefix + INDENT)
+        return
+    for item in items:
+        stream.write(prefix + INDENT + ",".join(format_scalar(item[f]) for f in fields) + "\n")
+
+
+def _write_value(key, value, stream, indent):
+    """
+    Writes "key..." for one value at this indent. key is already formatted
+    ("" for list items and the root).
+    """
+    prefix = INDENT * indent
+
+    if _is_frame(value):
+        _write_table(key, value, list(value.columns), stream, indent)
+    elif isinstance(value, dict):
+        stream.write(f"{prefix}{key}:\n")
+        _write_object(value, stream, indent + 1)
+    elif isinstance(value, (list, tuple)):
+        value = list(value)
+        fields = _table_fields(value)
+        if fields is not None:
+            _write_table(key, value, fields, stream, indent)
+        elif all(_is_scalar(v) for v in value):
+            cells = ",".join(format_scalar(v) for v in value)
+            stream.write(f"{prefix}{key}[{len(value)}]:{' ' + cells if value else ''}\n")
+        else:
+            stream.write(f"{prefix}{key}[{len(value)}]:\n")
+            for item in value:
+                _write_item(item, stream, indent + 1)
+    else:
+        stream.write(f"{prefix}{key}: {format_scalar(value)}\n")
+
+
+def _write_item(item, stream, indent):
+    prefix = INDENT * indent
+    if isinstance(item, dict):
+        stream.write(f"{prefix}-\n")
+        _write_object(item, stream, indent + 1)
+    elif _is_scalar(item):
+        stream.write(f"{prefix}- {format_scalar(item)}\n")
+    else:
+        # Nested list or table: "- [N]..." with its rows below
+        inner = io.StringIO()
+        _write_value("", item, inner, indent)
+        stream.write(f"{prefix}- {inner.getvalue()[len(prefix):]}")
+
+
+def _write_object(data, stream, indent):
+    for key, value in data.items():
+        _write_value(_format_key(key), value, stream, indent)
+
+
+def dump(data, stream):
+    """
+    Writes data (dicts, lists, DataFrames and scalars) as TOON to a text
+    stream.
+    """
+    if isinstance(data, dict):
+        _write_object(data, stream, 0)
+    elif _is_scalar(data):
+        stream.write(format_scalar(data) + "\n")
+    else:
+        _write_value("", data, stream, 0)
+
+
+def dumps(data):
+    """
+    data as a TOON string (without the final newline).
+    """
+    stream = io.StringIO()
+    dump(data, stream)
+    return stream.getvalue().rstrip("\n")
+
+
+# ---------------- decoder ----------------
+
+def parse_scalar(token):
+    token = token.strip()
+    if token.startswith('"'):
+        return json.loads(token)
+    if token == "null":
+        return None
+    if token == "true":
+        return True
+    if token == "false":
+        return False
+    if _NUMBER_RE.fullmatch(token):
+        return int(token) if _INT_RE.fullmatch(token) else float(token)
+    return token
+
+
+def _split_cells(text):
+    if '"' not in text:
+        return text.split(",")
+    # Each cell follows a comma; quoted parts may contain commas
+    return _CELL_RE.findall("," + text)
+
+
+def _split_key(text):
+    """
+    Splits "key<rest>" into (key, rest), where rest starts at "[" or ":".
+    """
+    if text.startswith('"'):
+        decoder = json.JSONDecoder()
+        key, end = decoder.raw_decode(text)
+        return key, text[end:]
+    for i, c in enumerate(text):
+        if c in "[:":
+            return text[:i], text[i:]
+    raise ValueError(f"TOON: expected 'key:' in {text!r}")
+
+
+class _Parser:
+    def __init__(self, text):
+        self.lines = []
+        for number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            stripped = line.lstrip(" ")
+            self.lines.append(((len(line) - len(stripped)) // len(INDENT), stripped.rstrip(), number))
+        self.pos = 0
+
+    def _peek_indent(self):
+        return self.lines[self.pos][0] if self.pos < len(self.lines) else -1
+
+    def _error(self, message):
+        number = self.lines[min(self.pos, len(self.lines) - 1)][2] if self.lines else 0
+        return ValueError(f"TOON line {number}: {message}")
+
+    def parse_document(self):
+        if not self.lines:
+            return {}
+        text = self.lines[0][1]
+        if text.startswith("["):
+            self.pos = 1
+            return self._parse_header_value(text, 0)
+        if len(self.lines) == 1 and not re.match(r'^("(?:[^"\\]|\\.)*"|[^"\[:]*)(\[\d+\].*)?:', text):
+            return parse_scalar(text)
+        value = self._parse_object(0)
+        if self.pos != len(self.lines):
+            raise self._error("unexpected indentation")
+        return value
+
+    def _parse_object(self, indent):
+        result = {}
+        while self._peek_indent() == indent and not self.lines[self.pos][1].startswith("-"):
+            text = self.lines[self.pos][1]
+            self.pos += 1
+            key, rest = _split_key(text)
+            result[key] = self._parse_header_value(rest, indent)
+        return result
+
+    def _parse_header_value(self, rest, indent):
+        """
+        Value after a key: ": scalar", ":" (object), "[N]..." (list/table).
+        """
+        if rest.startswith(":"):
+            if rest[1:].strip():
+                return parse_scalar(rest[1:])
+            if self._peek_indent() > indent:
+                return self._parse_object(indent + 1)
+            return {}
+
+        match = _HEADER_RE.match(rest)
+        if match is None:
+            raise self._error(f"bad header {rest!r}")
+        length = int(match.group(1))
+        fields, inline = match.group(2), match.group(3)
+
+        if fields is not None:
+            names = [parse_scalar(f) for f in _split_cells(fields)]
+            split_rows = []
+            for _ in range(length):
+                if self._peek_indent() != indent + 1:
+                    raise self._error(f"expected {length} table rows, got {len(split_rows)}")
+                cells = _split_cells(self.lines[self.pos][1])
+                if len(cells) != len(names):
+                    raise self._error(f"expected {len(names)} cells, got {len(cells)}")
+                self.pos += 1
+                split_rows.append(cells)
+            if not split_rows:
+                return []
+
+            # Column-wise: parse each distinct token of a column once
+            columns = []
+            for tokens in zip(*split_rows):
+                parsed = {token: parse_scalar(token) for token in set(tokens)}
+                columns.append(map(parsed.__getitem__, tokens))
+            return [dict(zip(names, values)) for values in zip(*columns)]
+
+        if inline is not None:
+            values = [parse_scalar(c) for c in _split_cells(inline)]
+            if len(values) != length:
+                raise self._error(f"expected {length} values, got {len(values)}")
+            return values
+
+        items = []
+        for _ in range(length):
+            if self._peek_indent() != indent + 1 or not self.lines[self.pos][1].startswith("-"):
+                raise self._error(f"expected {length} list items, got {len(items)}")
+            items.append(self._parse_item(indent + 1))
+        return items
+
+    def _parse_item(self, indent):
+        text = self.lines[self.pos][1][1:].strip()
+        self.pos += 1
+        if not text:
+            return self._parse_object(indent + 1)
+        if text.startswith("["):
+            return self._parse_header_value(text, indent)
+        return parse_scalar(text)
+
+
+def loads(text):
+    """
+    Parses a TOON document written by dump/dumps.
+    """
+    return _Parser(text).parse_document()
+
+
+def load(stream):
+    return loads(stream.read())
@@ -0,0 +1,93 @@
+import threading
+import time
+from contextlib import contextmanager
+
+STAGES = ("interpret", "generate", "validate", "verify", "execute", "diff", "audit", "metadata", "checkpoint")
+
+# LLM counters recorded on spans as deltas (see LLMClient.token_stats)
+LLM_COUNTERS = ("calls", "cached_calls", "prompt_tokens", "response_tokens", "retries")
+
+
+class Tracer:
+    """
+    Timed spans of a pipeline run, one per stage (STAGES) per rule and
+    attempt, for finding where a slow run spent its time.
+
+        with tracer.span("generate", rule_index=3, attempt=1, llm_stats=llm.thread_token_stats) as span:
+            ...
+            span["code_lines"] = 12   # extra attributes
+
+    Each span is a flat dict {"stage", "rule_index", "attempt", "start",
+    "seconds", ...}; start is seconds since the tracer was created. With
+    llm_stats (a function returning LLM counters) the span also records
+    how many LLM calls, prompt/response tokens and retries happened
+    inside it. A span whose block raises gets "error": the exception
+    type, and the exception propagates.
+
+    Like ProgressEvents, a Tracer can always be passed around; nothing is
+    written until as_dict() is called.
+    """
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = []
+
+    @contextmanager
+    def span(self, stage, rule_index=None, attempt=None, llm_stats=None, **attrs):
+        record = {"stage": stage, "rule_index": rule_index, "attempt": attempt}
+        record.update(attrs)
+        before = llm_stats() if llm_stats is not None else None
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["start"] = round(start - self._origin, 6)
+            record["seconds"] = round(time.perf_counter() - start, 6)
+            if before is not None:
+                after = llm_stats()
+                for key in LLM_COUNTERS:
+                    delta = after.get(key, 0) - before.get(key, 0)
+                    if delta:
+                        record[f"llm_{key}"] = delta
+            with self._lock:
+                self.spans.append(record)
+
+    def stage_totals(self, rule_index=None):
+        """
+        {stage: {"count", "seconds", "max_seconds", "llm_..."}} over all
+        spans, or over one rule's spans.
+        """
+        totals = {}
+        with self._lock:
+            spans = [s for s in self.spans if rule_index is None or s["rule_index"] == rule_index]
+        for span in spans:
+            entry = totals.setdefault(span["stage"], {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += span["seconds"]
+            entry["max_seconds"] = max(entry["max_seconds"], span["seconds"])
+            for key in LLM_COUNTERS:
+                if f"llm_{key}" in span:
+                    entry[f"llm_{key}"] = entry.get(f"llm_{key}", 0) + span[f"llm_{key}"]
+        for entry in totals.values():
+            entry["seconds"] = round(entry["seconds"], 6)
+        return totals
+
+    def rule_timings(self, rule_index):
+        """
+        {stage: seconds} for one rule, for its history entry.
+        """
+        return {stage: round(entry["seconds"], 4) for stage, entry in self.stage_totals(rule_index).items()}
+
+    def as_dict(self):
+        with self._lock:
+            spans = [dict(s) for s in self.spans]
+        peaks = [s["peak_rss_mb"] for s in spans if s.get("peak_rss_mb") is not None]
+        return {
+            "stages": self.stage_totals(),
+            "peak_rss_mb": max(peaks) if peaks else None,
+            "spans": sorted(spans, key=lambda s: s["start"]),
+        }
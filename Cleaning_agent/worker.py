@@ -0,0 +1,114 @@
+"""
+Long-lived pipeline worker for the web app.
+
+Started once by jobs.JobManager and then fed one job at a time over a
+local socket, so pandas, numpy, the Gemini client (with its credentials
+and HTTP connection pool) and the pipeline modules are imported and set
+up once per worker instead of once per job:
+
+    python worker.py --address 127.0.0.1:PORT
+
+The authentication key for the socket is passed in REFINEAI_WORKER_AUTHKEY
+(hex). Messages:
+
+    worker -> app   {"type": "ready", "pid", "import_seconds"}       once
+    app -> worker   {"job_dir", "argv"}                             per job
+    worker -> app   {"ok", "error", "seconds", "dispatch_seconds"}  per job
+    app -> worker   None                                            shut down
+"""
+import time
+
+_import_started = time.perf_counter()
+
+import argparse
+import gc
+import os
+import sys
+import traceback
+from multiprocessing.connection import Client
+
+import run
+from llms.gemini_client import get_client
+
+# Create the client (and its credentials) now, not on this worker's first job
+try:
+    get_client()
+except Exception as e:
+    print(f"WARNING: Could not create the Gemini client up front ({e}); retrying on the first job.")
+
+IMPORT_SECONDS = round(time.perf_counter() - _import_started, 3)
+
+
+def run_job(job):
+    """
+    Runs run.main(job["argv"]) inside job["job_dir"], with stdout and
+    stderr (including output of C extensions) going to the job's run.log.
+    """
+    start = time.perf_counter()
+    original_cwd = os.getcwd()
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = os.dup(1), os.dup(2)
+    log = open(os.path.join(job["job_dir"], "run.log"), "w", encoding="utf-8")
+
+    try:
+        os.chdir(job["job_dir"])
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            run.main(job["argv"])
+            ok, error = True, None
+        except SystemExit as e:
+            ok = e.code in (None, 0)
+            error = None if ok else f"run.py exited with code {e.code}; see run.log."
+        except Exception as e:
+            traceback.print_exc()
+            ok, error = False, f"{type(e).__name__}: {e}"
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        for fd in saved_fds:
+            os.close(fd)
+        log.close()
+        os.chdir(original_cwd)
+
+    # Don't carry the last job's frames into the wait for the next one
+    gc.collect()
+    return {"ok": ok, "error": error, "seconds": round(time.perf_counter() - start, 3)}
+
+
+def serve(address, authkey):
+    conn = Client(address, authkey=authkey)
+    conn.send({"type": "ready", "pid": os.getpid(), "import_seconds": IMPORT_SECONDS})
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        received = time.time()
+        result = run_job(job)
+        result["dispatch_seconds"] = round(received - job["sent_at"], 4)
+        conn.send(result)
+
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm pipeline worker (started by the web app)")
+    parser.add_argument("--address", required=True, help="host:port of the app's listener")
+    args = parser.parse_args()
+
+    host, port = args.address.rsplit(":", 1)
+    authkey = bytes.fromhex(os.environ["REFINEAI_WORKER_AUTHKEY"])
+    serve((host, int(port)), authkey)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,40 @@
-from flask import Flask, request, jsonify, send_from_directory, redirect, session
-import subprocess
+from flask import Flask, Response, request, jsonify, send_from_directory, redirect, session, stream_with_context
 import os
 import json
+import threading
 from functools import wraps
 from Cleaning_agent.rules_read_toon import read_excel
+from jobs import JobManager, QueueFull, NotResumable
 
 app = Flask(__name__, static_folder="template", static_url_path="")
 app.secret_key = "refineai-secret-key"
 
-DATA_DIR = os.path.join("Cleaning_agent", "data")
+# Pipelines run in the background, at most JOB_WORKERS at a time, each in
+# its own directory under jobs/
+JOB_WORKERS = int(os.environ.get("REFINEAI_JOB_WORKERS", "2"))
+JOB_QUEUE_LIMIT = int(os.environ.get("REFINEAI_JOB_QUEUE_LIMIT", "20"))
+# Keep one warm worker process per job slot instead of a fresh interpreter per job
+WARM_WORKERS = os.environ.get("REFINEAI_WARM_WORKERS", "1") != "0"
+# The app's whole LLM quota, shared out among the job slots
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get("REFINEAI_LLM_RPM", "60"))
+LLM_TOKENS_PER_MINUTE = int(os.environ.get("REFINEAI_LLM_TPM", "0"))
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """
+    The JobManager, created on first use so that importing app touches no
+    files and starts no worker processes.
+    """
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager("jobs", max_workers=JOB_WORKERS, max_queued=JOB_QUEUE_LIMIT, warm=WARM_WORKERS,
+                                      llm_requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                                      llm_tokens_per_minute=LLM_TOKENS_PER_MINUTE)
+    return _job_manager
 
 # ---------------- AUTH GUARD ----------------
 
@@ -94,6 +120,20 @@ def comparison():
 
 # ---------------- PIPELINE ----------------
 
+def _user_job(job_id):
+    """
+    The job record if it exists and belongs to the logged-in user, else None.
+    Without an explicit id, the user's most recent job is used.
+    """
+    job_id = job_id or session.get("last_job_id")
+    if not job_id:
+        return None
+    job = get_job_manager().get(job_id)
+    if job is None or job["user"] != session["user"]:
+        return None
+    return job
+
+
 @app.route("/run", methods=["POST"])
 @login_required
 def run_cleaner():
@@ -102,42 +142,150 @@ def run_cleaner():
 
     file = request.files["file"]
     rules_file = request.files["rules"]
+    job_manager = get_job_manager()
+
+    try:
+        job_id = job_manager.create(user=session["user"])
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503
 
-    os.makedirs(DATA_DIR, exist_ok=True)
+    job_data_dir = job_manager.data_dir(job_id)
 
-    input_path = os.path.join(DATA_DIR, "input.csv")
+    input_path = os.path.join(job_data_dir, "input.csv")
     # Save rules as rules.xlsx so converter picks it up and makes rules.toon
-    rules_excel_path = os.path.join(DATA_DIR, "rules.xlsx")
+    rules_excel_path = os.path.join(job_data_dir, "rules.xlsx")
 
     file.save(input_path)
     rules_file.save(rules_excel_path)
 
     # Convert Excel rules to TOON format
-    # This will generate 'rules.toon' in DATA_DIR
+    # This will generate 'rules.toon' in the job's data dir
     try:
-        read_excel(rules_excel_path, output_folder=DATA_DIR)
+        read_excel(rules_excel_path, output_folder=job_data_dir)
     except Exception as e:
+        job_manager.fail(job_id, f"Failed to process rules file: {str(e)}")
         return jsonify({"error": f"Failed to process rules file: {str(e)}"}), 500
 
-    # Run the pipeline
-    # We must run inside Cleaning_agent dir so run.py can find 'data/'
-    subprocess.run(["python", "run.py"], cwd="Cleaning_agent")
+    # Run the pipeline in the background; the client polls /api/jobs/<id>
+    job_manager.submit(job_id)
+    session["last_job_id"] = job_id
+
+    job = job_manager.get(job_id)
+    return jsonify({"job_id": job_id, "status": job["status"], "position": job["position"]}), 202
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+@login_required
+def job_status(job_id):
+    job = _user_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify(job)
+
+
+@app.route("/api/jobs/<job_id>/resume", methods=["POST"])
+@login_required
+def resume_job(job_id):
+    """
+    Re-runs a failed job from its first incomplete rule.
+    """
+    job = _user_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    try:
+        get_job_manager().resume(job["id"])
+    except NotResumable as e:
+        return jsonify({"error": str(e)}), 409
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503
+
+    job = get_job_manager().get(job["id"])
+    return jsonify({"job_id": job["id"], "status": job["status"], "position": job["position"]}), 202
+
+
+@app.route("/api/workers", methods=["GET"])
+@login_required
+def worker_metrics():
+    return jsonify(get_job_manager().metrics())
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """
+    Job, stage timing and LLM usage metrics for a Prometheus scraper (no
+    login: it holds counts only, nothing about a user's data).
+    """
+    return Response(get_job_manager().prometheus_metrics(), mimetype="text/plain; version=0.0.4")
 
-    return jsonify({"status": "completed"})
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+@login_required
+def job_events(job_id):
+    """
+    Server-Sent Events stream of the job's progress events. Each message's
+    id is the event's sequence number, so a reconnecting EventSource
+    resumes after the last event it saw (Last-Event-ID). The stream ends
+    with a job_finished event. The event type is the "event" field of
+    each message's JSON data.
+    """
+    job = _user_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+
+    after = request.headers.get("Last-Event-ID") or request.args.get("after") or "0"
+    try:
+        last_seq = int(after)
+    except ValueError:
+        return jsonify({"error": f"Last-Event-ID / after must be an event number, not {after!r}."}), 400
+
+    buffer = get_job_manager().events(job_id)
+
+    def stream():
+        seq = last_seq
+        while True:
+            events, missed, closed = buffer.wait_after(seq)
+            if closed:
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            if missed:
+                # This client fell behind the bounded buffer
+                yield f"data: {json.dumps({'event': 'missed', 'count': missed})}\n\n"
+            for event in events:
+                yield f"id: {event['seq']}\ndata: {json.dumps(event, default=str)}\n\n"
+                seq = event["seq"]
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/download", methods=["GET"])
+@app.route("/download/<job_id>", methods=["GET"])
 @login_required
-def download():
-    return send_from_directory(DATA_DIR, "cleaned_output.csv", as_attachment=True)
+def download(job_id=None):
+    job = _user_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    if job["status"] != "completed":
+        return jsonify({"error": f"Job is {job['status']}."}), 409
+    return send_from_directory(get_job_manager().data_dir(job["id"]), "cleaned_output.csv", as_attachment=True)
 
 
 @app.route("/api/results", methods=["GET"])
+@app.route("/api/results/<job_id>", methods=["GET"])
 @login_required
-def get_results():
-    results_path = os.path.join(DATA_DIR, "results.json")
-    if not os.path.exists(results_path):
+def get_results(job_id=None):
+    job = _user_job(job_id)
+    if job is None:
         return jsonify({"error": "No results available. Please run the pipeline first."}), 404
+
+    results_path = os.path.join(get_job_manager().data_dir(job["id"]), "results.json")
+    if not os.path.exists(results_path):
+        return jsonify({"error": f"No results available yet (job is {job['status']})."}), 404
     
     with open(results_path, "r", encoding="utf-8") as f:
         data = json.load(f)
@@ -145,4 +293,9 @@ def get_results():
 
 
 if __name__ == "__main__":
+    # Start the warm workers with the server rather than on the first
+    # request. Under the debug reloader this file also runs in the
+    # file-watcher process, which never serves requests.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        get_job_manager()
     app.run(debug=True)
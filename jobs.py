@@ -0,0 +1,680 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Listener
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Cleaning_agent")
+RUN_SCRIPT = os.path.join(AGENT_DIR, "run.py")
+WORKER_SCRIPT = os.path.join(AGENT_DIR, "worker.py")
+LLM_CACHE_DIR = os.path.join(AGENT_DIR, ".llm_cache")
+# Shared by all jobs: a rulebook compiled by one job is reused by the next
+RULE_PACK_PATH = os.path.join(AGENT_DIR, "rule_pack.json")
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Pipeline stages reported by /metrics (Cleaning_agent/tracing.py STAGES)
+TRACE_STAGES = ("interpret", "generate", "validate", "verify", "execute", "diff", "audit", "metadata", "checkpoint")
+LLM_COUNTERS = ("calls", "cached_calls", "prompt_tokens", "response_tokens", "retries")
+
+# Written by run.py's CheckpointStore after every completed rule (relative to the job directory)
+RUN_STATE_PATH = os.path.join("checkpoints", "run_state.json")
+
+EVENT_POLL_SECONDS = 0.25
+WORKER_START_TIMEOUT = 120
+
+
+class QueueFull(Exception):
+    pass
+
+
+class NotResumable(Exception):
+    pass
+
+
+class WorkerDied(Exception):
+    pass
+
+
+class WarmWorker:
+    """
+    App-side handle of one long-lived worker.py process.
+
+    The worker imports the pipeline and creates the Gemini client once;
+    run() then hands it jobs over a local authenticated socket. startup
+    time is measured from spawning the process to its "ready" message.
+    """
+
+    def __init__(self, start_timeout=WORKER_START_TIMEOUT):
+        authkey = os.urandom(16)
+        listener = Listener(("127.0.0.1", 0), authkey=authkey)
+        host, port = listener.address
+
+        started = time.perf_counter()
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, "--address", f"{host}:{port}"],
+            cwd=AGENT_DIR,
+            env=dict(os.environ, REFINEAI_WORKER_AUTHKEY=authkey.hex()),
+        )
+
+        # accept() has no timeout, so wait for it on a side thread and give
+        # up if the worker dies or takes too long to import
+        accepted = []
+        acceptor = threading.Thread(target=lambda: accepted.append(listener.accept()), daemon=True)
+        acceptor.start()
+        deadline = time.perf_counter() + start_timeout
+        while acceptor.is_alive() and self.process.poll() is None and time.perf_counter() < deadline:
+            acceptor.join(0.1)
+        listener.close()
+
+        if not accepted:
+            self.process.kill()
+            raise WorkerDied("Worker process did not start.")
+
+        self.conn = accepted[0]
+        hello = self.conn.recv()
+        self.pid = hello["pid"]
+        self.import_seconds = hello["import_seconds"]
+        self.startup_seconds = round(time.perf_counter() - started, 3)
+        self.jobs_run = 0
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, job_dir, argv, while_waiting):
+        """
+        Runs one job; while_waiting() is called every EVENT_POLL_SECONDS
+        until it finishes. Returns the worker's result dict, raises
+        WorkerDied if the process went away mid-job.
+        """
+        try:
+            self.conn.send({"job_dir": job_dir, "argv": argv, "sent_at": time.time()})
+            while not self.conn.poll(EVENT_POLL_SECONDS):
+                while_waiting()
+                if not self.alive():
+                    raise WorkerDied(f"Worker process exited with code {self.process.returncode}.")
+            result = self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerDied(f"Lost connection to worker process: {e}")
+
+        self.jobs_run += 1
+        return result
+
+    def stop(self, timeout=10):
+        try:
+            self.conn.send(None)
+            self.conn.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    def as_dict(self):
+        return {
+            "pid": self.pid,
+            "alive": self.alive(),
+            "startup_seconds": self.startup_seconds,
+            "import_seconds": self.import_seconds,
+            "jobs_run": self.jobs_run,
+        }
+
+
+class EventBuffer:
+    """
+    The most recent progress events of one job, shared between the job's
+    worker thread (producer) and any number of SSE streams (consumers).
+
+    Only the last maxlen events are kept, so a slow or disconnected
+    browser can never make the server hold a whole run's events; a
+    consumer that falls behind is told how many events it missed.
+    """
+
+    def __init__(self, maxlen=500):
+        self._events = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def append(self, event):
+        with self._cond:
+            self._events.append(event)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def last_seq(self):
+        with self._cond:
+            return self._events[-1]["seq"] if self._events else 0
+
+    def wait_after(self, seq, timeout=15):
+        """
+        Events with a sequence number above seq, waiting up to timeout
+        seconds for new ones. Returns (events, missed, closed).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or (self._events and self._events[-1]["seq"] > seq), timeout)
+            events = [e for e in self._events if e["seq"] > seq]
+            missed = events[0]["seq"] - seq - 1 if events else 0
+            return events, missed, self.closed and not events
+
+
+class JobManager:
+    """
+    Runs pipeline jobs in the background on a bounded pool of workers.
+
+    Every job gets its own working directory (root/<job_id>) laid out like
+    Cleaning_agent, so run.py's relative data/, logs/ and checkpoints/
+    paths never collide between jobs:
+
+        root/<job_id>/job.json             status record
+        root/<job_id>/run.log              stdout + stderr of run.py
+        root/<job_id>/data/events.jsonl    progress events written by run.py, then job_finished
+        root/<job_id>/data/input.csv       upload
+        root/<job_id>/data/rules.toon      converted rules
+        root/<job_id>/data/results.json    written by run.py
+        root/<job_id>/data/trace.json      stage timings and LLM tokens, also of failed runs
+        root/<job_id>/data/cleaned_output.csv
+        root/<job_id>/checkpoints/         per-rule frames and run state
+
+    A failed job (including one cut off by a server restart) can be
+    resumed: it runs again with run.py --resume and continues from its
+    first incomplete rule.
+
+    At most max_workers jobs run at once; at most max_queued wait behind
+    them, further submissions raise QueueFull.
+
+    warm: each pool thread keeps one worker.py process alive and runs its
+    jobs there, instead of starting a fresh run.py interpreter per job
+    (which re-imports pandas and re-creates the Gemini client every time).
+    Workers are started with the manager and replaced after
+    max_jobs_per_worker jobs or if they die. If a worker cannot be
+    started, that job falls back to a fresh run.py process.
+
+    llm_requests_per_minute / llm_tokens_per_minute: the LLM quota of the
+    whole app. Each running job gets an equal share (run.py --llm-rpm /
+    --llm-tpm), so concurrent jobs can't stampede it together; within a
+    job, llms/scheduler.py enforces the share and backs off on 429s. The
+    split is static: processes don't coordinate, so the share of an idle
+    slot is not lent to busy ones, and a 429 slows only the job that got it.
+    """
+
+    def __init__(self, root="jobs", max_workers=2, max_queued=20, max_buffered_events=500,
+                 warm=True, max_jobs_per_worker=20, llm_requests_per_minute=None, llm_tokens_per_minute=None):
+        self.root = os.path.abspath(root)
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_buffered_events = max_buffered_events
+        self.warm = warm
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.llm_requests_per_minute = llm_requests_per_minute
+        self.llm_tokens_per_minute = llm_tokens_per_minute
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._events = {}
+        self._local = threading.local()
+        self._workers = []
+        # Totals over the jobs finished since the app started, for /metrics
+        self._stage_totals = {stage: {"count": 0, "seconds": 0.0} for stage in TRACE_STAGES}
+        self._llm_totals = dict.fromkeys(LLM_COUNTERS, 0)
+        self._job_seconds = {COMPLETED: [0, 0.0], FAILED: [0, 0.0]}
+        self._peak_rss_mb = None
+
+        os.makedirs(self.root, exist_ok=True)
+        self._load_existing()
+
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="job",
+            initializer=self._start_worker if warm else None,
+        )
+        if warm:
+            # One no-op per thread makes the pool start every thread (and so
+            # every worker process) now rather than on the first jobs
+            for _ in range(max_workers):
+                self._pool.submit(time.sleep, 0)
+
+    # ---------------- bookkeeping ----------------
+
+    def _load_existing(self):
+        # Jobs from before a restart stay visible; ones that never finished are marked failed
+        for job_id in os.listdir(self.root):
+            path = os.path.join(self.root, job_id, "job.json")
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if job["status"] in (QUEUED, RUNNING):
+                job.update(status=FAILED, error="Server restarted before the job finished.")
+                self._save(job)
+            self._jobs[job_id] = job
+
+    def _save(self, job):
+        path = os.path.join(self.job_dir(job["id"]), "job.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            self._save(job)
+
+    def job_dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def data_dir(self, job_id):
+        return os.path.join(self.root, job_id, "data")
+
+    # ---------------- public API ----------------
+
+    def create(self, user=None):
+        """
+        Reserves a job id and its data directory. The caller saves the
+        uploads into data_dir(job_id) and then calls submit(job_id).
+        """
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j["status"] == QUEUED)
+            if queued >= self.max_queued:
+                raise QueueFull(f"{queued} jobs are already waiting; try again later.")
+
+            job_id = uuid.uuid4().hex[:12]
+            os.makedirs(self.data_dir(job_id), exist_ok=True)
+            now = time.time()
+            job = {
+                "id": job_id,
+                "user": user,
+                "status": QUEUED,
+                "created_at": now,
+                # When the job last joined the queue (submit, resume): its place in line
+                "queued_at": now,
+                "started_at": None,
+                "finished_at": None,
+                "returncode": None,
+                "error": None,
+            }
+            self._jobs[job_id] = job
+            self._events[job_id] = EventBuffer(self.max_buffered_events)
+            self._save(job)
+        return job_id
+
+    def submit(self, job_id, args=()):
+        # Kept so that resume() can run the job again with the same options
+        self._update(job_id, args=list(args), queued_at=time.time())
+        self._pool.submit(self._run, job_id, list(args))
+
+    def resume(self, job_id):
+        """
+        Queues a failed job again with its original arguments plus
+        --resume. Raises NotResumable if the job is not failed or never
+        completed a rule (nothing to resume from), QueueFull like create().
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                raise NotResumable(f"Unknown job {job_id}.")
+            if job["status"] != FAILED:
+                raise NotResumable(f"Only failed jobs can be resumed (job is {job['status']}).")
+            if not os.path.exists(os.path.join(self.job_dir(job_id), RUN_STATE_PATH)):
+                raise NotResumable("The job stopped before completing a rule; start it again instead.")
+            queued = sum(1 for j in self._jobs.values() if j["status"] == QUEUED)
+            if queued >= self.max_queued:
+                raise QueueFull(f"{queued} jobs are already waiting; try again later.")
+
+            job.update(status=QUEUED, returncode=None, error=None, finished_at=None, queued_at=time.time(),
+                       resumes=job.get("resumes", 0) + 1)
+            # The finished run's buffer is closed. run.py --resume appends to the
+            # events file, so the new buffer starts with the events so far and
+            # a stream reconnecting with an earlier Last-Event-ID misses nothing
+            buffer = EventBuffer(self.max_buffered_events)
+            self._replay_events(job_id, buffer)
+            self._events[job_id] = buffer
+            self._save(job)
+            args = [a for a in job.get("args", []) if a != "--resume"] + ["--resume"]
+        self.submit(job_id, args)
+
+    def fail(self, job_id, error):
+        self._update(job_id, status=FAILED, error=error, finished_at=time.time())
+        self._finish_events(job_id)
+
+    def events(self, job_id):
+        """
+        EventBuffer of the job. Jobs from before a restart get one rebuilt
+        from their events file.
+        """
+        with self._lock:
+            buffer = self._events.get(job_id)
+            if buffer is None and job_id in self._jobs:
+                buffer = EventBuffer(self.max_buffered_events)
+                last = self._replay_events(job_id, buffer)
+                # A job cut off by the restart never got its job_finished event
+                if last is None or last["event"] != "job_finished":
+                    job = self._jobs[job_id]
+                    buffer.append({"seq": buffer.last_seq() + 1, "time": job["finished_at"], "event": "job_finished",
+                                   "status": job["status"], "error": job["error"]})
+                buffer.close()
+                self._events[job_id] = buffer
+        return buffer
+
+    def get(self, job_id):
+        """
+        Copy of the job record plus its queue position (1 = next to start,
+        None when not queued), or None for an unknown id.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            if job["status"] == QUEUED:
+                # A resumed job waits behind everything queued before it was resumed
+                ahead = [
+                    j for j in self._jobs.values()
+                    if j["status"] == QUEUED and _queued_at(j) <= _queued_at(job)
+                ]
+                job["position"] = len(ahead)
+            else:
+                job["position"] = None
+        return job
+
+    def metrics(self):
+        """
+        Worker startup times and per-job overhead (job start to run.py's
+        run_started event), split by warm and cold (fresh process) jobs.
+        """
+        with self._lock:
+            workers = [w.as_dict() for w in self._workers]
+            jobs = [dict(j) for j in self._jobs.values()]
+
+        overhead = {}
+        for mode in ("warm", "cold"):
+            values = [j["overhead_seconds"] for j in jobs
+                      if j.get("mode") == mode and j.get("overhead_seconds") is not None]
+            overhead[mode] = {
+                "jobs": len(values),
+                "mean_seconds": round(sum(values) / len(values), 3) if values else None,
+                "max_seconds": max(values) if values else None,
+            }
+
+        return {
+            "warm": self.warm,
+            "max_workers": self.max_workers,
+            "workers": workers,
+            "job_overhead": overhead,
+            "queued": sum(1 for j in jobs if j["status"] == QUEUED),
+            "running": sum(1 for j in jobs if j["status"] == RUNNING),
+        }
+
+    def prometheus_metrics(self):
+        """
+        The metrics above plus the stage timings and LLM usage of the jobs
+        finished since the app started (from their trace.json files),
+        in the Prometheus text exposition format.
+        """
+        metrics = self.metrics()
+        with self._lock:
+            statuses = {status: 0 for status in (QUEUED, RUNNING, COMPLETED, FAILED)}
+            for job in self._jobs.values():
+                statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+            stage_totals = {stage: dict(entry) for stage, entry in self._stage_totals.items()}
+            llm_totals = dict(self._llm_totals)
+            job_seconds = {status: list(entry) for status, entry in self._job_seconds.items()}
+            peak_rss_mb = self._peak_rss_mb
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        metric("refineai_jobs", "gauge", "Jobs known to the app, by status.",
+               [({"status": status}, count) for status, count in statuses.items()])
+        metric("refineai_workers", "gauge", "Warm worker processes alive.",
+               [({}, sum(1 for w in metrics["workers"] if w["alive"]))])
+        metric("refineai_jobs_finished_total", "counter", "Jobs finished since the app started.",
+               [({"status": status}, count) for status, (count, _) in job_seconds.items()])
+        metric("refineai_job_seconds_total", "counter", "Run time of the jobs finished since the app started.",
+               [({"status": status}, round(seconds, 3)) for status, (_, seconds) in job_seconds.items()])
+        metric("refineai_stage_seconds_total", "counter", "Time spent per pipeline stage.",
+               [({"stage": stage}, round(entry["seconds"], 3)) for stage, entry in stage_totals.items()])
+        metric("refineai_stage_spans_total", "counter", "Pipeline stage runs (per rule and attempt).",
+               [({"stage": stage}, entry["count"]) for stage, entry in stage_totals.items()])
+        for key in LLM_COUNTERS:
+            metric(f"refineai_llm_{key}_total", "counter", f"LLM {key.replace('_', ' ')} of finished jobs.",
+                   [({}, llm_totals[key])])
+        if peak_rss_mb is not None:
+            metric("refineai_peak_rss_megabytes", "gauge", "Highest peak RSS of a rule execution in any job.",
+                   [({}, peak_rss_mb)])
+        return "\n".join(lines) + "\n"
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+
+    # ---------------- worker ----------------
+
+    def _start_worker(self):
+        # Runs on a pool thread: that thread's warm worker, or None
+        try:
+            worker = WarmWorker()
+        except (OSError, WorkerDied) as e:
+            print(f"WARNING: Could not start a warm worker ({e}); jobs on this thread run in fresh processes.")
+            worker = None
+        else:
+            print(f"INFO: Warm worker {worker.pid} ready in {worker.startup_seconds}s "
+                  f"(imports {worker.import_seconds}s).")
+            with self._lock:
+                self._workers.append(worker)
+        self._local.worker = worker
+        return worker
+
+    def _retire_worker(self, worker):
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.stop()
+        self._local.worker = None
+
+    def _warm_worker(self):
+        """
+        This thread's warm worker, restarted if it died or has run
+        max_jobs_per_worker jobs. None when warm workers are off or
+        cannot be started.
+        """
+        if not self.warm:
+            return None
+        worker = getattr(self._local, "worker", None)
+        if worker is not None and (not worker.alive() or worker.jobs_run >= self.max_jobs_per_worker):
+            self._retire_worker(worker)
+            worker = None
+        if worker is None:
+            worker = self._start_worker()
+        return worker
+
+    def _finish_events(self, job_id):
+        # Final event so streams know the job is over, then no more events.
+        # Streams wait for events above the last seq they saw (0 at the start),
+        # so it always follows the run's last event. It is also written to the
+        # events file, where a resumed run continues the numbering after it.
+        buffer = self.events(job_id)
+        job = self.get(job_id)
+        event = {"seq": buffer.last_seq() + 1, "time": round(time.time(), 3), "event": "job_finished",
+                 "status": job["status"], "error": job["error"]}
+        with open(os.path.join(self.data_dir(job_id), "events.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, default=str) + "\n")
+        buffer.append(event)
+        buffer.close()
+
+    def _replay_events(self, job_id, buffer):
+        # Appends the job's events file to buffer; returns the last event or None
+        last = None
+        path = os.path.join(self.data_dir(job_id), "events.jsonl")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # A line cut short when a run was killed
+                        continue
+                    buffer.append(event)
+                    last = event
+        return last
+
+    def _run_process(self, job_dir, argv, while_waiting):
+        # Cold path: a fresh interpreter for this job only
+        with open(os.path.join(job_dir, "run.log"), "w", encoding="utf-8") as log:
+            process = subprocess.Popen(
+                [sys.executable, RUN_SCRIPT] + argv,
+                cwd=job_dir,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+            while process.poll() is None:
+                while_waiting()
+                time.sleep(EVENT_POLL_SECONDS)
+
+        if process.returncode == 0:
+            return 0, None
+        return process.returncode, f"run.py exited with code {process.returncode}; see run.log."
+
+    def _llm_quota_args(self):
+        argv = []
+        if self.llm_requests_per_minute:
+            argv += ["--llm-rpm", str(max(1, self.llm_requests_per_minute // self.max_workers))]
+        if self.llm_tokens_per_minute:
+            argv += ["--llm-tpm", str(max(1, self.llm_tokens_per_minute // self.max_workers))]
+        return argv
+
+    def _run(self, job_id, args):
+        started_at = time.time()
+        self._update(job_id, status=RUNNING, started_at=started_at)
+        job_dir = self.job_dir(job_id)
+        argv = ["--cache-dir", LLM_CACHE_DIR, "--rule-pack", RULE_PACK_PATH] + self._llm_quota_args() + list(args)
+        buffer = self._events[job_id]
+        events_path = os.path.join(self.data_dir(job_id), "events.jsonl")
+        # A resumed run appends to the file: only what it writes is new
+        tail = _EventsTail(events_path, offset=os.path.getsize(events_path) if os.path.exists(events_path) else 0)
+
+        def forward_events():
+            # Forward run.py's events to the buffer while it runs
+            for event in tail.read_new():
+                if event["event"] == "run_started":
+                    self._update(job_id, overhead_seconds=round(event["time"] - started_at, 3))
+                buffer.append(event)
+
+        worker = self._warm_worker()
+        try:
+            if worker is not None:
+                self._update(job_id, mode="warm", worker_pid=worker.pid)
+                result = worker.run(job_dir, argv, forward_events)
+                returncode, error = (0, None) if result["ok"] else (1, result["error"])
+            else:
+                self._update(job_id, mode="cold", worker_pid=None)
+                returncode, error = self._run_process(job_dir, argv, forward_events)
+        except WorkerDied as e:
+            self._retire_worker(worker)
+            returncode, error = -1, str(e)
+        except OSError as e:
+            returncode, error = -1, str(e)
+        finally:
+            forward_events()
+            tail.close()
+
+        if returncode == 0:
+            self._update(job_id, status=COMPLETED, returncode=0, finished_at=time.time())
+        else:
+            self._update(job_id, status=FAILED, returncode=returncode, error=error, finished_at=time.time())
+        self._record_run(job_id, COMPLETED if returncode == 0 else FAILED, time.time() - started_at)
+        self._finish_events(job_id)
+
+    def _record_run(self, job_id, status, seconds):
+        # Adds a finished job's trace to the /metrics totals. run.py writes
+        # trace.json however the run ends, results.json only when it succeeds
+        stats = _read_json(os.path.join(self.data_dir(job_id), "trace.json"))
+        if stats is None:
+            results = _read_json(os.path.join(self.data_dir(job_id), "results.json")) or {}
+            stats = {"trace": results.get("trace"), "llm_tokens": results.get("summary", {}).get("llm_tokens")}
+        trace = stats.get("trace") or {}
+        llm_tokens = stats.get("llm_tokens") or {}
+
+        with self._lock:
+            self._job_seconds[status][0] += 1
+            self._job_seconds[status][1] += seconds
+            for stage, entry in trace.get("stages", {}).items():
+                totals = self._stage_totals.setdefault(stage, {"count": 0, "seconds": 0.0})
+                totals["count"] += entry.get("count", 0)
+                totals["seconds"] += entry.get("seconds", 0.0)
+            for key in LLM_COUNTERS:
+                self._llm_totals[key] += llm_tokens.get(key, 0)
+            peak = trace.get("peak_rss_mb")
+            if peak is not None and (self._peak_rss_mb is None or peak > self._peak_rss_mb):
+                self._peak_rss_mb = peak
+
+
+def _queued_at(job):
+    # Records from before queued_at existed were queued once, when created
+    return job.get("queued_at", job["created_at"])
+
+
+def _read_json(path):
+    # None when the file is missing or unreadable
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class _EventsTail:
+    """
+    Reads the complete lines appended to a JSON-lines file since the last
+    call (the first call starts at offset); a partially written last line
+    is left for the next call.
+    """
+
+    def __init__(self, path, offset=0):
+        self.path = path
+        self.offset = offset
+        self._file = None
+        self._partial = ""
+
+    def read_new(self):
+        if self._file is None:
+            if not os.path.exists(self.path):
+                return []
+            self._file = open(self.path, "r", encoding="utf-8")
+            self._file.seek(self.offset)
+
+        data = self._partial + self._file.read()
+        lines = data.split("\n")
+        self._partial = lines.pop()
+        return [json.loads(line) for line in lines if line.strip()]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()